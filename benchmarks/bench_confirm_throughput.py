@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Load test of concurrent Confirm throughput per worker
+
+Compares the Flask handler of examples/request-confirm-refund.py (one
+synchronous worker) with linepay.asgi routes on AsyncLinePayApi (one event
+loop). Both call a local stub LINE Pay API with fixed latency.
+
+Requires flask, starlette and httpx.
+
+    $ python -m benchmarks.bench_confirm_throughput --requests 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+
+import httpx
+from flask import Flask, abort, request
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from linepay import LinePayApi
+from linepay.aio import AsyncLinePayApi
+from linepay.asgi import create_payment_router
+from linepay.session_store import MemoryOrderSessionStore
+from linepay.stub import StubLinePayServer
+
+
+def create_store(count):
+    store = MemoryOrderSessionStore()
+    for i in range(count):
+        store.save("order-{}".format(i), 100, "JPY", transaction_id=i + 1)
+    return store
+
+
+def run_flask(endpoint, count):
+    api = LinePayApi("channel_id", "channel_secret")
+    api.api_endpoint = endpoint
+    store = create_store(count)
+    app = Flask(__name__)
+
+    @app.route("/confirm", methods=["GET"])
+    def pay_confirm():
+        transaction_id = int(request.args.get("transactionId"))
+        session = store.get_by_transaction(transaction_id)
+        if session is None:
+            abort(404)
+        return api.confirm(
+            transaction_id, float(session.amount), session.currency)
+
+    client = app.test_client()
+    started = time.perf_counter()
+    for i in range(count):
+        response = client.get("/confirm?transactionId={}".format(i + 1))
+        assert response.status_code == 200
+    return time.perf_counter() - started
+
+
+async def run_asgi(endpoint, count, concurrency):
+    api = AsyncLinePayApi(
+        "channel_id", "channel_secret",
+        client=httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=concurrency)))
+    api.api_endpoint = endpoint
+    store = create_store(count)
+
+    order_ids = itertools.count()
+
+    async def build_order(request):
+        order_id = "new-order-{}".format(next(order_ids))
+        return {
+            "amount": 100, "currency": "JPY", "orderId": order_id,
+            "packages": [{"id": "package-1", "amount": 100, "products": [
+                {"name": "Sample product", "quantity": 1, "price": 100}]}]
+        }
+
+    app = Starlette(routes=[
+        Mount("/pay", create_payment_router(api, store, build_order))])
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://worker") as client:
+
+        async def confirm(transaction_id):
+            async with semaphore:
+                response = await client.get(
+                    "/pay/confirm?transactionId={}".format(transaction_id))
+                assert response.status_code == 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(confirm(i + 1) for i in range(count)))
+        elapsed = time.perf_counter() - started
+    await api.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=0.05,
+        help="stub API latency in seconds")
+    args = parser.parse_args()
+
+    with StubLinePayServer(latency=args.latency) as server:
+        flask_elapsed = run_flask(server.url, args.requests)
+        loop = asyncio.new_event_loop()
+        asgi_elapsed = loop.run_until_complete(run_asgi(
+            server.url, args.requests, args.concurrency))
+        loop.close()
+
+    print("{} confirms, stub latency {:.0f}ms".format(
+        args.requests, args.latency * 1000))
+    print("{:<28} {:>10} {:>12}".format("worker", "seconds", "confirms/s"))
+    print("{:<28} {:>10.2f} {:>12.1f}".format(
+        "flask (sync)", flask_elapsed, args.requests / flask_elapsed))
+    print("{:<28} {:>10.2f} {:>12.1f}".format(
+        "asgi (concurrency {})".format(args.concurrency), asgi_elapsed,
+        args.requests / asgi_elapsed))
+
+
+if __name__ == "__main__":
+    main()
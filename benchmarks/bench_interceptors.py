@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the interceptor chain overhead
+
+Measures LinePayApi.confirm() calls per second with 0, 1 and 5
+interceptors. HTTP is stubbed out, so only SDK side cost is measured.
+
+    $ python -m benchmarks.bench_interceptors
+"""
+
+import timeit
+from unittest.mock import patch
+
+from linepay import LinePayApi
+from linepay.interceptors import Interceptor
+
+
+class StubResponse(object):
+    status_code = 200
+    headers = {}
+
+    def json(self):
+        return {"returnCode": "0000", "returnMessage": "Success."}
+
+
+class NoopInterceptor(Interceptor):
+
+    def before_sign(self, call):
+        pass
+
+    def after_sign(self, call):
+        pass
+
+    def before_send(self, call):
+        pass
+
+    def after_response(self, call):
+        pass
+
+
+def run(interceptor_count, number):
+    api = LinePayApi(
+        "channel_id", "channel_secret", is_sandbox=True,
+        interceptors=[NoopInterceptor() for _ in range(interceptor_count)])
+    response = StubResponse()
+
+    def post(url, data, headers=None):
+        return response
+
+    with patch("linepay.api.requests.post", new=post):
+        return min(timeit.repeat(
+            lambda: api.confirm(1234567890, 100.0, "JPY"),
+            number=number, repeat=7)) / number
+
+
+def main():
+    number = 2000
+    baseline = None
+    # warm up caches before the measured runs
+    run(0, number)
+    print("{:>13} {:>12} {:>12} {:>10}".format(
+        "interceptors", "usec/call", "calls/sec", "overhead"))
+    for count in (0, 1, 5):
+        per_call = run(count, number)
+        if baseline is None:
+            baseline = per_call
+        print("{:>13} {:>12.2f} {:>12.0f} {:>9.1f}%".format(
+            count, per_call * 1e6, 1 / per_call,
+            (per_call / baseline - 1) * 100))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of interactive latency during a background batch
+
+Background threads call Payment Details API in a loop against the local
+stub LINE Pay API while one thread calls Confirm API. Compares Confirm
+latency with one shared session against PriorityLanes.
+
+    $ python -m benchmarks.bench_lanes --background-threads 32
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from linepay import LinePayApi
+from linepay.lanes import BACKGROUND, INTERACTIVE, Lane, PriorityLanes
+from linepay.pool import create_pooled_session
+from linepay.stub import StubLinePayServer
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(endpoint, args, lanes=None):
+    api = LinePayApi(
+        "channel_id", "channel_secret",
+        session=create_pooled_session(args.background_threads + 1),
+        lanes=lanes)
+    api.api_endpoint = endpoint
+    stop = threading.Event()
+    background_calls = [0]
+
+    def background():
+        while not stop.is_set():
+            api.payment_details(transaction_id=1)
+            background_calls[0] += 1
+
+    threads = [
+        threading.Thread(target=background)
+        for _ in range(args.background_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(args.calls):
+        call_started = time.perf_counter()
+        api.confirm(i + 1, 100.0, "JPY")
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, background_calls[0] / (elapsed + 0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--background-threads", type=int, default=32)
+    parser.add_argument(
+        "--background-slots", type=int, default=4,
+        help="concurrency cap of the background lane")
+    parser.add_argument(
+        "--latency", type=float, default=0.005,
+        help="stub API latency in seconds")
+    args = parser.parse_args()
+
+    server = StubLinePayServer(latency=args.latency).start()
+    print("{} Confirm calls, {} background threads".format(
+        args.calls, args.background_threads))
+    print("{:<24} {:>9} {:>9} {:>9} {:>14}".format(
+        "client", "p50 ms", "p99 ms", "max ms", "background/s"))
+    rows = [
+        ("shared session", None),
+        ("priority lanes", PriorityLanes(
+            lanes=[
+                Lane(INTERACTIVE, 0, 4),
+                Lane(BACKGROUND, 1, args.background_slots)],
+            max_concurrent=args.background_slots + 1)),
+    ]
+    for name, lanes in rows:
+        latencies, background_rate = run(server.url, args, lanes)
+        print("{:<24} {:>9.2f} {:>9.2f} {:>9.2f} {:>14.0f}".format(
+            name, statistics.median(latencies) * 1e3,
+            percentile(latencies, 0.99) * 1e3, max(latencies) * 1e3,
+            background_rate))
+        if lanes is not None:
+            for stats in lanes.stats().values():
+                print("  {:<10} calls={} peak_queued={} mean_wait={:.2f}ms".format(
+                    stats.name, stats.calls, stats.peak_queued,
+                    stats.mean_wait * 1e3))
+            lanes.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of per-request overhead with many tenants
+
+Calls Payment Details API for random channels out of 10k tenants.
+Compares creating a LinePayApi (and its connection) for every request
+against ClientRegistry reusing cached clients and one pooled session.
+HTTP is stubbed out unless --stub is given, so by default only SDK side
+cost is measured.
+
+    $ python -m benchmarks.bench_registry --tenants 10000 --calls 50000
+    $ python -m benchmarks.bench_registry --stub --calls 5000
+"""
+
+import argparse
+import random
+import time
+
+import requests
+
+from linepay import LinePayApi
+from linepay.registry import ClientRegistry
+from linepay.stub import StubLinePayServer
+
+
+class StubResponse(object):
+    status_code = 200
+    headers = {}
+
+    def json(self):
+        return {"returnCode": "0000", "returnMessage": "Success."}
+
+
+class StubSession(object):
+    """Session returning a canned response, opened per request like
+    requests.Session() would be"""
+
+    response = StubResponse()
+
+    def get(self, url, headers=None):
+        return self.response
+
+    def close(self):
+        pass
+
+
+def run_per_request(secrets, channel_ids, endpoint, session_factory):
+    started = time.perf_counter()
+    for i, channel_id in enumerate(channel_ids):
+        session = session_factory()
+        api = LinePayApi(channel_id, secrets[channel_id], session=session)
+        api.api_endpoint = endpoint
+        api.payment_details(transaction_id=i + 1)
+        session.close()
+    return time.perf_counter() - started
+
+
+def run_registry(secrets, channel_ids, endpoint, session_factory, **kwargs):
+    registry = ClientRegistry(
+        secrets, max_clients=len(secrets), api_endpoint=endpoint,
+        session_factory=session_factory, **kwargs)
+    started = time.perf_counter()
+    for i, channel_id in enumerate(channel_ids):
+        registry.get(channel_id).payment_details(transaction_id=i + 1)
+    elapsed = time.perf_counter() - started
+    registry.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tenants", type=int, default=10000)
+    parser.add_argument("--calls", type=int, default=50000)
+    parser.add_argument(
+        "--stub", action="store_true",
+        help="call local stub LINE Pay API over HTTP")
+    args = parser.parse_args()
+
+    secrets = {
+        "channel_{}".format(i): "secret_{}".format(i)
+        for i in range(args.tenants)}
+    rng = random.Random(1)
+    channel_ids = [rng.choice(list(secrets)) for _ in range(args.calls)]
+
+    server = None
+    if args.stub:
+        server = StubLinePayServer().start()
+        endpoint = server.url
+        session_factory = requests.Session
+    else:
+        endpoint = "http://stub"
+        session_factory = StubSession
+
+    print("{} Payment Details calls over {} tenants{}".format(
+        args.calls, args.tenants, " (stub HTTP)" if args.stub else ""))
+    print("{:<28} {:>10} {:>12}".format("client", "seconds", "us/call"))
+    rows = [
+        ("LinePayApi per request",
+         run_per_request(secrets, channel_ids, endpoint, session_factory)),
+        ("ClientRegistry",
+         run_registry(secrets, channel_ids, endpoint, session_factory)),
+        ("ClientRegistry, rate limit",
+         run_registry(
+             secrets, channel_ids, endpoint, session_factory, rate=1000)),
+    ]
+    for name, elapsed in rows:
+        print("{:<28} {:>10.2f} {:>12.1f}".format(
+            name, elapsed, elapsed / args.calls * 1e6))
+
+    if server is not None:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of checkout flows replayed from a cassette
+
+Records one Request, Confirm, Payment Details and Refund flow against
+the local stub LINE Pay API, then replays it offline and reports flows
+per second.
+
+    $ python -m benchmarks.bench_replay --flows 5000
+"""
+
+import argparse
+import time
+
+import requests
+
+from linepay import LinePayApi
+from linepay.cassette import Cassette, RecordingSession, ReplaySession
+from linepay.stub import StubLinePayServer
+
+OPTIONS = {
+    "amount": 100, "currency": "JPY", "orderId": "order-1",
+    "packages": [{
+        "id": "1", "amount": 100,
+        "products": [{"name": "item", "quantity": 1, "price": 100}]}],
+    "redirectUrls": {
+        "confirmUrl": "https://example.com/confirm",
+        "cancelUrl": "https://example.com/cancel"},
+}
+
+
+def checkout(api):
+    transaction_id = api.request(OPTIONS)["info"]["transactionId"]
+    api.confirm(transaction_id, 100.0, "JPY")
+    api.payment_details(transaction_id=transaction_id)
+    api.refund(transaction_id, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--flows", type=int, default=5000)
+    args = parser.parse_args()
+
+    cassette = Cassette()
+    with StubLinePayServer() as server:
+        session = requests.Session()
+        api = LinePayApi(
+            "channel_id", "channel_secret",
+            session=RecordingSession(cassette, session))
+        api.api_endpoint = server.url
+        started = time.perf_counter()
+        checkout(api)
+        stub_elapsed = time.perf_counter() - started
+        session.close()
+
+    api = LinePayApi(
+        "channel_id", "channel_secret", session=ReplaySession(cassette))
+    started = time.perf_counter()
+    for _ in range(args.flows):
+        checkout(api)
+    elapsed = time.perf_counter() - started
+    print("{} interactions recorded, first flow over HTTP {:.1f} ms".format(
+        len(cassette), stub_elapsed * 1e3))
+    print("{} flows replayed in {:.2f} s: {:.0f} flows/s, {:.1f} us/call".format(
+        args.flows, elapsed, args.flows / elapsed,
+        elapsed / (args.flows * len(cassette)) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
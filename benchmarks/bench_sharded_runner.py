@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of multi-process sharded batch calls
+
+Calls Payment Details API for many transactions against local stub LINE
+Pay API processes sharing one port. Compares one process with a thread
+pool against ShardedRunner with 1, 2, 4 ... worker processes.
+
+    $ python -m benchmarks.bench_sharded_runner --jobs 5000 --max-processes 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from linepay import LinePayApi
+from linepay.sharding import ShardedRunner
+from linepay.stub import StubLinePayServer
+from linepay.util import ordered_map
+
+THREADS = 8
+
+
+def serve_stub(port, latency):
+    server = StubLinePayServer(port=port, latency=latency, reuse_port=True)
+    server._server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_threads(endpoint, count):
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=THREADS))
+    api = LinePayApi("channel_id", "channel_secret", session=session)
+    api.api_endpoint = endpoint
+    started = time.perf_counter()
+    for _, result in ordered_map(
+            lambda i: api.payment_details(transaction_id=i),
+            range(1, count + 1), THREADS):
+        assert result["returnCode"] == "0000"
+    return time.perf_counter() - started
+
+
+def run_sharded(endpoint, count, processes):
+    with ShardedRunner("channel_id", "channel_secret", processes=processes,
+                       threads=THREADS, api_endpoint=endpoint) as runner:
+        started = time.perf_counter()
+        jobs = ({"transaction_id": i} for i in range(1, count + 1))
+        for job in runner.map("payment_details", jobs):
+            assert job.succeeded, job.error
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument(
+        "--max-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--stub-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="stub API latency in seconds")
+    args = parser.parse_args()
+
+    port = free_port()
+    stubs = [
+        multiprocessing.Process(
+            target=serve_stub, args=(port, args.latency), daemon=True)
+        for _ in range(args.stub_processes)]
+    for stub in stubs:
+        stub.start()
+    time.sleep(0.5)
+    endpoint = "http://127.0.0.1:{}".format(port)
+
+    print("{} Payment Details calls, {} CPUs, {} stub processes".format(
+        args.jobs, os.cpu_count(), args.stub_processes))
+    print("{:<28} {:>10} {:>10}".format("runner", "seconds", "calls/s"))
+    elapsed = run_threads(endpoint, args.jobs)
+    print("{:<28} {:>10.2f} {:>10.0f}".format(
+        "1 process, {} threads".format(THREADS), elapsed, args.jobs / elapsed))
+    processes = 1
+    while processes <= args.max_processes:
+        elapsed = run_sharded(endpoint, args.jobs, processes)
+        print("{:<28} {:>10.2f} {:>10.0f}".format(
+            "sharded, {} processes".format(processes), elapsed,
+            args.jobs / elapsed))
+        processes *= 2
+
+    for stub in stubs:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,32 @@
 LINE Pay API SDK for Python use example
 
 Request(Authorizations) -> Confirm -> Capture
+
+Captures run in the background through CaptureScheduler. /capture only
+marks the order as shipped.
+
+This example only works as a single process:
+
+    $ python authorizations-capture.py
+
+CaptureScheduler keeps authorizations in the memory of the process that
+confirmed them, and its thread is started under __main__ only. Under a
+multi-worker server (e.g. gunicorn -w 4) no capture ever runs, and
+/capture returns 404 on every worker but the one that confirmed the
+payment. For such deployments, run one scheduler in a dedicated process
+and send it confirmed and shipped orders through a shared queue.
 """
 
 import logging
+import threading
 import uuid
 import os
 from os.path import join, dirname
 from dotenv import load_dotenv
-from flask import Flask, request, render_template
+from flask import Flask, abort, request, render_template
 from linepay import LinePayApi
+from linepay.capture_scheduler import CaptureScheduler
+from linepay.session_store import SQLiteOrderSessionStore
 
 # dotenv
 load_dotenv(verbose=True)
@@ -40,8 +57,23 @@ LINE_PAY_REQEST_BASE_URL = "https://{}".format(
 )
 api = LinePayApi(LINE_PAY_CHANNEL_ID, LINE_PAY_CHANNEL_SECRET, is_sandbox=True)
 
-# Cache
-CACHE = {}
+# Order sessions. The store may be shared by worker processes on this
+# host, but CAPTURE_SCHEDULER below may not: run this example as a single
+# process
+ORDER_SESSIONS = SQLiteOrderSessionStore(
+    join(dirname(__file__), "order_sessions.db"))
+
+# Captures shipped orders, at most 5 API calls per second, and voids
+# authorizations not shipped an hour before expiry. In-process state, see
+# the module docstring
+CAPTURE_SCHEDULER = CaptureScheduler(api, rate=5)
+CAPTURE_SCHEDULER_STOP = threading.Event()
+
+
+def on_scheduled_action(outcome):
+    logger.info(
+        "%s of transaction %s: %s", outcome.action, outcome.transaction_id,
+        outcome.result if outcome.succeeded else outcome.error)
 
 
 @app.route("/request", methods=['GET'])
@@ -49,9 +81,6 @@ def pay_request():
     order_id = str(uuid.uuid4())
     amount = 1
     currency = "JPY"
-    CACHE["order_id"] = order_id
-    CACHE["amount"] = amount
-    CACHE["currency"] = currency
     request_options = {
         "amount": amount,
         "currency": currency,
@@ -87,6 +116,8 @@ def pay_request():
     logger.debug(response)
     # Check Payment Status
     transaction_id = int(response.get("info", {}).get("transactionId", 0))
+    ORDER_SESSIONS.save(
+        order_id, amount, currency, transaction_id=transaction_id)
     check_result = api.check_payment_status(transaction_id)
     logger.debug(check_result)
     response["transaction_id"] = transaction_id
@@ -101,28 +132,33 @@ def pay_request():
 def pay_confirm():
     transaction_id = int(request.args.get('transactionId'))
     logger.debug("transaction_id: %s", str(transaction_id))
-    CACHE["transaction_id"] = int(transaction_id)
+    session = ORDER_SESSIONS.get_by_transaction(transaction_id)
+    if session is None:
+        abort(404)
     response = api.confirm(
         transaction_id,
-        float(CACHE.get("amount", 0)),
-        CACHE.get("currency", "JPY")
+        float(session.amount),
+        session.currency
     )
     logger.debug(response)
+    CAPTURE_SCHEDULER.add_confirmed(
+        transaction_id, float(session.amount), session.currency, response)
     return render_template("confirm-capture.html", result=response)
 
 
 @app.route("/capture", methods=['GET'])
 def pay_capture():
-    transaction_id = int(CACHE.get("transaction_id", 0))
-    amount = float(CACHE.get("amount", 0))
-    currency = CACHE.get("currency", None)
+    transaction_id = int(request.args.get('transactionId'))
     logger.debug("transaction_id: %s", str(transaction_id))
-    logger.debug("amount: %s", str(amount))
-    logger.debug("currency: %s", str(currency))
-    response = api.capture(transaction_id, amount, currency)
-    logger.debug(response)
-    return response
+    if not CAPTURE_SCHEDULER.mark_ready(transaction_id):
+        abort(404)
+    return {"transactionId": transaction_id, "capture": "scheduled"}
 
 
 if __name__ == "__main__":
-    app.run(debug=True, port=8000)
+    threading.Thread(
+        target=CAPTURE_SCHEDULER.run,
+        args=(CAPTURE_SCHEDULER_STOP, on_scheduled_action),
+        daemon=True).start()
+    # the reloader would start a second process without the scheduler
+    app.run(debug=True, port=8000, use_reloader=False)
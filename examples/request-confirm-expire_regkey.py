@@ -11,8 +11,9 @@ import uuid
 import os
 from os.path import join, dirname
 from dotenv import load_dotenv
-from flask import Flask, request, render_template
+from flask import Flask, abort, request, render_template
 from linepay import LinePayApi
+from linepay.session_store import SQLiteOrderSessionStore
 
 # dotenv
 load_dotenv(verbose=True)
@@ -40,8 +41,9 @@ LINE_PAY_REQEST_BASE_URL = "https://{}".format(
 )
 api = LinePayApi(LINE_PAY_CHANNEL_ID, LINE_PAY_CHANNEL_SECRET, is_sandbox=True)
 
-# Cache
-CACHE = {}
+# Order sessions, shared by every worker process on this host
+ORDER_SESSIONS = SQLiteOrderSessionStore(
+    join(dirname(__file__), "order_sessions.db"))
 
 
 @app.route("/request", methods=['GET'])
@@ -50,10 +52,6 @@ def pay_request():
     amount = 1
     currency = "JPY"
     product_name = "Sample product"
-    CACHE["order_id"] = order_id
-    CACHE["amount"] = amount
-    CACHE["currency"] = currency
-    CACHE["product_name"] = currency
     request_options = {
         "amount": amount,
         "currency": currency,
@@ -89,6 +87,9 @@ def pay_request():
     logger.debug(response)
     # Check Payment Satus
     transaction_id = int(response.get("info", {}).get("transactionId", 0))
+    ORDER_SESSIONS.save(
+        order_id, amount, currency, transaction_id=transaction_id,
+        data={"product_name": product_name})
     check_result = api.check_payment_status(transaction_id)
     logger.debug(check_result)
     response["transaction_id"] = transaction_id
@@ -103,15 +104,17 @@ def pay_request():
 def pay_confirm():
     transaction_id = int(request.args.get('transactionId'))
     logger.debug("transaction_id: %s", str(transaction_id))
-    CACHE["transaction_id"] = transaction_id
+    session = ORDER_SESSIONS.get_by_transaction(transaction_id)
+    if session is None:
+        abort(404)
     response = api.confirm(
         transaction_id,
-        float(CACHE.get("amount", 0)),
-        CACHE.get("currency", "JPY")
+        float(session.amount),
+        session.currency
     )
     logger.debug(response)
     reg_key = response.get("info", {}).get("regKey", None)
-    CACHE["reg_key"] = reg_key
+    ORDER_SESSIONS.update_data(session.order_id, reg_key=reg_key)
     # Check RegKey
     check_result = api.check_regkey(reg_key)
     logger.debug(check_result)
@@ -123,7 +126,11 @@ def pay_confirm():
 
 @app.route("/expire_regkey", methods=['GET'])
 def expire_regkey():
-    reg_key = CACHE.get("reg_key", None)
+    transaction_id = int(request.args.get('transactionId'))
+    session = ORDER_SESSIONS.get_by_transaction(transaction_id)
+    if session is None:
+        abort(404)
+    reg_key = session.data.get("reg_key", None)
     logger.debug("reg_key: %s", str(reg_key))
     response = api.expire_regkey(reg_key)
     logger.debug(response)
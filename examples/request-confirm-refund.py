@@ -11,8 +11,9 @@ import uuid
 import os
 from os.path import join, dirname
 from dotenv import load_dotenv
-from flask import Flask, request, render_template
+from flask import Flask, abort, request, render_template
 from linepay import LinePayApi
+from linepay.session_store import SQLiteOrderSessionStore
 
 # dotenv
 load_dotenv(verbose=True)
@@ -40,8 +41,9 @@ LINE_PAY_REQEST_BASE_URL = "https://{}".format(
 )
 api = LinePayApi(LINE_PAY_CHANNEL_ID, LINE_PAY_CHANNEL_SECRET, is_sandbox=True)
 
-# Cache
-CACHE = {}
+# Order sessions, shared by every worker process on this host
+ORDER_SESSIONS = SQLiteOrderSessionStore(
+    join(dirname(__file__), "order_sessions.db"))
 
 
 @app.route("/request", methods=['GET'])
@@ -49,9 +51,6 @@ def pay_request():
     order_id = str(uuid.uuid4())
     amount = 1
     currency = "JPY"
-    CACHE["order_id"] = order_id
-    CACHE["amount"] = amount
-    CACHE["currency"] = currency
     request_options = {
         "amount": amount,
         "currency": currency,
@@ -82,6 +81,8 @@ def pay_request():
     logger.debug(response)
     # Check Payment Satus
     transaction_id = int(response.get("info", {}).get("transactionId", 0))
+    ORDER_SESSIONS.save(
+        order_id, amount, currency, transaction_id=transaction_id)
     check_result = api.check_payment_status(transaction_id)
     logger.debug(check_result)
     response["transaction_id"] = transaction_id
@@ -96,11 +97,13 @@ def pay_request():
 def pay_confirm():
     transaction_id = int(request.args.get('transactionId'))
     logger.debug("transaction_id: %s", str(transaction_id))
-    CACHE["transaction_id"] = transaction_id
+    session = ORDER_SESSIONS.get_by_transaction(transaction_id)
+    if session is None:
+        abort(404)
     response = api.confirm(
         transaction_id,
-        float(CACHE.get("amount", 0)),
-        CACHE.get("currency", "JPY")
+        float(session.amount),
+        session.currency
     )
     logger.debug(response)
     # Check Payment Satus
@@ -120,7 +123,10 @@ def pay_confirm():
 
 @app.route("/refund", methods=['GET'])
 def pay_refund():
-    transaction_id = int(CACHE.get("transaction_id", 0))
+    transaction_id = int(request.args.get('transactionId'))
+    session = ORDER_SESSIONS.get_by_transaction(transaction_id)
+    if session is None:
+        abort(404)
     logger.debug("transaction_id: %s", str(transaction_id))
     response = api.refund(transaction_id)
     logger.debug(response)
@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+
+"""Non-blocking LINE Pay API client for asyncio.
+
+Requires Python 3.7+ and httpx (``pip install line-pay[async]``)::
+
+    async with AsyncLinePayApi(channel_id, channel_secret) as api:
+        result = await api.confirm(transaction_id, amount, currency)
+"""
+
+import asyncio
+import time
+
+from .api import LinePayApi
+from .pool import PoolHealth
+from .util import LOGGER, validate_function_args_return_value
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+class AsyncLinePayApi(LinePayApi):
+    """AsyncLinePayApi provides non-blocking interface for LINE Pay API.
+
+    Signing, interceptors, error classes and refund ledger work the same
+    as LinePayApi. Every API method is a coroutine.
+    """
+
+    DEFAULT_TIMEOUT = 30.0
+
+    def __init__(
+        self,
+        channel_id: str,
+        channel_secret: str,
+        is_sandbox: bool = False,
+        interceptors=None,
+        capture_error_details: bool = True,
+        refund_ledger=None,
+        idempotency_guard=None,
+        client=None,
+        timeout=DEFAULT_TIMEOUT,
+        call_log=None,
+        timeouts=None
+    ):
+        """__init__ method.
+        :param str channel_id: Your channel id
+        :param str channel_secret: Your channel secret
+        :param bool is_sandbox: Sandbox or not
+        :param interceptors: Interceptors applied to every API call in order
+        :param bool capture_error_details: Keep response headers and body
+            on LinePayApiError
+        :param refund_ledger: Ledger rejecting over-refunds locally
+        :param idempotency_guard: Guard deduplicating Request and Pay
+            Preapproved API calls with the same orderId
+        :param client: httpx.AsyncClient to send requests with. Created and
+            owned by this object when omitted
+        :param float timeout: Timeout in seconds of the owned client
+        :param call_log: Structured log events of API calls
+        :param timeouts: Read timeouts derived from observed latencies and
+            hedging of read-only APIs. Override timeout per API call
+        :type timeouts: linepay.timeouts.AdaptiveTimeouts
+        """
+        super(AsyncLinePayApi, self).__init__(
+            channel_id, channel_secret, is_sandbox=is_sandbox,
+            interceptors=interceptors,
+            capture_error_details=capture_error_details,
+            refund_ledger=refund_ledger,
+            idempotency_guard=idempotency_guard,
+            call_log=call_log)
+        self._owns_client = client is None
+        if client is None:
+            if httpx is None:
+                raise ImportError(
+                    "AsyncLinePayApi requires httpx. "
+                    "Install it with: pip install line-pay[async]")
+            client = httpx.AsyncClient(timeout=timeout)
+        self.client = client
+        # hedged attempts are tasks on the event loop, no hedge thread pool
+        self.timeouts = timeouts
+        # created by drain() on the running event loop
+        self._drained = None
+
+    def __enter__(self):
+        raise TypeError(
+            "AsyncLinePayApi is an asynchronous context manager. "
+            "Use 'async with', or await aclose() when done")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def drain(self, timeout=None):
+        """Stop accepting API calls and wait for in-flight ones
+        New calls raise ClientClosedError. Interceptors, call log and
+        tracer are flushed when the wait ends, even after timeout.
+        :param float timeout: Seconds to wait. Wait until all calls finish
+            when omitted
+        :rtype bool: True when no call is in flight
+        """
+        with self._idle:
+            self._closing = True
+            if self._in_flight and self._drained is None:
+                self._drained = asyncio.Event()
+        drained = True
+        if self._drained is not None:
+            try:
+                await asyncio.wait_for(self._drained.wait(), timeout)
+            except asyncio.TimeoutError:
+                drained = False
+        self._flush()
+        return drained
+
+    async def aclose(self, timeout=None):
+        """Drain API calls, then cancel keepers and close owned HTTP client
+        and release its connections
+        :param float timeout: Seconds to wait for in-flight calls. Wait
+            until all calls finish when omitted
+        :rtype bool: True when no call was in flight anymore
+        """
+        drained = await self.drain(timeout)
+        keepers, self._keepers = self._keepers, []
+        for keeper in keepers:
+            keeper.cancel()
+        if self._owns_client:
+            await self.client.aclose()
+        return drained
+
+    def close(self, timeout=None):
+        """Draining needs the event loop. Await aclose() instead"""
+        raise TypeError(
+            "AsyncLinePayApi cannot be closed synchronously. "
+            "Await aclose() instead")
+
+    def _end_call(self):
+        super(AsyncLinePayApi, self)._end_call()
+        if self._in_flight == 0 and self._drained is not None:
+            self._drained.set()
+
+    async def _head(self, timeout):
+        started = time.perf_counter()
+        response = await self.client.head(self.api_endpoint, timeout=timeout)
+        return response, time.perf_counter() - started
+
+    @validate_function_args_return_value
+    async def warmup(self, connections: int = 4, timeout=5.0):
+        """Open keep-alive connections to the API endpoint ahead of time
+        :param int connections: Number of connections to open
+        :param float timeout: Timeout in seconds of each request
+        :rtpye int: number of connections warmed up
+        """
+        if connections <= 0:
+            raise ValueError("connections must be greater than 0")
+        results = await asyncio.gather(
+            *(self._head(timeout) for _ in range(connections)),
+            return_exceptions=True)
+        return sum(1 for r in results if not isinstance(r, Exception))
+
+    async def probe(self, timeout=5.0):
+        """Check the API endpoint without making a payment call
+        Pool counters of httpx are not public, so idle_connections and
+        max_connections are None.
+        :param float timeout: Timeout in seconds of the probe
+        :rtpye linepay.pool.PoolHealth: health of the endpoint
+        """
+        try:
+            response, rtt = await self._head(timeout)
+            status_code, error = response.status_code, None
+        except httpx.HTTPError as e:
+            rtt = status_code = None
+            error = repr(e)
+        return PoolHealth(
+            self.api_endpoint, error is None, status_code, rtt, None, None,
+            error)
+
+    @validate_function_args_return_value
+    def keep_warm(self, connections: int = 4, interval=30.0):
+        """Keep connections warm on a task of the running event loop
+        :param int connections: Number of connections to keep open
+        :param float interval: Seconds between warm ups
+        :rtpye asyncio.Task: started task. Cancelled by aclose()
+        """
+        if connections <= 0:
+            raise ValueError("connections must be greater than 0")
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0")
+        keeper = asyncio.ensure_future(self._keep_warm(connections, interval))
+        self._keepers.append(keeper)
+        return keeper
+
+    async def _keep_warm(self, connections, interval):
+        while True:
+            try:
+                await self.warmup(connections)
+                health = await self.probe()
+                if not health.reachable:
+                    LOGGER.warning(
+                        "LINE Pay API endpoint %s is unreachable: %s",
+                        health.endpoint, health.error)
+            except Exception:
+                LOGGER.exception("Failed to keep connections warm")
+            await asyncio.sleep(interval)
+
+    async def _execute(self, api_request):
+        """Execute API call and check returnCode of the response
+        :param ApiRequest api_request: API call to execute
+        :rtpye dict: API response
+        """
+        self._begin_call(api_request)
+        try:
+            started, call, method, url, path, body, headers = \
+                self._prepare_call(api_request)
+            try:
+                response = await self._send_call(
+                    api_request, method, url, path, body, headers)
+                result = response.json()
+            except Exception as e:
+                if call is not None:
+                    self._intercept_error(call, e)
+                raise
+            return self._complete_call(
+                api_request, started, call, response, result)
+        finally:
+            self._end_call()
+
+    async def _send_call(self, api_request, method, url, path, body,
+                         headers):
+        """Send HTTP request of API call with adaptive timeouts and hedging
+        The losing attempt of a hedged call is cancelled.
+        :param ApiRequest api_request: API call to send
+        :param str path: Signed API request path
+        :rtype httpx.Response: HTTP response
+        """
+        timeouts = self.timeouts
+        if timeouts is None:
+            return await self._send(method, url, body, headers)
+        api_name = api_request.api_name
+        delay = timeouts.hedge_delay(api_name) if method == "GET" else None
+        if delay is None:
+            return await self._timed_send(
+                api_name, method, url, body, headers)
+        attempts = [asyncio.ensure_future(
+            self._timed_send(api_name, method, url, body, headers))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done or not timeouts.try_hedge(api_name):
+                return await attempts[0]
+            # sign again, a nonce is never sent twice
+            attempts.append(asyncio.ensure_future(self._timed_send(
+                api_name, method, url, body, self.sign(headers, path, body))))
+            pending = attempts
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+                if not pending:
+                    return attempts[0].result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def _timed_send(self, api_name, method, url, body, headers):
+        """Send HTTP request with the adaptive timeout and record latency
+        :rtype httpx.Response: HTTP response
+        """
+        timeouts = self.timeouts
+        default = self.client.timeout
+        connect = timeouts.connect_timeout
+        timeout = httpx.Timeout(
+            connect=default.connect if connect is None else connect,
+            read=timeouts.read_timeout(api_name), write=default.write,
+            pool=default.pool)
+        started = time.perf_counter()
+        try:
+            return await self._send(method, url, body, headers, timeout)
+        finally:
+            timeouts.record(api_name, time.perf_counter() - started)
+
+    async def _send(self, method, url, body, headers, timeout=None):
+        """Send HTTP request
+        :param httpx.Timeout timeout: Timeout of the request. Timeout of
+            the client when None
+        :rtype httpx.Response: HTTP response
+        """
+        if timeout is None:
+            if method == "GET":
+                return await self.client.get(url, headers=headers)
+            return await self.client.post(url, content=body, headers=headers)
+        if method == "GET":
+            return await self.client.get(url, headers=headers, timeout=timeout)
+        return await self.client.post(
+            url, content=body, headers=headers, timeout=timeout)
+
+    @validate_function_args_return_value
+    async def request(self, options: dict, validate: bool = False):
+        """Method to Request Payment
+        :param dict options: LINE Pay Request API Options
+        :param bool validate: Validate options before calling API
+        :rtpye dict: Request API response
+        """
+        api_request = self._build_request(options, validate)
+        key = self._idempotency_key(api_request)
+        if key is None:
+            return await self._execute(api_request)
+        return await self.idempotency_guard.call_async(
+            key, self._execute, api_request)
+
+    @validate_function_args_return_value
+    async def confirm(
+            self, transaction_id: int, amount: float, currency: str):
+        """Method to Confirm Payment
+        :param int transaction_id: Transaction id returned from Request API
+        :param float amount: Payment amount
+        :param str currency: Payment currency (ISO 4217)
+        :rtpye dict: Confirm API response
+        """
+        api_request = self._build_confirm(transaction_id, amount, currency)
+        result = await self._execute(api_request)
+        self._after_confirm(transaction_id, api_request, result)
+        return result
+
+    @validate_function_args_return_value
+    async def capture(
+            self, transaction_id: int, amount: float, currency: str):
+        """Method to Capture Payment
+        :param int transaction_id: Transaction id returned from Request API
+        :param float amount: Payment amount
+        :param str currency: Payment currency (ISO 4217)
+        :rtpye dict: Capture API response
+        """
+        api_request = self._build_capture(transaction_id, amount, currency)
+        result = await self._execute(api_request)
+        self._after_capture(transaction_id, api_request, result)
+        return result
+
+    @validate_function_args_return_value
+    async def void(self, transaction_id: int):
+        """Method to Void Payment
+        :param int transaction_id: Transaction id returned from Request API
+        :rtpye dict: Void API response
+        """
+        return await self._execute(self._build_void(transaction_id))
+
+    @validate_function_args_return_value
+    async def refund(self, transaction_id: int, refund_amount: int = 0):
+        """Method to Refund Payment
+        :param int transaction_id: Transaction id returned from Request API
+        :param float refund_amount: Refund amount. Full refund if 0
+        :rtpye dict: Refund API response
+        """
+        api_request = self._build_refund(transaction_id, refund_amount)
+        ledger = self.refund_ledger
+        if ledger is None:
+            return await self._execute(api_request)
+        if transaction_id not in ledger:
+            ledger.seed(
+                transaction_id,
+                await self.payment_details(transaction_id=transaction_id))
+        reserved = ledger.reserve_refund(transaction_id, refund_amount)
+        try:
+            result = await self._execute(api_request)
+        except BaseException as e:
+            self._release_refund(transaction_id, reserved, e)
+            raise
+        ledger.commit_refund(transaction_id, reserved)
+        return result
+
+    @validate_function_args_return_value
+    async def pay_preapproved(
+            self,
+            reg_key: str,
+            product_name: str,
+            amount: float,
+            currency: str,
+            order_id: str,
+            capture: bool = True):
+        """Method to Pay Preapproved
+        :param str reg_key: RegKey returned from Confirm API
+        :param str product_name: Product name
+        :param float amount: Payment amount
+        :param str currency: Payment currency (ISO 4217)
+        :param str order_id: Order id
+        :param bool capture: Capture payment nor not
+        :rtpye dict: Pay Preapproved API response
+        """
+        api_request = self._build_pay_preapproved(
+            reg_key, product_name, amount, currency, order_id, capture)
+        key = self._idempotency_key(api_request)
+        if key is None:
+            return await self._execute(api_request)
+        return await self.idempotency_guard.call_async(
+            key, self._execute, api_request)
+
+    @validate_function_args_return_value
+    async def check_regkey(
+            self, reg_key: str, credit_card_auth: bool = False):
+        """Method to Check RegKey
+        :param str reg_key: Reg Key returned from Confirm API
+        :param bool credit_card_auth: Whether credit cards issued with RegKey
+            have authorized minimum amount
+        :rtpye dict: Check RegKey API response
+        """
+        return await self._execute(self._build_check_regkey(
+            reg_key, credit_card_auth))
+
+    @validate_function_args_return_value
+    async def expire_regkey(self, reg_key: str):
+        """Method to Expire RegKey
+        :param str reg_key: Reg Key returned from Confirm API
+        :rtpye dict: Expire RegKey API response
+        """
+        return await self._execute(self._build_expire_regkey(reg_key))
+
+    @validate_function_args_return_value
+    async def check_payment_status(self, transaction_id: int):
+        """Method to Check Payment Status
+        :param int transaction_id: TransactionId returned from Request API
+        :rtpye dict: Check Payment Status API response
+        """
+        return await self._execute(self._build_check_payment_status(
+            transaction_id))
+
+    @validate_function_args_return_value
+    async def payment_details(
+            self, transaction_id: int = None, order_id: str = None):
+        """Method to Payment Details
+        :param int transaction_id: Payment or refund transaction ID
+        :param str order_id: Order ID of the merchant
+        :rtpye dict: Payment Details API response
+        """
+        return await self._execute(self._build_payment_details(
+            transaction_id, order_id))
@@ -1,20 +1,35 @@
 # -*- coding: utf-8 -*-
 
 import base64
-import copy
+from collections import namedtuple
+from concurrent import futures
+from contextlib import ExitStack
 from enum import Enum
 import hashlib
 import hmac
 import json
 import requests
+import threading
+import time
 import uuid
 
-from .util import validate_function_args_return_value, LOGGER
-from .exceptions import LinePayApiError
+from .util import validate_function_args_return_value
+from .exceptions import error_class_for, ClientClosedError, LinePayApiError
+from .call_log import CallLog
+from .interceptors import InterceptorChain, LinePayCall
+from . import pool
+from . import tracing
 
 
 class LinePayApi(object):
-    """LinePayApi provides interface for LINE Pay API."""
+    """LinePayApi provides interface for LINE Pay API.
+
+    Use the client as a context manager, or call close() on shutdown, to
+    let in-flight API calls finish before the process exits::
+
+        with LinePayApi(channel_id, channel_secret) as api:
+            api.confirm(transaction_id, amount, currency)
+    """
 
     LINE_PAY_API_VERSION = "v3"
     DEFAULT_API_ENDPOINT = "https://api-pay.line.me"
@@ -22,6 +37,8 @@ class LinePayApi(object):
     CHECK_REGKEY_SAFE_RETURN_CODE_LIST = ["0000", "1190", "1193"]
     CHECK_PAYMENT_STATUS_SAFE_RETURN_CODE_LIST = [
         "0000", "0110", "0121", "0122", "0123"]
+    # threads sending attempts of hedged API calls
+    HEDGE_WORKERS = 16
 
     @classmethod
     @validate_function_args_return_value
@@ -51,12 +68,47 @@ class LinePayApi(object):
         self,
         channel_id: str,
         channel_secret: str,
-        is_sandbox: bool = False
+        is_sandbox: bool = False,
+        interceptors=None,
+        capture_error_details: bool = True,
+        refund_ledger=None,
+        idempotency_guard=None,
+        session=None,
+        lanes=None,
+        call_log=None,
+        tracer=None,
+        timeouts=None
     ):
         """__init__ method.
         :param str channel_id: Your channel id
         :param str channel_secret: Your channel secret
         :param bool is_sandbox: Sandbox or not
+        :param interceptors: Interceptors applied to every API call in order
+        :type interceptors: list of linepay.interceptors.Interceptor
+        :param bool capture_error_details: Keep response headers and body
+            on LinePayApiError. Disable for bulk jobs expecting many errors
+        :param refund_ledger: Ledger rejecting over-refunds locally. May be
+            shared by several clients
+        :type refund_ledger: linepay.ledger.RefundLedger
+        :param idempotency_guard: Guard deduplicating Request and Pay
+            Preapproved API calls with the same orderId. May be shared by
+            several clients
+        :type idempotency_guard: linepay.idempotency.IdempotencyGuard
+        :param session: Session keeping connections alive between API
+            calls. A new connection is opened for every call when omitted
+        :type session: requests.Session
+        :param lanes: Priority lanes with their own connections and
+            concurrency caps. Overrides session for API calls
+        :type lanes: linepay.lanes.PriorityLanes
+        :param call_log: Structured log events of API calls. Debug events
+            of every call on the "linepay" logger when omitted
+        :type call_log: linepay.call_log.CallLog
+        :param tracer: Tracer creating a span per API call with child
+            spans per phase. Tracing is off when omitted
+        :type tracer: linepay.tracing.OpenTelemetryTracer
+        :param timeouts: Read timeouts derived from observed latencies and
+            hedging of read-only APIs. No timeout is set when omitted
+        :type timeouts: linepay.timeouts.AdaptiveTimeouts
         """
         self.channel_id: str = channel_id
         self.channel_secret: str = channel_secret
@@ -65,12 +117,198 @@ class LinePayApi(object):
         self.api_endpoint: str = self.DEFAULT_API_ENDPOINT
         if (self.is_sandbox is True):
             self.api_endpoint = self.SANDBOX_API_ENDPOINT
+        self.capture_error_details: bool = capture_error_details
+        self.refund_ledger = refund_ledger
+        self.idempotency_guard = idempotency_guard
+        self.session = session
+        self.lanes = lanes
+        self.call_log = call_log or CallLog()
+        self.tracer = tracer
+        self.timeouts = timeouts
+        self._hedge_pool = None
+        if timeouts is not None and timeouts.hedged_apis:
+            workers = self.HEDGE_WORKERS
+            if lanes is not None:
+                # a first and a hedged attempt for every slot of the lanes
+                workers = 2 * sum(lane.max_concurrent for lane in lanes)
+            self._hedge_pool = futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="linepay-hedge")
+            # free workers of the hedge pool
+            self._hedge_workers = threading.BoundedSemaphore(workers)
+        # sessions created by warmup() or probe() are closed by close()
+        self._owns_session = False
+        self._keepers = []
+        self._in_flight = 0
+        # attempts of hedged calls on the hedge pool
+        self._attempts = 0
+        self._closing = False
+        self._idle = threading.Condition()
 
         self.headers: dict = {
             "X-LINE-ChannelId": self.channel_id,
             "Content-Type": "application/json"
         }
 
+        self._interceptors = InterceptorChain(interceptors or ())
+        self._hooks = self._interceptors.compile()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closing(self):
+        """True once drain() or close() was called"""
+        return self._closing
+
+    def in_flight(self):
+        """Number of API calls in progress
+        :rtype int: number of in-flight calls
+        """
+        return self._in_flight
+
+    def drain(self, timeout=None):
+        """Stop accepting API calls and wait for in-flight ones
+        Losing attempts of hedged calls are waited for too. New calls raise
+        ClientClosedError. Interceptors, call log and tracer are flushed
+        when the wait ends, even after timeout.
+        :param float timeout: Seconds to wait. Wait until all calls finish
+            when omitted
+        :rtype bool: True when no call is in flight
+        """
+        with self._idle:
+            self._closing = True
+            drained = self._idle.wait_for(
+                lambda: self._in_flight == 0 and self._attempts == 0,
+                timeout)
+        self._flush()
+        return drained
+
+    def close(self, timeout=None):
+        """Drain API calls, then stop keepers, the tracer and close owned
+        connections
+        Sessions and lanes passed to the client are closed by their owner.
+        Tracers with a stop() method (ex. AllocationProfiler) are stopped.
+        :param float timeout: Seconds to wait for in-flight calls. Wait
+            until all calls finish when omitted
+        :rtype bool: True when no call was in flight anymore
+        """
+        drained = self.drain(timeout)
+        keepers, self._keepers = self._keepers, []
+        for keeper in keepers:
+            keeper.stop()
+        stop = getattr(self.tracer, "stop", None)
+        if stop is not None:
+            stop()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        if self._owns_session and self.session is not None:
+            self.session.close()
+        return drained
+
+    def _flush(self):
+        for interceptor in self._interceptors:
+            flush = getattr(interceptor, "flush", None)
+            if flush is not None:
+                flush()
+        self.call_log.flush()
+        flush = getattr(self.tracer, "flush", None)
+        if flush is not None:
+            flush()
+
+    def _begin_call(self, api_request):
+        with self._idle:
+            if self._closing:
+                raise ClientClosedError(
+                    api_request.api_name, "Client is closed")
+            self._in_flight += 1
+
+    def _end_call(self):
+        with self._idle:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    def add_interceptor(self, interceptor):
+        """Append interceptor at the end of the interceptor chain
+        :param Interceptor interceptor: interceptor to add
+        """
+        self._interceptors.add(interceptor)
+        self._hooks = self._interceptors.compile()
+
+    def remove_interceptor(self, interceptor):
+        """Remove interceptor from the interceptor chain
+        :param Interceptor interceptor: interceptor to remove
+        """
+        self._interceptors.remove(interceptor)
+        self._hooks = self._interceptors.compile()
+
+    @validate_function_args_return_value
+    def warmup(self, connections: int = 4, timeout=5.0) -> int:
+        """Open keep-alive connections to the API endpoint ahead of time
+        With lanes, connections of every lane are opened, up to
+        max_concurrent of the lane. Otherwise a pooled session is created
+        when the client has no session.
+        :param int connections: Number of connections to open per session.
+            Should not exceed the pool size of the session
+        :param float timeout: Timeout in seconds of each request
+        :rtpye int: number of connections warmed up
+        """
+        if self.lanes is not None:
+            if connections <= 0:
+                raise ValueError("connections must be greater than 0")
+            return sum(
+                pool.warm_up(
+                    lane.session, self.api_endpoint,
+                    min(connections, lane.max_concurrent), timeout)
+                for lane in self.lanes)
+        if self.session is None:
+            self.session = pool.create_pooled_session(
+                max(connections, pool.DEFAULT_POOL_MAXSIZE))
+            self._owns_session = True
+        return pool.warm_up(
+            self.session, self.api_endpoint, connections, timeout)
+
+    def probe(self, timeout=5.0):
+        """Check the API endpoint and the connection pool without making
+        a payment call
+        With lanes, every lane is probed. Connections are counted over
+        all lanes, and status, rtt and error are of the first unreachable
+        lane, or of the slowest one.
+        :param float timeout: Timeout in seconds of the probe
+        :rtpye linepay.pool.PoolHealth: health of the connection pool
+        """
+        if self.lanes is not None:
+            healths = [
+                pool.probe(lane.session, self.api_endpoint, timeout)
+                for lane in self.lanes]
+            unreachable = [h for h in healths if not h.reachable]
+            if unreachable:
+                health = unreachable[0]
+            else:
+                health = max(healths, key=lambda h: h.rtt)
+            return health._replace(
+                idle_connections=sum(h.idle_connections for h in healths),
+                max_connections=sum(h.max_connections for h in healths))
+        if self.session is None:
+            self.session = pool.create_pooled_session()
+            self._owns_session = True
+        return pool.probe(self.session, self.api_endpoint, timeout)
+
+    @validate_function_args_return_value
+    def keep_warm(self, connections: int = 4, interval=30.0):
+        """Keep connections warm on a background thread
+        :param int connections: Number of connections to keep open
+        :param float interval: Seconds between warm ups
+        :rtpye linepay.pool.ConnectionKeeper: started keeper. Stopped by
+            close()
+        """
+        keeper = pool.ConnectionKeeper(self, connections, interval).start()
+        self._keepers.append(keeper)
+        return keeper
+
     @validate_function_args_return_value
     def sign(
         self,
@@ -85,9 +323,8 @@ class LinePayApi(object):
             (Without "?") for GET Request
         :rtpye dict: signed headers
         """
-        LOGGER.debug("path: %s", path)
-        LOGGER.debug("body: %s", body)
-        signed_headers: dict = copy.deepcopy(headers)
+        # headers are flat str to str, so a shallow copy is enough
+        signed_headers: dict = dict(headers)
         # Create nonce
         nonce: str = self._create_nonce()
         signed_headers["X-LINE-Authorization-Nonce"] = nonce
@@ -99,7 +336,6 @@ class LinePayApi(object):
             hmac_key, hmac_text_bytes, hashlib.sha256)
         signed_headers["X-LINE-Authorization"] = base64.b64encode(
             sign.digest()).decode()
-        LOGGER.debug(signed_headers)
         return signed_headers
 
     @validate_function_args_return_value
@@ -109,40 +345,349 @@ class LinePayApi(object):
         """
         return str(uuid.uuid4())
 
-    @validate_function_args_return_value
-    def request(self, options: dict) -> dict:
-        """Method to Request Payment
-        :param dict options: LINE Pay Request API Options
-            see https://pay.line.me/jp/developers/apis/onlineApis?locale=ja_JP
-        :rtpye dict: Request API response
+    def _execute(self, api_request):
+        """Execute API call and check returnCode of the response
+        :param ApiRequest api_request: API call to execute
+        :rtpye dict: API response
+        """
+        self._begin_call(api_request)
+        try:
+            if self.tracer is not None:
+                return self._execute_traced(api_request)
+            if self.lanes is None:
+                return self._execute_with(api_request, self.session)
+            with self.lanes.slot(api_request.api_name) as lane:
+                return self._execute_with(api_request, lane.session)
+        finally:
+            self._end_call()
+
+    def _execute_traced(self, api_request):
+        """Execute API call in a span, with a child span per phase
+        :param ApiRequest api_request: API call to execute
+        :rtpye dict: API response
+        """
+        tracer = self.tracer
+        with tracer.span(
+                "LINE Pay " + api_request.api_name,
+                tracing.request_attributes(
+                    api_request, self.api_endpoint)) as root:
+            if self.lanes is None:
+                return self._execute_with(
+                    api_request, self.session, tracer.span, root)
+            with ExitStack() as stack:
+                with tracer.span("linepay.acquire") as span:
+                    lane = stack.enter_context(
+                        self.lanes.slot(api_request.api_name))
+                    span.set_attribute("linepay.lane", lane.name)
+                return self._execute_with(
+                    api_request, lane.session, tracer.span, root)
+
+    def _execute_with(self, api_request, session, span=tracing.null_span,
+                      root=None):
+        """Execute API call with the session
+        :param ApiRequest api_request: API call to execute
+        :param requests.Session session: Session to send the request with.
+            requests module when None
+        :param span: span() of the tracer, creating a span per phase
+        :param root: Span of the API call, None when tracing is off
+        :rtpye dict: API response
+        """
+        started, call, method, url, path, body, headers = \
+            self._prepare_call(api_request, span)
+        try:
+            with span("linepay.send"):
+                response = self._send_call(
+                    api_request, method, url, path, body, headers, session)
+            with span("linepay.parse"):
+                result = response.json()
+        except Exception as e:
+            if call is not None:
+                self._intercept_error(call, e)
+            raise
+        return self._complete_call(
+            api_request, started, call, response, result, root)
+
+    def _prepare_call(self, api_request, span=tracing.null_span):
+        """Serialize and sign API call, through the interceptor hooks if any
+        Shared by LinePayApi and AsyncLinePayApi.
+        :param ApiRequest api_request: API call to execute
+        :param span: span() of the tracer, creating a span per phase
+        :rtype tuple: log start time, LinePayCall (None without
+            interceptors), HTTP method, URL, signed path, body and signed
+            headers
+        """
+        started = self._log_started()
+        with span("linepay.serialize"):
+            method, url, body = self._prepare(api_request)
+        with span("linepay.sign"):
+            if self._hooks is None:
+                path = api_request.path
+                return started, None, method, url, path, body, \
+                    self.sign(self.headers, path, body)
+            call = self._intercept_request(api_request, url, body)
+        return started, call, call.method, call.url, call.path, call.body, \
+            call.headers
+
+    def _complete_call(self, api_request, started, call, response, result,
+                       root=None):
+        """Pass response through the interceptor hooks, log it and check
+        its returnCode. Shared by LinePayApi and AsyncLinePayApi.
+        :param ApiRequest api_request: executed API call
+        :param float started: log start time of _prepare_call()
+        :param LinePayCall call: call of _prepare_call(), or None
+        :param response: HTTP response
+        :param dict result: parsed response body
+        :param root: Span of the API call, None when tracing is off
+        :rtpye dict: API response
+        """
+        if call is not None:
+            call.response, call.result = response, result
+            response, result = self._intercept_response(call)
+        if root is not None:
+            for key, value in tracing.response_attributes(
+                    response, result).items():
+                root.set_attribute(key, value)
+        if started is not None:
+            self._log_call(api_request, response, result, started)
+        return self._check_result(api_request, response, result)
+
+    def _log_started(self):
+        """Start time of API call when it may be logged
+        :rtype float: time.perf_counter(), or None when logging is disabled
+        """
+        if self.call_log.enabled():
+            return time.perf_counter()
+        return None
+
+    def _log_call(self, api_request, response, result, started):
+        """Emit log event of API call
+        :param ApiRequest api_request: executed API call
+        :param response: HTTP response
+        :param dict result: parsed response body
+        :param float started: value of _log_started()
+        """
+        self.call_log.log_call(
+            api_request, response.status_code, result,
+            time.perf_counter() - started)
+
+    def _prepare(self, api_request):
+        """Build URL and body (or Query String) of API call
+        :param ApiRequest api_request: API call to execute
+        :rtype tuple: HTTP method, URL and body
+        """
+        method = api_request.method
+        if method == "GET":
+            body = api_request.query
+            if body == "":
+                url = self.api_endpoint + api_request.path
+            else:
+                url = self.api_endpoint + api_request.path + "?" + body
+        else:
+            body = json.dumps(api_request.options)
+            url = self.api_endpoint + api_request.path
+        return method, url, body
+
+    def _check_result(self, api_request, response, result):
+        """Check returnCode of API response
+        :param ApiRequest api_request: executed API call
+        :param response: HTTP response
+        :param dict result: parsed response body
+        :rtpye dict: API response
         """
-        path = "/{api_version}/payments/request".format(
-            api_version=self.LINE_PAY_API_VERSION
-        )
-        url = "{api_endpoint}{path}".format(
-            api_endpoint=self.api_endpoint,
-            path=path
-        )
-        body_str = json.dumps(options)
-        headers = self.sign(self.headers, path, body_str)
-
-        LOGGER.debug("Going to execute Request API [URL: %s]", url)
-        response = requests.post(url, json.dumps(options), headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
         return_code = result.get("returnCode", None)
-        if return_code == "0000":
-            LOGGER.debug("Request API Completed!")
+        if return_code in api_request.safe_return_codes:
             return result
         else:
-            LOGGER.debug("Request API Failed...")
-            raise LinePayApiError(
+            error_class = error_class_for(return_code)
+            if self.capture_error_details is False:
+                raise error_class(
+                    return_code=return_code,
+                    status_code=response.status_code,
+                    headers=None,
+                    api_response=None,
+                    return_message=result.get("returnMessage", None)
+                )
+            raise error_class(
                 return_code=return_code,
                 status_code=response.status_code,
-                headers=dict(response.headers.items()),
+                headers=response.headers,
                 api_response=result
             )
 
+    def _intercept_request(self, api_request, url, body):
+        """Sign API call through the compiled interceptor hooks
+        :rtype LinePayCall: call ready to send
+        """
+        hooks = self._hooks
+        call = LinePayCall(
+            self, api_request.api_name, api_request.method,
+            api_request.path, url, body, self.headers,
+            api_request.safe_return_codes)
+        if hooks.before_sign:
+            call.headers = dict(call.headers)
+            for hook in hooks.before_sign:
+                hook(call)
+        call.headers = self.sign(call.headers, call.path, call.body)
+        for hook in hooks.after_sign:
+            hook(call)
+        for hook in hooks.before_send:
+            hook(call)
+        return call
+
+    def _intercept_error(self, call, error):
+        """Pass error of sending or parsing through the compiled
+        interceptor hooks
+        """
+        for hook in self._hooks.on_error:
+            hook(call, error)
+
+    def _intercept_response(self, call):
+        """Pass response of API call through the compiled interceptor hooks
+        :rtype tuple: HTTP response and parsed response body
+        """
+        for hook in self._hooks.after_response:
+            hook(call)
+        return call.response, call.result
+
+    def _send_call(self, api_request, method, url, path, body, headers,
+                   session=None):
+        """Send HTTP request of API call with adaptive timeouts and hedging
+        Attempts of hedged calls run on the hedge pool only while it has a
+        free worker, so they never wait in its queue. Otherwise the call is
+        sent on the caller's thread without hedging. With lanes, the hedged
+        attempt takes a slot of its own and is not sent when the lane is
+        full.
+        :param ApiRequest api_request: API call to send
+        :param str path: Signed API request path
+        :rtype requests.Response: HTTP response
+        """
+        timeouts = self.timeouts
+        if timeouts is None:
+            return self._send(method, url, body, headers, session)
+        api_name = api_request.api_name
+        delay = None
+        if method == "GET" and self._hedge_pool is not None:
+            delay = timeouts.hedge_delay(api_name)
+        if delay is None or not self._hedge_workers.acquire(False):
+            return self._timed_send(
+                api_name, method, url, body, headers, session)
+        first = self._submit_attempt(
+            None, api_name, method, url, body, headers, session)
+        done, _ = futures.wait((first,), delay)
+        if done:
+            return first.result()
+        hedged, lane = self._try_hedge(api_name)
+        if not hedged:
+            return first.result()
+        # sign again, a nonce is never sent twice
+        second = self._submit_attempt(
+            lane, api_name, method, url, body,
+            self.sign(headers, path, body), session)
+        pending = (first, second)
+        while True:
+            done, pending = futures.wait(
+                pending, return_when=futures.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    return attempt.result()
+            if not pending:
+                return first.result()
+
+    def _try_hedge(self, api_name):
+        """Take a worker of the hedge pool, a hedge from the budget and,
+        with lanes, a slot of the lane for the hedged attempt
+        :param str api_name: API name
+        :rtype tuple: whether the hedged attempt may be sent, and the lane
+            holding its slot (None without lanes)
+        """
+        if not self._hedge_workers.acquire(False):
+            return False, None
+        lane = None
+        if self.lanes is not None:
+            lane = self.lanes.try_acquire(api_name)
+            if lane is None:
+                self._hedge_workers.release()
+                return False, None
+        if not self.timeouts.try_hedge(api_name):
+            if lane is not None:
+                self.lanes.release(lane)
+            self._hedge_workers.release()
+            return False, None
+        return True, lane
+
+    def _submit_attempt(self, lane, *args):
+        """Send attempt of a hedged call on the hedge pool
+        The attempt counts as in flight until it ends, even when the call
+        returned with the other attempt. Its worker is taken by the caller.
+        :param Lane lane: Lane holding the slot of the attempt, or None
+        :rtype concurrent.futures.Future: future of the HTTP response
+        """
+        with self._idle:
+            self._attempts += 1
+        return self._hedge_pool.submit(self._send_attempt, lane, *args)
+
+    def _send_attempt(self, lane, api_name, method, url, body, headers,
+                      session=None):
+        """Send attempt of a hedged call, then give back its worker and
+        its slot of the lane
+        :rtype requests.Response: HTTP response
+        """
+        try:
+            return self._timed_send(
+                api_name, method, url, body, headers, session)
+        finally:
+            if lane is not None:
+                self.lanes.release(lane)
+            self._hedge_workers.release()
+            with self._idle:
+                self._attempts -= 1
+                if self._attempts == 0:
+                    self._idle.notify_all()
+
+    def _timed_send(self, api_name, method, url, body, headers,
+                    session=None):
+        """Send HTTP request with the adaptive timeout and record latency
+        :rtype requests.Response: HTTP response
+        """
+        timeouts = self.timeouts
+        started = time.perf_counter()
+        try:
+            return self._send(method, url, body, headers, session,
+                              timeouts.timeout_for(api_name))
+        finally:
+            timeouts.record(api_name, time.perf_counter() - started)
+
+    def _send(self, method, url, body, headers, session=None, timeout=None):
+        """Send HTTP request
+        :param float timeout: Timeout passed to requests. Not passed when
+            None
+        :rtype requests.Response: HTTP response
+        """
+        http = requests if session is None else session
+        if timeout is None:
+            if method == "GET":
+                return http.get(url, headers=headers)
+            return http.post(url, body, headers=headers)
+        if method == "GET":
+            return http.get(url, headers=headers, timeout=timeout)
+        return http.post(url, body, headers=headers, timeout=timeout)
+
+    @validate_function_args_return_value
+    def request(self, options: dict, validate: bool = False) -> dict:
+        """Method to Request Payment
+        :param dict options: LINE Pay Request API Options
+            see https://pay.line.me/jp/developers/apis/onlineApis?locale=ja_JP
+        :param bool validate: Validate options before calling API. Raises
+            ValueError for missing fields, unsupported currency or amounts
+            not matching packages and products
+        :rtpye dict: Request API response
+        """
+        api_request = self._build_request(options, validate)
+        key = self._idempotency_key(api_request)
+        if key is None:
+            return self._execute(api_request)
+        return self.idempotency_guard.call(key, self._execute, api_request)
+
     @validate_function_args_return_value
     def confirm(self, transaction_id: int, amount: float, currency: str) \
             -> dict:
@@ -153,41 +698,10 @@ class LinePayApi(object):
             are USD, JPY, TWD and THB
         :rtpye dict: Confirm API response
         """
-        if (self.__class__.is_supported_currency(currency) is False):
-            raise ValueError(
-                "Currency:[{}] is not supported by LINE Pay".format(currency))
-        path = "/{api_version}/payments/{transaction_id}/confirm".format(
-            api_version=self.LINE_PAY_API_VERSION,
-            transaction_id=str(transaction_id)
-        )
-        url = "{api_endpoint}{path}".format(
-            api_endpoint=self.api_endpoint,
-            path=path
-        )
-        amount = self.__class__.round_amount_by_currency(currency, amount)
-        options = {
-            "amount": amount,
-            "currency": currency
-        }
-        body_str = json.dumps(options)
-        headers = self.sign(self.headers, path, body_str)
-
-        LOGGER.debug("Going to execute Confirm API [URL: %s]", url)
-        response = requests.post(url, json.dumps(options), headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code == "0000":
-            LOGGER.debug("Confirm API Completed!")
-            return result
-        else:
-            LOGGER.debug("Confirm API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
+        api_request = self._build_confirm(transaction_id, amount, currency)
+        result = self._execute(api_request)
+        self._after_confirm(transaction_id, api_request, result)
+        return result
 
     @validate_function_args_return_value
     def capture(self, transaction_id: int, amount: float, currency: str) \
@@ -199,42 +713,10 @@ class LinePayApi(object):
             are USD, JPY, TWD and THB
         :rtpye dict: Capture API response
         """
-        if (self.__class__.is_supported_currency(currency) is False):
-            raise ValueError(
-                "Currency:[{}] is not supported by LINE Pay".format(currency))
-        path = "/{api_version}/payments/authorizations/" \
-            "{transaction_id}/capture".format(
-                api_version=self.LINE_PAY_API_VERSION,
-                transaction_id=str(transaction_id)
-            )
-        url = "{api_endpoint}{path}".format(
-            api_endpoint=self.api_endpoint,
-            path=path
-        )
-        amount = self.__class__.round_amount_by_currency(currency, amount)
-        options = {
-            "amount": amount,
-            "currency": currency
-        }
-        body_str = json.dumps(options)
-        headers = self.sign(self.headers, path, body_str)
-
-        LOGGER.debug("Going to execute Capture API [URL: %s]", url)
-        response = requests.post(url, json.dumps(options), headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code == "0000":
-            LOGGER.debug("Capture API Completed!")
-            return result
-        else:
-            LOGGER.debug("Capture API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
+        api_request = self._build_capture(transaction_id, amount, currency)
+        result = self._execute(api_request)
+        self._after_capture(transaction_id, api_request, result)
+        return result
 
     @validate_function_args_return_value
     def void(self, transaction_id: int) -> dict:
@@ -242,35 +724,7 @@ class LinePayApi(object):
         :param int transaction_id: Transaction id returned from Request API
         :rtpye dict: Void API response
         """
-        path = "/{api_version}/payments/authorizations/" \
-            "{transaction_id}/void".format(
-                api_version=self.LINE_PAY_API_VERSION,
-                transaction_id=str(transaction_id)
-            )
-        url = "{api_endpoint}{path}".format(
-            api_endpoint=self.api_endpoint,
-            path=path
-        )
-        options = {}
-        body_str = json.dumps(options)
-        headers = self.sign(self.headers, path, body_str)
-
-        LOGGER.debug("Going to execute Void API [URL: %s]", url)
-        response = requests.post(url, json.dumps(options), headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code == "0000":
-            LOGGER.debug("Void API Completed!")
-            return result
-        else:
-            LOGGER.debug("Void API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
+        return self._execute(self._build_void(transaction_id))
 
     @validate_function_args_return_value
     def refund(self, transaction_id: int, refund_amount: int = 0) -> dict:
@@ -279,39 +733,25 @@ class LinePayApi(object):
         :param float refund_amount: Refund amount. Full refund if not returned
         :rtpye dict: Refund API response
         """
-        path = "/{api_version}/payments/{transaction_id}/refund".format(
-            api_version=self.LINE_PAY_API_VERSION,
-            transaction_id=str(transaction_id)
-        )
-        url = "{api_endpoint}{path}".format(
-            api_endpoint=self.api_endpoint,
-            path=path
-        )
-        if (refund_amount > 0):
-            options = {
-                "refundAmount": refund_amount
-            }
-        else:
-            options = {}
-        body_str = json.dumps(options)
-        headers = self.sign(self.headers, path, body_str)
+        api_request = self._build_refund(transaction_id, refund_amount)
+        ledger = self.refund_ledger
+        if ledger is None:
+            return self._execute(api_request)
+        reserved = ledger.reserve_refund(
+            transaction_id, refund_amount, self._load_payment_details)
+        try:
+            result = self._execute(api_request)
+        except BaseException as e:
+            self._release_refund(transaction_id, reserved, e)
+            raise
+        ledger.commit_refund(transaction_id, reserved)
+        return result
 
-        LOGGER.debug("Going to execute Refund API [URL: %s]", url)
-        response = requests.post(url, json.dumps(options), headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code == "0000":
-            LOGGER.debug("Refund API Completed!")
-            return result
-        else:
-            LOGGER.debug("Refund API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
+    def _load_payment_details(self, transaction_id):
+        """Load Payment Details of the transaction for refund ledger
+        :rtype dict: Payment Details API response
+        """
+        return self.payment_details(transaction_id=transaction_id)
 
     @validate_function_args_return_value
     def pay_preapproved(
@@ -332,6 +772,126 @@ class LinePayApi(object):
         :param bool capture: Capture payment nor not
         :rtpye dict: Pay Preapproved API response
         """
+        api_request = self._build_pay_preapproved(
+            reg_key, product_name, amount, currency, order_id, capture)
+        key = self._idempotency_key(api_request)
+        if key is None:
+            return self._execute(api_request)
+        return self.idempotency_guard.call(key, self._execute, api_request)
+
+    @validate_function_args_return_value
+    def check_regkey(self, reg_key: str, credit_card_auth: bool = False) \
+            -> dict:
+        """Method to Check RegKey
+        :param str reg_key: Reg Key returned from Confirm API
+        :param bool credit_card_auth: Whether credit cards issued with RegKey
+            have authorized minimum amount
+        :rtpye dict: Check RegKey API response
+        """
+        return self._execute(self._build_check_regkey(
+            reg_key, credit_card_auth))
+
+    @validate_function_args_return_value
+    def expire_regkey(self, reg_key: str) -> dict:
+        """Method to Expire RegKey
+        :param str reg_key: Reg Key returned from Confirm API
+        :rtpye dict: Expire RegKey API response
+        """
+        return self._execute(self._build_expire_regkey(reg_key))
+
+    @validate_function_args_return_value
+    def check_payment_status(self, transaction_id: int) -> dict:
+        """Method to Check Payment Status
+        :param int transaction_id: TransactionId returned from Request API
+        :rtpye dict: Check Payment Status API response
+        """
+        return self._execute(self._build_check_payment_status(
+            transaction_id))
+
+    @validate_function_args_return_value
+    def payment_details(
+        self, transaction_id: int = None,
+            order_id: str = None) -> dict:
+        """Method to Payment Details
+        :param int transaction_id: Payment or refund transaction ID generated
+            by LINE Pay
+        :param str order_id: Order ID of the merchant
+        :rtpye dict: Payment Details API response
+        """
+        return self._execute(self._build_payment_details(
+            transaction_id, order_id))
+
+    # Request builders shared by LinePayApi and AsyncLinePayApi
+
+    def _build_request(self, options, validate=False):
+        if validate is True:
+            from .validators import validate_request_options
+            if self.tracer is None:
+                validate_request_options(options)
+            else:
+                with self.tracer.span(
+                        "linepay.validate", {"linepay.api": "Request"}):
+                    validate_request_options(options)
+        path = "/{api_version}/payments/request".format(
+            api_version=self.LINE_PAY_API_VERSION
+        )
+        return ApiRequest("Request", "POST", path, options)
+
+    def _build_confirm(self, transaction_id, amount, currency):
+        if (self.__class__.is_supported_currency(currency) is False):
+            raise ValueError(
+                "Currency:[{}] is not supported by LINE Pay".format(currency))
+        path = "/{api_version}/payments/{transaction_id}/confirm".format(
+            api_version=self.LINE_PAY_API_VERSION,
+            transaction_id=str(transaction_id)
+        )
+        amount = self.__class__.round_amount_by_currency(currency, amount)
+        options = {
+            "amount": amount,
+            "currency": currency
+        }
+        return ApiRequest("Confirm", "POST", path, options)
+
+    def _build_capture(self, transaction_id, amount, currency):
+        if (self.__class__.is_supported_currency(currency) is False):
+            raise ValueError(
+                "Currency:[{}] is not supported by LINE Pay".format(currency))
+        path = "/{api_version}/payments/authorizations/" \
+            "{transaction_id}/capture".format(
+                api_version=self.LINE_PAY_API_VERSION,
+                transaction_id=str(transaction_id)
+            )
+        amount = self.__class__.round_amount_by_currency(currency, amount)
+        options = {
+            "amount": amount,
+            "currency": currency
+        }
+        return ApiRequest("Capture", "POST", path, options)
+
+    def _build_void(self, transaction_id):
+        path = "/{api_version}/payments/authorizations/" \
+            "{transaction_id}/void".format(
+                api_version=self.LINE_PAY_API_VERSION,
+                transaction_id=str(transaction_id)
+            )
+        return ApiRequest("Void", "POST", path, {})
+
+    def _build_refund(self, transaction_id, refund_amount=0):
+        path = "/{api_version}/payments/{transaction_id}/refund".format(
+            api_version=self.LINE_PAY_API_VERSION,
+            transaction_id=str(transaction_id)
+        )
+        if (refund_amount > 0):
+            options = {
+                "refundAmount": refund_amount
+            }
+        else:
+            options = {}
+        return ApiRequest("Refund", "POST", path, options)
+
+    def _build_pay_preapproved(
+            self, reg_key, product_name, amount, currency, order_id,
+            capture=True):
         if (self.__class__.is_supported_currency(currency) is False):
             raise ValueError(
                 "Currency:[{}] is not supported by LINE Pay".format(currency))
@@ -340,10 +900,6 @@ class LinePayApi(object):
                 api_version=self.LINE_PAY_API_VERSION,
                 reg_key=reg_key
             )
-        url = "{api_endpoint}{path}".format(
-            api_endpoint=self.api_endpoint,
-            path=path
-        )
         amount = self.__class__.round_amount_by_currency(currency, amount)
         options = {
             "productName": product_name,
@@ -352,35 +908,9 @@ class LinePayApi(object):
             "orderId": order_id,
             "capture": capture
         }
-        body_str = json.dumps(options)
-        headers = self.sign(self.headers, path, body_str)
-
-        LOGGER.debug("Going to execute Pay Preapproved API [URL: %s]", url)
-        response = requests.post(url, json.dumps(options), headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code == "0000":
-            LOGGER.debug("Pay Preapproved API Completed!")
-            return result
-        else:
-            LOGGER.debug("Pay Preapproved API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
+        return ApiRequest("Pay Preapproved", "POST", path, options)
 
-    @validate_function_args_return_value
-    def check_regkey(self, reg_key: str, credit_card_auth: bool = False) \
-            -> dict:
-        """Method to Check RegKey
-        :param str reg_key: Reg Key returned from Confirm API
-        :param bool credit_card_auth: Whether credit cards issued with RegKey
-            have authorized minimum amount
-        :rtpye dict: Check RegKey API response
-        """
+    def _build_check_regkey(self, reg_key, credit_card_auth=False):
         path = "/{api_version}/payments/preapprovedPay/{reg_key}/check".format(
             api_version=self.LINE_PAY_API_VERSION,
             reg_key=reg_key
@@ -389,117 +919,29 @@ class LinePayApi(object):
         query = ""
         if (credit_card_auth is True):
             query = "creditCardAuth=true"
-        if query == "":
-            url = "{api_endpoint}{path}".format(
-                api_endpoint=self.api_endpoint,
-                path=path
-            )
-        else:
-            url = "{api_endpoint}{path}?{query}".format(
-                api_endpoint=self.api_endpoint,
-                path=path,
-                query=query
-            )
-        headers = self.sign(self.headers, path, query)
+        return ApiRequest(
+            "Check RegKey", "GET", path, query=query,
+            safe_return_codes=self.CHECK_REGKEY_SAFE_RETURN_CODE_LIST)
 
-        LOGGER.debug("Going to execute Check RegKey API [URL: %s]", url)
-        response = requests.get(url, headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code in self.CHECK_REGKEY_SAFE_RETURN_CODE_LIST:
-            LOGGER.debug("Check RegKey API Completed!")
-            return result
-        else:
-            LOGGER.debug("Check RegKey API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
-
-    @validate_function_args_return_value
-    def expire_regkey(self, reg_key: str) -> dict:
-        """Method to Expire RegKey
-        :param str reg_key: Reg Key returned from Confirm API
-        :rtpye dict: Expire RegKey API response
-        """
+    def _build_expire_regkey(self, reg_key):
         path = "/{api_version}/payments/preapprovedPay/" \
             "{reg_key}/expire".format(
                 api_version=self.LINE_PAY_API_VERSION,
                 reg_key=reg_key
             )
-        url = "{api_endpoint}{path}".format(
-            api_endpoint=self.api_endpoint,
-            path=path
-        )
-        options = {}
-        body_str = json.dumps(options)
-        headers = self.sign(self.headers, path, body_str)
-
-        LOGGER.debug("Going to execute Expire RegKey API [URL: %s]", url)
-        response = requests.post(url, json.dumps(options), headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code == "0000":
-            LOGGER.debug("Expire RegKey API Completed!")
-            return result
-        else:
-            LOGGER.debug("Expire RegKey API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
+        return ApiRequest("Expire RegKey", "POST", path, {})
 
-    @validate_function_args_return_value
-    def check_payment_status(self, transaction_id: int) -> dict:
-        """Method to Check Payment Status
-        :param int transaction_id: TransactionId returned from Request API
-        :rtpye dict: Check Payment Status API response
-        """
+    def _build_check_payment_status(self, transaction_id):
         path = "/{api_version}/payments/requests/" \
             "{transaction_id}/check".format(
                 api_version=self.LINE_PAY_API_VERSION,
                 transaction_id=str(transaction_id)
             )
-        url = "{api_endpoint}{path}".format(
-            api_endpoint=self.api_endpoint,
-            path=path
-        )
-        headers = self.sign(self.headers, path, "")
+        return ApiRequest(
+            "Check Payment Status", "GET", path,
+            safe_return_codes=self.CHECK_PAYMENT_STATUS_SAFE_RETURN_CODE_LIST)
 
-        LOGGER.debug(
-            "Going to execute Check Payment Status API [URL: %s]", url)
-        response = requests.get(url, headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code in self.CHECK_PAYMENT_STATUS_SAFE_RETURN_CODE_LIST:
-            LOGGER.debug("Check Payment Status API Completed!")
-            return result
-        else:
-            LOGGER.debug("Check Payment Status API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
-
-    @validate_function_args_return_value
-    def payment_details(
-        self, transaction_id: int = None,
-            order_id: str = None) -> dict:
-        """Method to Payment Details
-        :param int transaction_id: Payment or refund transaction ID generated
-            by LINE Pay
-        :param str order_id: Order ID of the merchant
-        :rtpye dict: Payment Details API response
-        """
+    def _build_payment_details(self, transaction_id=None, order_id=None):
         path = "/{api_version}/payments".format(
             api_version=self.LINE_PAY_API_VERSION
         )
@@ -511,35 +953,63 @@ class LinePayApi(object):
             query += "orderId={}".format(order_id)
         if query.endswith("?") or query.endswith("&"):
             query = query[:-1]
-        # build URL
-        if query == "":
-            url = "{api_endpoint}{path}".format(
-                api_endpoint=self.api_endpoint,
-                path=path
-            )
-        else:
-            url = "{api_endpoint}{path}?{query}".format(
-                api_endpoint=self.api_endpoint,
-                path=path,
-                query=query
-            )
-        headers = self.sign(self.headers, path, query)
-        LOGGER.debug("Going to execute Payment Details API [URL: %s]", url)
-        response = requests.get(url, headers=headers)
-        result = response.json()
-        LOGGER.debug(result)
-        return_code = result.get("returnCode", None)
-        if return_code == "0000":
-            LOGGER.debug("Payment Details API Completed!")
-            return result
-        else:
-            LOGGER.debug("Payment Details API Failed...")
-            raise LinePayApiError(
-                return_code=return_code,
-                status_code=response.status_code,
-                headers=dict(response.headers.items()),
-                api_response=result
-            )
+        return ApiRequest("Payment Details", "GET", path, query=query)
+
+    def _idempotency_key(self, api_request):
+        """Idempotency key of Request or Pay Preapproved API call
+        orderId is unique per merchant only, so the key includes the
+        channel id for guards shared by several clients.
+        :rtype tuple: channel id, API name and orderId, or None without
+            guard or orderId
+        """
+        if self.idempotency_guard is None:
+            return None
+        order_id = api_request.options.get("orderId", None)
+        if order_id is None:
+            return None
+        return self.channel_id, api_request.api_name, order_id
+
+    # Refund ledger bookkeeping shared by LinePayApi and AsyncLinePayApi
+
+    def _after_confirm(self, transaction_id, api_request, result):
+        # Payment with capture=false is not refundable until captured
+        if self.refund_ledger is not None and \
+                "authorizationExpireDate" not in result.get("info", {}):
+            self.refund_ledger.record_payment(
+                transaction_id, api_request.options["amount"])
+
+    def _after_capture(self, transaction_id, api_request, result):
+        if self.refund_ledger is not None:
+            self.refund_ledger.record_payment(
+                transaction_id, api_request.options["amount"])
+
+    def _release_refund(self, transaction_id, reserved, error):
+        ledger = self.refund_ledger
+        if isinstance(error, LinePayApiError) and error.return_code == "1165":
+            # Already refunded
+            ledger.mark_fully_refunded(transaction_id)
+        ledger.release_refund(transaction_id, reserved)
+
+
+class ApiRequest(namedtuple(
+        "ApiRequest",
+        ("api_name", "method", "path", "options", "query",
+         "safe_return_codes"))):
+    """API call to execute.
+    :param str api_name: API name used in log messages
+    :param str method: HTTP method ("GET" or "POST")
+    :param str path: API request path
+    :param dict options: API request body for POST Request
+    :param str query: Query String (Without "?") for GET Request
+    :param safe_return_codes: returnCodes treated as success
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, api_name, method, path, options=None, query="",
+                safe_return_codes=("0000",)):
+        return super(ApiRequest, cls).__new__(
+            cls, api_name, method, path, options, query, safe_return_codes)
 
 
 class CurrencyType(Enum):
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""ASGI (Starlette / FastAPI) routes for the Request -> Confirm flow.
+
+Requires Python 3.7+, starlette and httpx (``pip install line-pay[asgi]``)::
+
+    api = AsyncLinePayApi(channel_id, channel_secret, is_sandbox=True)
+    store = SQLiteOrderSessionStore("order_sessions.db")
+
+    async def build_order(request):
+        return {"amount": 1, "currency": "JPY", "orderId": ..., "packages": ...}
+
+    router = create_payment_router(api, store, build_order)
+    app.mount("/pay", router)  # Starlette or FastAPI application
+
+``GET /pay/request`` redirects to LINE Pay, which redirects back to
+``/pay/confirm`` or ``/pay/cancel``. Session store calls run on the
+thread pool of starlette, so a store on disk does not block the event
+loop.
+"""
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, RedirectResponse
+from starlette.routing import Route, Router
+
+from .exceptions import LinePayApiError
+from .util import LOGGER
+
+
+async def _default_on_confirmed(request, session, result):
+    return JSONResponse(result)
+
+
+async def _default_on_cancelled(request, session):
+    return JSONResponse({"cancelled": True})
+
+
+def _error_response(error):
+    return JSONResponse(
+        {"returnCode": error.return_code, "returnMessage": error.message},
+        status_code=502)
+
+
+def create_payment_routes(
+        api,
+        session_store,
+        build_order,
+        on_confirmed=_default_on_confirmed,
+        on_cancelled=_default_on_cancelled,
+        redirect=True):
+    """Create routes for /request, /confirm and /cancel
+    :param AsyncLinePayApi api: LINE Pay API client
+    :param OrderSessionStore session_store: store keeping order between
+        Request and Confirm API
+    :param build_order: Coroutine function taking starlette Request and
+        returning Request API options. redirectUrls are filled in from
+        the /confirm and /cancel routes when omitted
+    :param on_confirmed: Coroutine function taking (request, session,
+        Confirm API response) and returning the response to the customer
+    :param on_cancelled: Coroutine function taking (request, session) and
+        returning the response to the customer
+    :param bool redirect: Redirect /request to the payment URL. Returns
+        Request API response as JSON when False
+    :rtype list: starlette Routes
+    """
+
+    async def pay_request(request):
+        options = await build_order(request)
+        if "redirectUrls" not in options:
+            options = dict(options)
+            options["redirectUrls"] = {
+                "confirmUrl": str(request.url_for("linepay_confirm")),
+                "cancelUrl": str(request.url_for("linepay_cancel"))
+            }
+        try:
+            response = await api.request(options)
+        except LinePayApiError as e:
+            return _error_response(e)
+        info = response.get("info", {})
+        await run_in_threadpool(
+            session_store.save, options["orderId"], options["amount"],
+            options["currency"],
+            transaction_id=int(info.get("transactionId", 0)))
+        if redirect:
+            return RedirectResponse(info["paymentUrl"]["web"])
+        return JSONResponse(response)
+
+    async def pay_confirm(request):
+        try:
+            transaction_id = int(request.query_params["transactionId"])
+        except (KeyError, ValueError):
+            return JSONResponse(
+                {"error": "transactionId is required"}, status_code=400)
+        session = await run_in_threadpool(
+            session_store.get_by_transaction, transaction_id)
+        if session is None:
+            return JSONResponse(
+                {"error": "order session not found"}, status_code=404)
+        LOGGER.debug("Confirming transaction %s", transaction_id)
+        try:
+            result = await api.confirm(
+                transaction_id, float(session.amount), session.currency)
+        except LinePayApiError as e:
+            return _error_response(e)
+        # a reloaded confirmUrl must not confirm again
+        await run_in_threadpool(session_store.delete, session.order_id)
+        return await on_confirmed(request, session, result)
+
+    async def pay_cancel(request):
+        session = None
+        transaction_id = request.query_params.get("transactionId")
+        if transaction_id is not None and transaction_id.isdigit():
+            session = await run_in_threadpool(
+                session_store.get_by_transaction, int(transaction_id))
+            if session is not None:
+                await run_in_threadpool(session_store.delete, session.order_id)
+        return await on_cancelled(request, session)
+
+    return [
+        Route("/request", pay_request, methods=["GET"],
+              name="linepay_request"),
+        Route("/confirm", pay_confirm, methods=["GET"],
+              name="linepay_confirm"),
+        Route("/cancel", pay_cancel, methods=["GET"],
+              name="linepay_cancel"),
+    ]
+
+
+def create_payment_router(api, session_store, build_order, **kwargs):
+    """Create starlette Router for /request, /confirm and /cancel.
+    Accepts the same arguments as create_payment_routes.
+    :rtype starlette.routing.Router: router to mount on the application
+    """
+    return Router(routes=create_payment_routes(
+        api, session_store, build_order, **kwargs))
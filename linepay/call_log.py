@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""Structured, sampled and redacted log events of API calls.
+
+LinePayApi emits one event per API call when its logger is enabled for
+the level of the CallLog. Fields of the event are passed as
+``record.linepay`` for structured (ex. JSON) formatters::
+
+    call_log = CallLog(level=logging.INFO,
+                       sample_rates={"Payment Details": 0.01})
+    api = LinePayApi(channel_id, channel_secret, call_log=call_log)
+
+Failed calls are always logged. Successful calls are logged at the
+sample rate of their API. Request and response bodies are only included
+with include_bodies, with purchaser and regKey fields redacted.
+"""
+
+import logging
+import random
+import re
+
+from .util import LOGGER
+
+REDACTED = "***"
+
+# body fields holding credentials or personal information
+REDACTED_FIELDS = frozenset((
+    "regKey", "recipient", "address", "email", "phoneNo", "firstName",
+    "lastName", "firstNameOptional", "lastNameOptional",
+))
+
+_REG_KEY_PATH = re.compile(r"(/preapprovedPay/)[^/?]+")
+
+
+def redact(value, fields=REDACTED_FIELDS):
+    """Copy of a JSON value with fields replaced by REDACTED
+    :param value: JSON value (dict, list or scalar)
+    :param fields: Field names to redact at any depth
+    :rtype: redacted copy
+    """
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if k in fields else redact(v, fields)
+            for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v, fields) for v in value]
+    return value
+
+
+def redact_path(path):
+    """API path with regKey replaced by REDACTED
+    :param str path: API request path
+    :rtype str: redacted path
+    """
+    return _REG_KEY_PATH.sub(r"\g<1>" + REDACTED, path)
+
+
+class CallLog(object):
+    """Emits one log event per API call."""
+
+    def __init__(
+            self,
+            logger=LOGGER,
+            level=logging.DEBUG,
+            sample_rates=None,
+            default_sample_rate=1.0,
+            include_bodies=False,
+            redact_fields=REDACTED_FIELDS,
+            random=random.random):
+        """__init__ method.
+        :param logging.Logger logger: Logger to emit events to
+        :param int level: Level of events
+        :param dict sample_rates: API name (ex. "Payment Details") to rate
+            of successful calls logged, from 0.0 to 1.0
+        :param float default_sample_rate: Rate of APIs not in sample_rates
+        :param bool include_bodies: Add redacted request and response
+            bodies to events
+        :param redact_fields: Body field names to redact
+        :param random: Function returning a float in [0.0, 1.0)
+        """
+        self.logger = logger
+        self.level = level
+        self.sample_rates = sample_rates or {}
+        self.default_sample_rate = default_sample_rate
+        self.include_bodies = include_bodies
+        self.redact_fields = redact_fields
+        self._random = random
+
+    def enabled(self):
+        """Whether events are emitted at all. Cheap enough to check on
+        every call
+        :rtype bool: logger is enabled for the level
+        """
+        return self.logger.isEnabledFor(self.level)
+
+    def sampled(self, api_name):
+        """Whether a successful call of the API is logged
+        :param str api_name: API name (ex. "Confirm")
+        :rtype bool: True when logged
+        """
+        rate = self.sample_rates.get(api_name, self.default_sample_rate)
+        return rate >= 1.0 or (rate > 0.0 and self._random() < rate)
+
+    def flush(self):
+        """Flush handlers the events reach"""
+        logger = self.logger
+        while logger is not None:
+            for handler in logger.handlers:
+                handler.flush()
+            if not logger.propagate:
+                break
+            logger = logger.parent
+
+    def log_call(self, api_request, status_code, result, elapsed):
+        """Emit event of an API call
+        :param ApiRequest api_request: executed API call
+        :param int status_code: HTTP status code
+        :param dict result: parsed response body
+        :param float elapsed: Seconds from signing to parsed response
+        """
+        return_code = result.get("returnCode", None)
+        succeeded = return_code in api_request.safe_return_codes
+        if succeeded and not self.sampled(api_request.api_name):
+            return
+        event = {
+            "api": api_request.api_name,
+            "method": api_request.method,
+            "path": redact_path(api_request.path),
+            "status_code": status_code,
+            "return_code": return_code,
+            "return_message": result.get("returnMessage", None),
+            "succeeded": succeeded,
+            "elapsed_ms": round(elapsed * 1000.0, 3),
+        }
+        if self.include_bodies:
+            if api_request.method == "GET":
+                event["request"] = api_request.query
+            else:
+                event["request"] = redact(
+                    api_request.options, self.redact_fields)
+            event["response"] = redact(result, self.redact_fields)
+        self.logger.log(
+            self.level, "%s API %s [returnCode: %s, status: %s, %.1f ms]",
+            event["api"], "completed" if succeeded else "failed",
+            return_code, status_code, elapsed * 1000.0,
+            extra={"linepay": event})
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+
+"""Scheduler capturing authorized payments in rate-limited batches.
+
+Payments confirmed with ``"capture": False`` are authorized only, and the
+authorization expires at ``authorizationExpireDate``. The scheduler keeps
+them until they are marked ready (e.g. shipped), then captures them in
+order of expiry. Authorizations cancelled, or not ready within
+void_margin of expiry, are voided::
+
+    scheduler = CaptureScheduler(api, rate=5)
+    scheduler.add_confirmed(transaction_id, amount, currency, confirm_result)
+    ...
+    scheduler.mark_ready(transaction_id)  # when the order ships
+    threading.Thread(target=scheduler.run, args=(stop_event,)).start()
+"""
+
+from collections import deque, namedtuple
+import calendar
+import heapq
+import threading
+import time
+
+from .exceptions import LinePayApiError
+from .ratelimit import TokenBucket
+from .util import LOGGER
+
+ACTION_CAPTURE = "capture"
+ACTION_VOID = "void"
+ACTION_EXPIRED = "expired"
+
+_PENDING = 0
+_READY = 1
+_CANCELLED = 2
+_IN_PROGRESS = 3
+
+_EXPIRE_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_expire_date(value):
+    """Parse authorizationExpireDate of Confirm API response
+    :param str value: date in ISO 8601 format, e.g. 2020-01-31T23:59:59Z
+    :rtype float: POSIX timestamp
+    """
+    return float(calendar.timegm(time.strptime(value, _EXPIRE_DATE_FORMAT)))
+
+
+class ScheduledAction(namedtuple(
+        "ScheduledAction", ("transaction_id", "action", "result", "error"))):
+    """Outcome of a capture, void or expiry of an authorization."""
+
+    __slots__ = ()
+
+    @property
+    def succeeded(self):
+        return self.error is None and self.action != ACTION_EXPIRED
+
+
+class _Authorization(object):
+
+    __slots__ = ("transaction_id", "amount", "currency", "expires_at",
+                 "state", "attempts")
+
+    def __init__(self, transaction_id, amount, currency, expires_at):
+        self.transaction_id = transaction_id
+        self.amount = amount
+        self.currency = currency
+        self.expires_at = expires_at
+        self.state = _PENDING
+        self.attempts = 0
+
+
+class CaptureScheduler(object):
+    """Captures or voids authorized payments before they expire.
+
+    Authorizations are held in two heaps ordered by deadline: pending ones
+    by the time they must be voided, ready ones by expiry. Heap entries of
+    authorizations that changed state are skipped when popped.
+    """
+
+    DEFAULT_RATE = 10.0
+    DEFAULT_BATCH_SIZE = 20
+    DEFAULT_VOID_MARGIN = 3600
+    DEFAULT_MAX_ATTEMPTS = 3
+
+    def __init__(
+            self,
+            api,
+            rate=DEFAULT_RATE,
+            batch_size=DEFAULT_BATCH_SIZE,
+            void_margin=DEFAULT_VOID_MARGIN,
+            max_attempts=DEFAULT_MAX_ATTEMPTS,
+            clock=time.time,
+            rate_limiter=None):
+        """__init__ method.
+        :param LinePayApi api: Client to call Capture and Void API with
+        :param float rate: Maximum Capture and Void API calls per second
+        :param int batch_size: Maximum calls per batch
+        :param float void_margin: Seconds before expiry at which
+            authorizations not ready are voided
+        :param int max_attempts: Attempts of a call failing with a
+            retryable error
+        :param clock: Function returning current POSIX time in seconds
+        :param TokenBucket rate_limiter: Rate limiter shared with other
+            jobs. Created from rate when omitted
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be greater than 0")
+        if void_margin < 0:
+            raise ValueError("void_margin must not be negative")
+        self.api = api
+        self.batch_size = batch_size
+        self.void_margin = void_margin
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self._rate_limiter = rate_limiter or TokenBucket(rate)
+        self._entries = {}
+        # (void deadline, transaction id) of pending authorizations
+        self._pending = []
+        # (expires at, transaction id) of authorizations ready to capture
+        self._ready = []
+        self._cancelled = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self._entries
+
+    def add(self, transaction_id, amount, currency, expires_at, ready=False):
+        """Add authorized payment
+        :param int transaction_id: Transaction id
+        :param float amount: Amount to capture
+        :param str currency: Payment currency
+        :param float expires_at: POSIX time the authorization expires
+        :param bool ready: Capture as soon as possible
+        """
+        entry = _Authorization(transaction_id, amount, currency, expires_at)
+        with self._lock:
+            if transaction_id in self._entries:
+                raise ValueError(
+                    "transaction[{}] is already scheduled".format(
+                        transaction_id))
+            self._entries[transaction_id] = entry
+            if ready:
+                self._push_ready(entry)
+            else:
+                heapq.heappush(self._pending, (
+                    expires_at - self.void_margin, transaction_id))
+
+    def add_confirmed(self, transaction_id, amount, currency, confirm_result,
+                      ready=False):
+        """Add payment authorized by Confirm API
+        :param int transaction_id: Transaction id
+        :param float amount: Amount to capture
+        :param str currency: Payment currency
+        :param dict confirm_result: Confirm API response
+        :param bool ready: Capture as soon as possible
+        """
+        expire_date = confirm_result.get("info", {}).get(
+            "authorizationExpireDate", None)
+        if expire_date is None:
+            raise ValueError(
+                "transaction[{}] is not an authorization".format(
+                    transaction_id))
+        self.add(transaction_id, amount, currency,
+                 parse_expire_date(expire_date), ready=ready)
+
+    def mark_ready(self, transaction_id):
+        """Capture the authorization in a coming batch
+        :param int transaction_id: Transaction id
+        :rtype bool: False when not scheduled or already cancelled
+        """
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is None or entry.state != _PENDING:
+                return False
+            self._push_ready(entry)
+            return True
+
+    def cancel(self, transaction_id):
+        """Void the authorization in a coming batch
+        :param int transaction_id: Transaction id
+        :rtype bool: False when not scheduled or capture is in progress
+        """
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is None or entry.state == _IN_PROGRESS:
+                return False
+            if entry.state != _CANCELLED:
+                entry.state = _CANCELLED
+                self._cancelled.append(entry.transaction_id)
+            return True
+
+    def next_deadline(self):
+        """Earliest time something has to be done
+        :rtype float: POSIX time, or None when nothing is scheduled
+        """
+        with self._lock:
+            if self._cancelled or self._ready:
+                return self._clock()
+            while self._pending:
+                deadline, transaction_id = self._pending[0]
+                entry = self._entries.get(transaction_id)
+                if entry is not None and entry.state == _PENDING:
+                    return deadline
+                heapq.heappop(self._pending)
+            return None
+
+    def run_batch(self):
+        """Run one batch of Void and Capture API calls.
+        Cancelled authorizations are voided first, then authorizations
+        reaching void_margin, then ready ones in order of expiry.
+        :rtype list: ScheduledAction of every authorization done. Calls
+            failing with a retryable error are queued again and omitted
+        """
+        now = self._clock()
+        outcomes = []
+        with self._lock:
+            budget = self._rate_limiter.acquire_up_to(self.batch_size)
+            jobs = self._take_jobs(now, budget, outcomes)
+        if budget > len(jobs):
+            self._rate_limiter.release(budget - len(jobs))
+        for action, entry in jobs:
+            outcome = self._run_job(action, entry)
+            if outcome is not None:
+                outcomes.append(outcome)
+        return outcomes
+
+    def run(self, stop_event, on_outcome=None, interval=1.0):
+        """Run batches until stop_event is set
+        :param threading.Event stop_event: Event stopping the scheduler
+        :param on_outcome: Function called with every ScheduledAction
+        :param float interval: Maximum seconds to sleep between batches
+        """
+        while not stop_event.is_set():
+            outcomes = self.run_batch()
+            if on_outcome is not None:
+                for outcome in outcomes:
+                    on_outcome(outcome)
+            if outcomes:
+                continue
+            wait = interval
+            deadline = self.next_deadline()
+            if deadline is not None:
+                wait = min(wait, max(
+                    deadline - self._clock(), self._rate_limiter.delay()))
+            stop_event.wait(wait)
+
+    def _push_ready(self, entry):
+        entry.state = _READY
+        heapq.heappush(self._ready, (entry.expires_at, entry.transaction_id))
+
+    def _take_jobs(self, now, budget, outcomes):
+        jobs = []
+        entries = self._entries
+        cancelled = self._cancelled
+        while cancelled and len(jobs) < budget:
+            entry = entries.get(cancelled.popleft())
+            if entry is not None and entry.state == _CANCELLED:
+                entry.state = _IN_PROGRESS
+                jobs.append((ACTION_VOID, entry))
+        pending = self._pending
+        while pending and pending[0][0] <= now and len(jobs) < budget:
+            entry = entries.get(heapq.heappop(pending)[1])
+            if entry is not None and entry.state == _PENDING:
+                entry.state = _IN_PROGRESS
+                jobs.append((ACTION_VOID, entry))
+        ready = self._ready
+        while ready and len(jobs) < budget:
+            expires_at, transaction_id = heapq.heappop(ready)
+            entry = entries.get(transaction_id)
+            if entry is None or entry.state != _READY:
+                continue
+            if expires_at <= now:
+                del entries[transaction_id]
+                LOGGER.warning(
+                    "Authorization of transaction %s expired before capture",
+                    transaction_id)
+                outcomes.append(ScheduledAction(
+                    transaction_id, ACTION_EXPIRED, None, None))
+                continue
+            entry.state = _IN_PROGRESS
+            jobs.append((ACTION_CAPTURE, entry))
+        return jobs
+
+    def _run_job(self, action, entry):
+        transaction_id = entry.transaction_id
+        entry.attempts += 1
+        try:
+            if action == ACTION_CAPTURE:
+                result = self.api.capture(
+                    transaction_id, float(entry.amount), entry.currency)
+            else:
+                result = self.api.void(transaction_id)
+        except Exception as e:
+            retryable = e.retryable if isinstance(e, LinePayApiError) \
+                else True
+            if retryable and entry.attempts < self.max_attempts:
+                LOGGER.debug(
+                    "%s of transaction %s failed, retrying: %s",
+                    action, transaction_id, e)
+                self._requeue(action, entry)
+                return None
+            LOGGER.warning(
+                "%s of transaction %s failed: %s", action, transaction_id, e)
+            self._remove(transaction_id)
+            return ScheduledAction(transaction_id, action, None, e)
+        self._remove(transaction_id)
+        return ScheduledAction(transaction_id, action, result, None)
+
+    def _requeue(self, action, entry):
+        with self._lock:
+            if action == ACTION_CAPTURE:
+                self._push_ready(entry)
+            else:
+                entry.state = _CANCELLED
+                self._cancelled.append(entry.transaction_id)
+
+    def _remove(self, transaction_id):
+        with self._lock:
+            self._entries.pop(transaction_id, None)
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+"""Record and replay of LINE Pay API calls.
+
+RecordingSession sends requests with a real session and records every
+request/response pair into a Cassette. ReplaySession answers from a
+Cassette without network, matching on method, path (with Query String)
+and JSON body. Both are passed as the session of LinePayApi::
+
+    cassette = Cassette()
+    api = LinePayApi(channel_id, channel_secret, is_sandbox=True,
+                     session=RecordingSession(cassette))
+    ...
+    cassette.save("checkout.jsonl.gz")
+
+    api = LinePayApi(channel_id, channel_secret, is_sandbox=True,
+                     session=ReplaySession(Cassette.load("checkout.jsonl.gz")))
+
+Request headers (signature, nonce, channel id) are never recorded.
+regKey and purchaser fields are redacted from paths and bodies before
+recording and before matching, so replays match whatever regKey is used.
+"""
+
+from collections import namedtuple
+import gzip
+import json
+from urllib.parse import urlsplit
+
+import requests
+
+from .call_log import redact, redact_path
+from .exceptions import CassetteMissError
+
+# response headers not worth recording
+_DROPPED_HEADERS = frozenset(("set-cookie", "date", "connection"))
+
+
+class Interaction(namedtuple("Interaction", (
+        "method", "path", "body", "status_code", "headers", "response"))):
+    """Recorded API call.
+    :param str method: HTTP method
+    :param str path: Redacted request path with Query String
+    :param str body: Canonical redacted JSON body, or "" for GET
+    :param int status_code: HTTP status code
+    :param dict headers: Response headers
+    :param str response: Response body
+    """
+
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return self.method, self.path, self.body
+
+
+def _request_path(url):
+    parts = urlsplit(url)
+    path = redact_path(parts.path)
+    if parts.query:
+        path += "?" + parts.query
+    return path
+
+
+def _canonical_body(body):
+    if not body:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    try:
+        value = json.loads(body)
+    except ValueError:
+        return body
+    return json.dumps(
+        redact(value), sort_keys=True, separators=(",", ":"),
+        ensure_ascii=False)
+
+
+def _response_value(text):
+    """Response body as saved in a cassette
+    :param str text: Response body
+    :rtype tuple: parsed JSON and True, or raw body (ex. HTML error page
+        of a proxy) and False
+    """
+    if not text:
+        return None, True
+    try:
+        return json.loads(text), True
+    except ValueError:
+        return text, False
+
+
+class Cassette(object):
+    """Ordered list of recorded interactions."""
+
+    def __init__(self, interactions=None):
+        """__init__ method.
+        :param interactions: Recorded interactions
+        :type interactions: list of Interaction
+        """
+        self.interactions = list(interactions or ())
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def append(self, interaction):
+        """Add interaction
+        :param Interaction interaction: interaction to add
+        """
+        self.interactions.append(interaction)
+
+    def save(self, path):
+        """Write interactions as JSON Lines, gzipped when path ends with .gz
+        :param str path: file path
+        """
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8") as f:
+            for i in self.interactions:
+                response, is_json = _response_value(i.response)
+                f.write(json.dumps({
+                    "method": i.method, "path": i.path, "body": i.body,
+                    "status_code": i.status_code, "headers": i.headers,
+                    "response": response, "json": is_json,
+                }, ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+
+    @classmethod
+    def load(cls, path):
+        """Read interactions written by save
+        :param str path: file path
+        :rtype Cassette: loaded cassette
+        """
+        opener = gzip.open if path.endswith(".gz") else open
+        interactions = []
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record["response"]
+                if response is None:
+                    response = ""
+                elif record.get("json", True):
+                    # cassettes saved without the flag only had JSON bodies
+                    response = json.dumps(response)
+                interactions.append(Interaction(
+                    record["method"], record["path"], record["body"],
+                    record["status_code"], record["headers"], response))
+        return cls(interactions)
+
+
+class RecordingSession(object):
+    """Session recording requests sent with another session."""
+
+    def __init__(self, cassette, session=None):
+        """__init__ method.
+        :param Cassette cassette: Cassette to record into
+        :param requests.Session session: Session sending the requests.
+            requests module when omitted
+        """
+        self.cassette = cassette
+        self.session = session
+
+    def _record(self, method, url, body, response):
+        headers = {
+            k: v for k, v in response.headers.items()
+            if k.lower() not in _DROPPED_HEADERS}
+        text = response.text
+        try:
+            text = json.dumps(redact(json.loads(text)))
+        except ValueError:
+            pass
+        self.cassette.append(Interaction(
+            method, _request_path(url), _canonical_body(body),
+            response.status_code, headers, text))
+        return response
+
+    def get(self, url, **kwargs):
+        http = requests if self.session is None else self.session
+        return self._record("GET", url, "", http.get(url, **kwargs))
+
+    def post(self, url, data=None, **kwargs):
+        http = requests if self.session is None else self.session
+        return self._record("POST", url, data, http.post(url, data, **kwargs))
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+class ReplayResponse(object):
+    """Response replayed from a cassette, like requests.Response."""
+
+    __slots__ = ("url", "status_code", "headers", "text")
+
+    def __init__(self, url, interaction):
+        self.url = url
+        self.status_code = interaction.status_code
+        # shared by every replay of the interaction
+        self.headers = interaction.headers
+        self.text = interaction.response
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ReplaySession(object):
+    """Session answering requests from a cassette without network."""
+
+    def __init__(self, cassette, repeat=True):
+        """__init__ method.
+        :param Cassette cassette: Recorded interactions
+        :param bool repeat: Replay interactions of the same request from
+            the first again when all have been replayed. Raise
+            CassetteMissError when False
+        """
+        self.repeat = repeat
+        self._interactions = {}
+        for interaction in cassette.interactions:
+            self._interactions.setdefault(
+                interaction.key, []).append(interaction)
+        self._positions = dict.fromkeys(self._interactions, 0)
+
+    def _replay(self, method, url, body):
+        key = (method, _request_path(url), _canonical_body(body))
+        interactions = self._interactions.get(key, None)
+        if interactions is None:
+            raise CassetteMissError(method, key[1], key[2])
+        position = self._positions[key]
+        if position >= len(interactions):
+            if not self.repeat:
+                raise CassetteMissError(
+                    method, key[1], key[2], "All interactions were replayed")
+            position = 0
+        self._positions[key] = position + 1
+        return ReplayResponse(url, interactions[position])
+
+    def get(self, url, **kwargs):
+        return self._replay("GET", url, "")
+
+    def post(self, url, data=None, **kwargs):
+        return self._replay("POST", url, data)
+
+    def close(self):
+        pass
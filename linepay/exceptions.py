@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 
+from collections import namedtuple
+import sys
+
+from .return_codes import RETURN_CODES, ReturnCodeCategory, lookup
+
 
 class BaseError(Exception):
     """Base Exception class."""
@@ -35,30 +40,295 @@ class InvalidSignatureError(BaseError):
         super(InvalidSignatureError, self).__init__(message)
 
 
+class RefundRejectedError(BaseError):
+    """When local refund ledger rejects a refund before calling the API."""
+
+    def __init__(self, transaction_id, refund_amount, refundable_amount,
+                 message='-'):
+        """__init__ method.
+
+        :param int transaction_id: Transaction id
+        :param refund_amount: Requested refund amount
+        :param refundable_amount: Amount that can still be refunded
+        :param str message: Human readable message
+        """
+        super(RefundRejectedError, self).__init__(message)
+
+        self.transaction_id = transaction_id
+        self.refund_amount = refund_amount
+        self.refundable_amount = refundable_amount
+
+    def __str__(self):
+        """str.
+
+        :rtype: str
+        """
+        return '{0}: transaction_id={1}, refund_amount={2}, refundable_amount={3}, message={4}'.format(
+            self.__class__.__name__, self.transaction_id, self.refund_amount,
+            self.refundable_amount, self.message)
+
+
+class RateLimitExceededError(BaseError):
+    """When a local rate limit rejects an API call before it is sent."""
+
+    def __init__(self, key, retry_after, message='-'):
+        """__init__ method.
+
+        :param key: Rate limited key (ex. channel id)
+        :param float retry_after: Seconds until the call would be allowed
+        :param str message: Human readable message
+        """
+        super(RateLimitExceededError, self).__init__(message)
+
+        self.key = key
+        self.retry_after = retry_after
+
+    def __str__(self):
+        """str.
+
+        :rtype: str
+        """
+        return '{0}: key={1}, retry_after={2:.3f}, message={3}'.format(
+            self.__class__.__name__, self.key, self.retry_after, self.message)
+
+
+class BulkheadFullError(BaseError):
+    """When a priority lane has no slot for an API call."""
+
+    def __init__(self, lane, message='-'):
+        """__init__ method.
+
+        :param str lane: Lane name
+        :param str message: Human readable message
+        """
+        super(BulkheadFullError, self).__init__(message)
+
+        self.lane = lane
+
+    def __str__(self):
+        """str.
+
+        :rtype: str
+        """
+        return '{0}: lane={1}, message={2}'.format(
+            self.__class__.__name__, self.lane, self.message)
+
+
+class ClientClosedError(BaseError):
+    """When an API call is made on a draining or closed client."""
+
+    def __init__(self, api_name, message='-'):
+        """__init__ method.
+
+        :param str api_name: API name (ex. "Confirm")
+        :param str message: Human readable message
+        """
+        super(ClientClosedError, self).__init__(message)
+
+        self.api_name = api_name
+
+    def __str__(self):
+        """str.
+
+        :rtype: str
+        """
+        return '{0}: api_name={1}, message={2}'.format(
+            self.__class__.__name__, self.api_name, self.message)
+
+
+class CassetteMissError(BaseError):
+    """When a replayed request is not recorded in the cassette."""
+
+    def __init__(self, method, path, body, message='-'):
+        """__init__ method.
+
+        :param str method: HTTP method
+        :param str path: Request path with Query String
+        :param str body: Canonical request body
+        :param str message: Human readable message
+        """
+        super(CassetteMissError, self).__init__(message)
+
+        self.method = method
+        self.path = path
+        self.body = body
+
+    def __str__(self):
+        """str.
+
+        :rtype: str
+        """
+        return '{0}: method={1}, path={2}, body={3}, message={4}'.format(
+            self.__class__.__name__, self.method, self.path, self.body,
+            self.message)
+
+
 class LinePayApiError(BaseError):
     """When LINE Pay API response error, this error will be raised."""
 
-    def __init__(self, return_code, status_code, headers, api_response):
+    def __init__(
+            self, return_code, status_code, headers, api_response,
+            return_message=None):
         """__init__ method.
 
         :param str return_code:  API Return code
         :param int status_code: HTTP status code
-        :param headers: Response headers
+        :param headers: Response headers. Mapping objects other than dict
+            (ex. requests' CaseInsensitiveDict) are copied to dict on first
+            access of ``headers``
         :type headers: dict[str, str]
-        :param dict api_response: API response json
+        :param dict api_response: API response json. May be None when
+            error details are not captured
+        :param str return_message: API Return message. Taken from
+            api_response when omitted
         """
-        super(LinePayApiError, self).__init__(
-            api_response.get("returnMessage"))
+        if return_message is None and api_response is not None:
+            return_message = api_response.get("returnMessage")
+        super(LinePayApiError, self).__init__(return_message)
 
         self.return_code = return_code
         self.status_code = status_code
-        self.headers = headers
+        self._headers = headers
         self.api_response = api_response
 
+    @property
+    def headers(self):
+        """Response headers.
+
+        :rtype: dict[str, str]
+        """
+        headers = self._headers
+        if headers is not None and type(headers) is not dict:
+            headers = self._headers = dict(headers.items())
+        return headers
+
+    @headers.setter
+    def headers(self, headers):
+        self._headers = headers
+
+    @property
+    def return_code_info(self):
+        """Registered information of the return code.
+
+        :rtype: linepay.return_codes.ReturnCodeInfo
+        """
+        return lookup(self.return_code)
+
+    @property
+    def category(self):
+        """Category of the return code.
+
+        :rtype: linepay.return_codes.ReturnCodeCategory
+        """
+        return self.return_code_info.category
+
+    @property
+    def retryable(self):
+        """Whether the same call may succeed when retried.
+
+        :rtype: bool
+        """
+        info = RETURN_CODES.get(self.return_code)
+        return info is not None and info.retryable
+
+    @property
+    def action(self):
+        """Recommended action for the return code.
+
+        :rtype: linepay.return_codes.RecommendedAction
+        """
+        return self.return_code_info.action
+
+    def to_record(self, key=None):
+        """Compact record of this error.
+
+        :param key: Caller defined key (ex. transaction id)
+        :rtype: ErrorRecord
+        """
+        return ErrorRecord.from_error(self, key)
+
     def __str__(self):
         """str.
 
         :rtype: str
         """
-        return '{0}: return_code={1}, http_status_code={2}, api_response={3}, http_headers={4}'.format(
-            self.__class__.__name__, self.return_code, self.status_code, self.api_response, self.headers)
+        return '{0}: return_code={1}, http_status_code={2}, return_message={3}'.format(
+            self.__class__.__name__, self.return_code, self.status_code, self.message)
+
+
+class LinePayInvalidRequestError(LinePayApiError):
+    """When request parameters are rejected by LINE Pay API."""
+
+
+class LinePayMerchantError(LinePayApiError):
+    """When merchant settings do not allow the request."""
+
+
+class LinePayPaymentDeclinedError(LinePayApiError):
+    """When payment is declined for the purchaser or the credit card."""
+
+
+class LinePayTransactionStateError(LinePayApiError):
+    """When transaction state does not allow the request."""
+
+
+class LinePayExpiredError(LinePayApiError):
+    """When payment or refund period has expired."""
+
+
+class LinePayRegKeyError(LinePayApiError):
+    """When regKey does not exist or has expired."""
+
+
+class LinePayTransientError(LinePayApiError):
+    """When LINE Pay API fails temporarily. The request may be retried."""
+
+
+ERROR_CLASSES_BY_CATEGORY = {
+    ReturnCodeCategory.INVALID_REQUEST: LinePayInvalidRequestError,
+    ReturnCodeCategory.MERCHANT: LinePayMerchantError,
+    ReturnCodeCategory.PAYMENT_DECLINED: LinePayPaymentDeclinedError,
+    ReturnCodeCategory.TRANSACTION_STATE: LinePayTransactionStateError,
+    ReturnCodeCategory.EXPIRED: LinePayExpiredError,
+    ReturnCodeCategory.REGKEY: LinePayRegKeyError,
+    ReturnCodeCategory.TRANSIENT: LinePayTransientError,
+}
+
+_ERROR_CLASSES_BY_RETURN_CODE = {
+    return_code: ERROR_CLASSES_BY_CATEGORY[info.category]
+    for return_code, info in RETURN_CODES.items()
+    if info.category in ERROR_CLASSES_BY_CATEGORY
+}
+
+
+def error_class_for(return_code):
+    """LinePayApiError class to raise for the return code.
+
+    :param str return_code: API Return code
+    :rtype: type
+    """
+    return _ERROR_CLASSES_BY_RETURN_CODE.get(return_code, LinePayApiError)
+
+
+class ErrorRecord(namedtuple(
+        "ErrorRecord", ("return_code", "status_code", "return_message", "key"))):
+    """Compact, immutable record of a LinePayApiError.
+
+    Holds no reference to the response, headers or exception, so bulk
+    jobs can keep millions of them.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_error(cls, error, key=None):
+        """Create record from LinePayApiError.
+
+        :param LinePayApiError error: error to record
+        :param key: Caller defined key (ex. transaction id)
+        :rtype: ErrorRecord
+        """
+        return_code = error.return_code
+        if type(return_code) is str:
+            return_code = sys.intern(return_code)
+        return cls(return_code, error.status_code, error.message, key)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""Client side idempotency of Request and Pay Preapproved API by orderId.
+
+A call with the orderId of an in-flight call waits for that call and
+receives its result, or its exception. A call with the orderId of a call
+completed within ttl receives the stored result without calling LINE Pay.
+Keys include the channel id, so clients of different merchants may share
+a guard::
+
+    guard = IdempotencyGuard(ttl=600)
+    api = LinePayApi(channel_id, channel_secret, idempotency_guard=guard)
+"""
+
+import asyncio
+from collections import OrderedDict
+import threading
+import time
+
+_MISSING = object()
+
+
+def _set_future(future, flight):
+    if future.cancelled():
+        return
+    if flight.error is not None:
+        future.set_exception(flight.error)
+    else:
+        future.set_result(flight.result)
+
+
+class _Flight(object):
+    """Call in progress and the callers waiting for it."""
+
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        # (event loop, future) of coroutines waiting for the call
+        self.waiters = []
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class IdempotencyGuard(object):
+    """Deduplicates API calls with the same key.
+
+    Completed results are kept in insertion order with one expiry time
+    each, so memory stays bounded by max_entries whatever the order rate.
+    Failed calls are not kept and may be retried.
+    Duplicates receive the same response object as the original call.
+    One guard may be shared by several threads and clients.
+    """
+
+    DEFAULT_TTL = 600
+    DEFAULT_MAX_ENTRIES = 10000
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 clock=time.monotonic):
+        """__init__ method.
+        :param float ttl: Seconds to keep completed results
+        :param int max_entries: Maximum number of completed results. Oldest
+            results are evicted first
+        :param clock: Function returning current time in seconds
+        """
+        if ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if max_entries <= 0:
+            raise ValueError("max_entries must be greater than 0")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        # key -> (expires_at, result), ordered by expiry
+        self._completed = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._completed)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._in_flight or \
+                self._get_completed(key) is not _MISSING
+
+    def in_flight(self):
+        """Number of calls in progress
+        :rtype int: number of in-flight keys
+        """
+        return len(self._in_flight)
+
+    def call(self, key, func, *args):
+        """Call func once per key
+        :param key: Idempotency key, such as orderId
+        :param func: Function to call for the first caller of the key
+        :rtype: result of func, or of the original call of the key
+        """
+        result, flight, owner = self._begin(key)
+        if flight is None:
+            return result
+        if not owner:
+            flight.event.wait()
+            return flight.outcome()
+        try:
+            result = func(*args)
+        except BaseException as e:
+            self._finish(key, flight, None, e)
+            raise
+        self._finish(key, flight, result, None)
+        return result
+
+    async def call_async(self, key, func, *args):
+        """Await func once per key
+        :param key: Idempotency key, such as orderId
+        :param func: Coroutine function to await for the first caller
+        :rtype: result of func, or of the original call of the key
+        """
+        result, flight, owner = self._begin(key, asynchronous=True)
+        if flight is None:
+            return result
+        if not owner:
+            return await flight
+        try:
+            result = await func(*args)
+        except BaseException as e:
+            self._finish(key, flight, None, e)
+            raise
+        self._finish(key, flight, result, None)
+        return result
+
+    def forget(self, key):
+        """Forget completed result of the key
+        :param key: Idempotency key
+        """
+        with self._lock:
+            self._completed.pop(key, None)
+
+    def _begin(self, key, asynchronous=False):
+        """Look up completed or in-flight call of the key, or register
+        a new in-flight call
+        :rtype tuple: result, flight (None when completed) and whether
+            the caller owns the flight. Waiting coroutines get a future
+            instead of the flight
+        """
+        with self._lock:
+            result = self._get_completed(key)
+            if result is not _MISSING:
+                return result, None, False
+            flight = self._in_flight.get(key)
+            if flight is None:
+                flight = self._in_flight[key] = _Flight()
+                return None, flight, True
+            if asynchronous:
+                loop = asyncio.get_event_loop()
+                future = loop.create_future()
+                flight.waiters.append((loop, future))
+                return None, future, False
+            return None, flight, False
+
+    def _finish(self, key, flight, result, error):
+        with self._lock:
+            flight.result = result
+            flight.error = error
+            del self._in_flight[key]
+            if error is None:
+                self._completed.pop(key, None)
+                self._completed[key] = (self._clock() + self.ttl, result)
+                self._evict()
+            waiters = flight.waiters
+            flight.waiters = []
+        flight.event.set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_set_future, future, flight)
+
+    def _get_completed(self, key):
+        entry = self._completed.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] <= self._clock():
+            del self._completed[key]
+            return _MISSING
+        return entry[1]
+
+    def _evict(self):
+        completed = self._completed
+        now = self._clock()
+        while completed:
+            key, entry = next(iter(completed.items()))
+            if len(completed) <= self.max_entries and entry[0] > now:
+                break
+            del completed[key]
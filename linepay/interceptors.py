@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+
+HOOK_NAMES = (
+    "before_sign", "after_sign", "before_send", "after_response", "on_error")
+
+
+class Interceptor(object):
+    """Base class for LinePayApi interceptors.
+
+    Override only the hooks you need. Hooks that are not overridden are
+    left out of the compiled chain, so they cost nothing per call.
+    """
+
+    def before_sign(self, call):
+        """Called before the request is signed.
+        :param LinePayCall call: call in progress. ``call.headers`` is a
+            private copy and ``call.body`` may still be changed
+        """
+
+    def after_sign(self, call):
+        """Called after the request is signed.
+        :param LinePayCall call: call in progress. ``call.headers`` holds
+            the signed headers
+        """
+
+    def before_send(self, call):
+        """Called right before the HTTP request is sent.
+        :param LinePayCall call: call in progress
+        """
+
+    def after_response(self, call):
+        """Called after the response body is parsed, before the returnCode
+        is checked.
+        :param LinePayCall call: call in progress. ``call.response`` and
+            ``call.result`` are set
+        """
+
+    def on_error(self, call, error):
+        """Called when sending the request or parsing the response raises.
+        Error returnCodes reach after_response instead.
+        :param LinePayCall call: call in progress
+        :param Exception error: raised exception, raised again after the
+            hooks
+        """
+
+    def flush(self):
+        """Called by LinePayApi.drain() after in-flight calls finished.
+        Write out buffered journals or metrics here.
+        """
+
+
+class LinePayCall(object):
+    """State of one API call passed through the interceptor hooks."""
+
+    __slots__ = (
+        "api", "api_name", "method", "path", "url", "body", "headers",
+        "response", "result", "context", "safe_return_codes", "_states"
+    )
+
+    def __init__(self, api, api_name, method, path, url, body, headers,
+                 safe_return_codes=("0000",)):
+        """__init__ method.
+        :param LinePayApi api: Client executing the call
+        :param str api_name: Human readable API name (ex. "Confirm")
+        :param str method: HTTP method
+        :param str path: API request path
+        :param str url: API request URL
+        :param str body: Request body for POST or Query String for GET
+        :param dict headers: Request HTTP Headers
+        :param safe_return_codes: returnCodes treated as success
+        """
+        self.api = api
+        self.api_name = api_name
+        self.method = method
+        self.path = path
+        self.url = url
+        self.body = body
+        self.headers = headers
+        self.safe_return_codes = safe_return_codes
+        self.response = None
+        self.result = None
+        # free slot for interceptors to share per-call state
+        self.context = None
+        self._states = None
+
+    def state(self, interceptor):
+        """Per-call state private to an interceptor, unlike context which
+        every interceptor of the chain may overwrite
+        :param Interceptor interceptor: interceptor owning the state
+        :rtype dict: state of the interceptor for this call
+        """
+        states = self._states
+        if states is None:
+            states = self._states = {}
+        key = id(interceptor)
+        state = states.get(key)
+        if state is None:
+            state = states[key] = {}
+        return state
+
+
+CompiledInterceptors = namedtuple("CompiledInterceptors", HOOK_NAMES)
+
+
+class InterceptorChain(object):
+    """Ordered list of interceptors compiled into per-hook tuples."""
+
+    def __init__(self, interceptors=()):
+        """__init__ method.
+        :param interceptors: Interceptors in execution order
+        :type interceptors: iterable of Interceptor
+        """
+        self._interceptors = list(interceptors)
+
+    def __iter__(self):
+        return iter(self._interceptors)
+
+    def __len__(self):
+        return len(self._interceptors)
+
+    def add(self, interceptor):
+        """Append interceptor at the end of the chain
+        :param Interceptor interceptor: interceptor to add
+        """
+        self._interceptors.append(interceptor)
+
+    def remove(self, interceptor):
+        """Remove interceptor from the chain
+        :param Interceptor interceptor: interceptor to remove
+        """
+        self._interceptors.remove(interceptor)
+
+    def compile(self):
+        """Compile chain into per-hook tuples of bound methods
+        :rtype CompiledInterceptors: compiled hooks, or None when no
+            interceptor overrides any hook
+        """
+        phases = []
+        for name in HOOK_NAMES:
+            base = getattr(Interceptor, name)
+            hooks = []
+            for interceptor in self._interceptors:
+                impl = getattr(type(interceptor), name, None)
+                if impl is None or impl is base:
+                    continue
+                hooks.append(getattr(interceptor, name))
+            phases.append(tuple(hooks))
+        if not any(phases):
+            return None
+        return CompiledInterceptors(*phases)
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+"""Priority lanes (bulkheads) for API calls sharing one process.
+
+Every lane has its own connection pool and a cap on calls in progress,
+so a batch of background Refund or Payment Details calls can never take
+the connections of user-facing Confirm calls. With max_concurrent set on
+PriorityLanes, lanes also share a total capacity, and lower priority
+lanes hold back while a higher priority lane has calls waiting::
+
+    lanes = PriorityLanes(max_concurrent=16)
+    api = LinePayApi(channel_id, channel_secret, lanes=lanes)
+    api.confirm(transaction_id, amount, currency)    # interactive lane
+    api.refund(transaction_id)                       # background lane
+    with lanes.use(BACKGROUND):
+        api.confirm(transaction_id, amount, currency)
+    lanes.stats()[INTERACTIVE].max_wait
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+import threading
+import time
+
+from .exceptions import BulkheadFullError
+from .pool import create_pooled_session
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# API names of calls a purchaser waits for
+INTERACTIVE_APIS = frozenset(("Request", "Confirm", "Check Payment Status"))
+
+
+class LaneStats(namedtuple("LaneStats", (
+        "name", "priority", "calls", "rejected", "in_flight", "queued",
+        "peak_queued", "total_wait", "max_wait"))):
+    """Snapshot of queueing metrics of a lane.
+    :param str name: Lane name
+    :param int priority: Lane priority. Smaller runs first
+    :param int calls: Calls that got a slot
+    :param int rejected: Calls rejected because the lane was full
+    :param int in_flight: Calls in progress
+    :param int queued: Calls waiting for a slot
+    :param int peak_queued: Maximum number of calls waiting at once
+    :param float total_wait: Seconds waited for slots in total
+    :param float max_wait: Longest wait for a slot in seconds
+    """
+
+    __slots__ = ()
+
+    @property
+    def mean_wait(self):
+        """Mean wait for a slot in seconds"""
+        if self.calls == 0:
+            return 0.0
+        return self.total_wait / self.calls
+
+
+class Lane(object):
+    """Partition of connections and concurrency for a class of calls."""
+
+    def __init__(self, name, priority, max_concurrent, max_queued=None,
+                 timeout=None, pool_maxsize=None):
+        """__init__ method.
+        :param str name: Lane name
+        :param int priority: Lane priority. Smaller runs first
+        :param int max_concurrent: Maximum number of calls in progress
+        :param int max_queued: Maximum number of calls waiting for a slot.
+            Unlimited when omitted
+        :param float timeout: Maximum seconds to wait for a slot.
+            Unlimited when omitted
+        :param int pool_maxsize: Connections kept alive by the lane. Same
+            as max_concurrent when omitted
+        """
+        if max_concurrent <= 0:
+            raise ValueError("max_concurrent must be greater than 0")
+        self.name = name
+        self.priority = priority
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.session = create_pooled_session(pool_maxsize or max_concurrent)
+        self.calls = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stats(self):
+        return LaneStats(
+            self.name, self.priority, self.calls, self.rejected,
+            self.in_flight, self.queued, self.peak_queued, self.total_wait,
+            self.max_wait)
+
+
+class PriorityLanes(object):
+    """Schedules API calls over lanes by priority."""
+
+    def __init__(self, lanes=None, routes=None, default_lane=BACKGROUND,
+                 max_concurrent=None, clock=time.perf_counter):
+        """__init__ method.
+        :param lanes: Lanes. An interactive lane (priority 0, 16 calls) and
+            a background lane (priority 1, 4 calls) when omitted
+        :type lanes: list of Lane
+        :param dict routes: API name (ex. "Confirm") to lane name.
+            INTERACTIVE_APIS go to the interactive lane when omitted
+        :param str default_lane: Lane of API names not in routes
+        :param int max_concurrent: Calls in progress over all lanes.
+            Lanes are only limited by their own caps when omitted
+        :param clock: Function returning current time in seconds
+        """
+        if lanes is None:
+            lanes = [Lane(INTERACTIVE, 0, 16), Lane(BACKGROUND, 1, 4)]
+        if routes is None:
+            routes = {name: INTERACTIVE for name in INTERACTIVE_APIS}
+        self._lanes = {lane.name: lane for lane in lanes}
+        if default_lane not in self._lanes:
+            raise ValueError("lane[{}] is not defined".format(default_lane))
+        for lane_name in routes.values():
+            if lane_name not in self._lanes:
+                raise ValueError("lane[{}] is not defined".format(lane_name))
+        self._by_priority = sorted(lanes, key=lambda lane: lane.priority)
+        self.routes = routes
+        self.default_lane = default_lane
+        self.max_concurrent = max_concurrent
+        self._clock = clock
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    def __getitem__(self, name):
+        return self._lanes[name]
+
+    def __iter__(self):
+        return iter(self._by_priority)
+
+    def lane_for(self, api_name):
+        """Lane of an API call
+        :param str api_name: API name (ex. "Confirm")
+        :rtype Lane: lane forced with use(), or routed by API name
+        """
+        name = getattr(self._local, "lane", None)
+        if name is None:
+            name = self.routes.get(api_name, self.default_lane)
+        return self._lanes[name]
+
+    @contextmanager
+    def use(self, name):
+        """Run API calls of the current thread in a lane
+        :param str name: Lane name
+        """
+        if name not in self._lanes:
+            raise ValueError("lane[{}] is not defined".format(name))
+        previous = getattr(self._local, "lane", None)
+        self._local.lane = name
+        try:
+            yield self._lanes[name]
+        finally:
+            self._local.lane = previous
+
+    @contextmanager
+    def slot(self, api_name):
+        """Hold a slot of the lane of an API call
+        :param str api_name: API name (ex. "Confirm")
+        :rtype Lane: lane holding the slot
+        """
+        lane = self.lane_for(api_name)
+        self._acquire(lane)
+        try:
+            yield lane
+        finally:
+            self._release(lane)
+
+    def try_acquire(self, api_name):
+        """Take a slot of the lane of an API call without waiting
+        :param str api_name: API name (ex. "Confirm")
+        :rtype Lane: lane holding the slot, or None when the lane is
+            full. Give the slot back with release()
+        """
+        lane = self.lane_for(api_name)
+        with self._condition:
+            if not self._runnable(lane):
+                return None
+            lane.calls += 1
+            lane.in_flight += 1
+            self._in_flight += 1
+        return lane
+
+    def release(self, lane):
+        """Give back a slot taken with try_acquire()
+        :param Lane lane: lane holding the slot
+        """
+        self._release(lane)
+
+    def stats(self):
+        """Queueing metrics of every lane
+        :rtype dict: lane name to LaneStats
+        """
+        with self._condition:
+            return {name: lane.stats() for name, lane in self._lanes.items()}
+
+    def close(self):
+        """Close connections of every lane"""
+        for lane in self._lanes.values():
+            lane.session.close()
+
+    def _runnable(self, lane):
+        if lane.in_flight >= lane.max_concurrent:
+            return False
+        if self.max_concurrent is None:
+            return True
+        if self._in_flight >= self.max_concurrent:
+            return False
+        for other in self._by_priority:
+            if other.priority >= lane.priority:
+                break
+            if other.queued and other.in_flight < other.max_concurrent:
+                return False
+        return True
+
+    def _acquire(self, lane):
+        with self._condition:
+            if self._runnable(lane):
+                lane.calls += 1
+                lane.in_flight += 1
+                self._in_flight += 1
+                return
+            if lane.max_queued is not None and lane.queued >= lane.max_queued:
+                lane.rejected += 1
+                raise BulkheadFullError(
+                    lane.name, "Too many calls are waiting for the lane")
+            started = self._clock()
+            deadline = None
+            if lane.timeout is not None:
+                deadline = started + lane.timeout
+            lane.queued += 1
+            lane.peak_queued = max(lane.peak_queued, lane.queued)
+            try:
+                while not self._runnable(lane):
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            lane.rejected += 1
+                            raise BulkheadFullError(
+                                lane.name, "Timed out waiting for the lane")
+                    self._condition.wait(remaining)
+            finally:
+                lane.queued -= 1
+                # lower priority lanes may have been held back by us
+                self._condition.notify_all()
+            waited = self._clock() - started
+            lane.total_wait += waited
+            lane.max_wait = max(lane.max_wait, waited)
+            lane.calls += 1
+            lane.in_flight += 1
+            self._in_flight += 1
+
+    def _release(self, lane):
+        with self._condition:
+            lane.in_flight -= 1
+            self._in_flight -= 1
+            self._condition.notify_all()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+import threading
+
+from .exceptions import RefundRejectedError
+from .util import LOGGER
+
+_ZERO = Decimal(0)
+
+
+def _to_decimal(amount):
+    if type(amount) is Decimal:
+        return amount
+    return Decimal(str(amount))
+
+
+def payment_amounts(detail):
+    """Paid and refunded amounts of one info entry of Payment Details API
+    :param dict detail: info entry of Payment Details API response
+    :rtype tuple: paid and refunded amounts as Decimal
+    """
+    paid = _ZERO
+    refunded = _ZERO
+    pay_status = detail.get("payStatus", None)
+    if pay_status is None or \
+            pay_status in RefundLedger.CAPTURED_PAY_STATUS_LIST:
+        for pay_info in detail.get("payInfo", None) or ():
+            paid += _to_decimal(pay_info.get("amount", 0))
+    for refund in detail.get("refundList", None) or ():
+        refunded += abs(_to_decimal(refund.get("refundAmount", 0)))
+    return paid, refunded
+
+
+class _LedgerEntry(object):
+
+    __slots__ = ("paid", "refunded", "pending")
+
+    def __init__(self, paid, refunded=_ZERO):
+        self.paid = paid
+        self.refunded = refunded
+        self.pending = _ZERO
+
+    @property
+    def refundable(self):
+        return self.paid - self.refunded - self.pending
+
+
+class RefundLedger(object):
+    """Local ledger of paid and refunded amounts per transaction.
+
+    Rejects over-refunds and duplicate full refunds before the Refund API
+    is called. Transactions that were not confirmed or captured through the
+    client are seeded from Payment Details API on first refund.
+    One ledger may be shared by several threads and clients.
+    """
+
+    # payStatus of Payment Details API meaning the payment is captured
+    CAPTURED_PAY_STATUS_LIST = ["CAPTURE"]
+
+    def __init__(self):
+        """__init__ method."""
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self._entries
+
+    def record_payment(self, transaction_id, amount):
+        """Record confirmed or captured amount of the transaction
+        :param int transaction_id: Transaction id
+        :param float amount: Confirmed or captured amount
+        """
+        amount = _to_decimal(amount)
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is None:
+                self._entries[transaction_id] = _LedgerEntry(amount)
+            else:
+                entry.paid = amount
+
+    def seed(self, transaction_id, payment_details):
+        """Seed transaction from Payment Details API response.
+        Existing entry of the transaction is kept.
+        :param int transaction_id: Transaction id
+        :param dict payment_details: Payment Details API response
+        """
+        paid = _ZERO
+        refunded = _ZERO
+        for detail in payment_details.get("info", None) or ():
+            if detail.get("transactionId", None) == transaction_id:
+                detail_paid, detail_refunded = payment_amounts(detail)
+                paid += detail_paid
+                refunded += detail_refunded
+        with self._lock:
+            self._entries.setdefault(
+                transaction_id, _LedgerEntry(paid, refunded))
+
+    def amounts(self, transaction_id):
+        """Paid and refunded amounts recorded for the transaction
+        :param int transaction_id: Transaction id
+        :rtype tuple: paid and refunded amounts as Decimal, or None for
+            unknown transaction
+        """
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is None:
+                return None
+            return entry.paid, entry.refunded
+
+    def refundable_amount(self, transaction_id):
+        """Amount that can still be refunded
+        :param int transaction_id: Transaction id
+        :rtype Decimal: refundable amount, or None for unknown transaction
+        """
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is None:
+                return None
+            return entry.refundable
+
+    def reserve_refund(self, transaction_id, refund_amount=0, loader=None):
+        """Check and reserve refund amount before calling Refund API
+        :param int transaction_id: Transaction id
+        :param float refund_amount: Refund amount. Full refund if 0
+        :param loader: Callable returning Payment Details API response for
+            the transaction id. Called once for unknown transaction
+        :rtype Decimal: reserved amount, to be passed to commit_refund or
+            release_refund
+        """
+        if transaction_id not in self._entries and loader is not None:
+            LOGGER.debug(
+                "Seeding refund ledger for transaction %s", transaction_id)
+            self.seed(transaction_id, loader(transaction_id))
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is None:
+                # unknown transaction, leave decision to LINE Pay
+                return _ZERO
+            refundable = entry.refundable
+            if refund_amount > 0:
+                amount = _to_decimal(refund_amount)
+            else:
+                amount = refundable
+            if refundable <= _ZERO:
+                raise RefundRejectedError(
+                    transaction_id, amount, refundable,
+                    "Transaction is already fully refunded")
+            if amount > refundable:
+                raise RefundRejectedError(
+                    transaction_id, amount, refundable,
+                    "Refund amount exceeds refundable amount")
+            entry.pending += amount
+            return amount
+
+    def commit_refund(self, transaction_id, reserved_amount):
+        """Record reserved refund as completed
+        :param int transaction_id: Transaction id
+        :param Decimal reserved_amount: amount returned from reserve_refund
+        """
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is not None:
+                entry.pending -= reserved_amount
+                entry.refunded += reserved_amount
+
+    def release_refund(self, transaction_id, reserved_amount):
+        """Release reserved refund that was not completed
+        :param int transaction_id: Transaction id
+        :param Decimal reserved_amount: amount returned from reserve_refund
+        """
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is not None:
+                entry.pending -= reserved_amount
+
+    def mark_fully_refunded(self, transaction_id):
+        """Record transaction as fully refunded
+        :param int transaction_id: Transaction id
+        """
+        with self._lock:
+            entry = self._entries.get(transaction_id)
+            if entry is not None:
+                entry.refunded = entry.paid
+
+    def forget(self, transaction_id):
+        """Remove transaction from the ledger
+        :param int transaction_id: Transaction id
+        """
+        with self._lock:
+            self._entries.pop(transaction_id, None)
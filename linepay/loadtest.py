@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+
+"""Load generator driving mixes of LINE Pay payment flows.
+
+Flows follow the examples:
+
+* ``checkout``: Request, Confirm and Refund
+* ``authorization``: Request (capture=False), Confirm, then Capture or
+  Void
+* ``preapproved``: Request (PREAPPROVED), Confirm, Pay Preapproved,
+  Check RegKey and Expire RegKey
+
+Run against a local stub LINE Pay API, or any endpoint with --endpoint::
+
+    $ python -m linepay.loadtest --stub --mix checkout=6,authorization=3,preapproved=1 \\
+        --concurrency 16 --duration 30
+    $ python -m linepay.loadtest --endpoint http://127.0.0.1:8080 --rate 200 --flows 10000
+
+The production endpoint is refused unless --allow-production is given.
+"""
+
+from collections import Counter, defaultdict
+import argparse
+import os
+import random
+import threading
+import time
+import uuid
+
+from .api import LinePayApi
+from .exceptions import LinePayApiError
+from .pool import create_pooled_session
+from .ratelimit import TokenBucket
+
+PRICE = 100
+CURRENCY = "JPY"
+
+
+def _request_options(pay_type=None, capture=True):
+    options = {
+        "amount": PRICE,
+        "currency": CURRENCY,
+        "orderId": uuid.uuid4().hex,
+        "packages": [{
+            "id": "package-999",
+            "amount": PRICE,
+            "name": "Sample package",
+            "products": [{
+                "id": "product-001",
+                "name": "Sample product",
+                "quantity": 1,
+                "price": PRICE
+            }]
+        }],
+        "redirectUrls": {
+            "confirmUrl": "https://example.com/confirm",
+            "cancelUrl": "https://example.com/cancel"
+        }
+    }
+    payment = {}
+    if pay_type is not None:
+        payment["payType"] = pay_type
+    if capture is False:
+        payment["capture"] = False
+    if payment:
+        options["options"] = {"payment": payment}
+    return options
+
+
+def _start(call, options):
+    result = call("Request", "request", options)
+    transaction_id = result["info"]["transactionId"]
+    confirmed = call("Confirm", "confirm", transaction_id, float(PRICE),
+                     CURRENCY)
+    return transaction_id, confirmed
+
+
+def checkout_flow(call, rng):
+    transaction_id, _ = _start(call, _request_options())
+    call("Refund", "refund", transaction_id)
+
+
+def authorization_flow(call, rng):
+    transaction_id, _ = _start(call, _request_options(capture=False))
+    if rng.random() < 0.5:
+        call("Capture", "capture", transaction_id, float(PRICE), CURRENCY)
+    else:
+        call("Void", "void", transaction_id)
+
+
+def preapproved_flow(call, rng):
+    _, confirmed = _start(call, _request_options(pay_type="PREAPPROVED"))
+    info = confirmed.get("info", None) or {}
+    reg_key = info.get("regKey", None) or "RK" + uuid.uuid4().hex[:13]
+    call("Pay Preapproved", "pay_preapproved", reg_key, "Sample product",
+         float(PRICE), CURRENCY, uuid.uuid4().hex)
+    call("Check RegKey", "check_regkey", reg_key)
+    call("Expire RegKey", "expire_regkey", reg_key)
+
+
+FLOWS = {
+    "checkout": checkout_flow,
+    "authorization": authorization_flow,
+    "preapproved": preapproved_flow,
+}
+
+
+def parse_mix(text):
+    """Parse traffic mix
+    :param str text: Comma separated flow=weight, e.g. "checkout=6,preapproved=1"
+    :rtype list: (flow name, weight) tuples
+    """
+    mix = []
+    for item in text.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in FLOWS:
+            raise ValueError("flow[{}] is not supported".format(name))
+        weight = float(weight) if weight else 1.0
+        if weight < 0:
+            raise ValueError("weight of flow[{}] is negative".format(name))
+        mix.append((name, weight))
+    if not any(weight for _, weight in mix):
+        raise ValueError("mix has no flow with weight")
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Nearest rank percentile
+    :param list sorted_values: Sorted values
+    :param float p: Percentile from 0 to 100
+    :rtype float: percentile, or 0.0 when empty
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * p / 100.0))
+    return sorted_values[index]
+
+
+class LoadReport(object):
+    """Latencies and errors of a load test."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.flows = Counter()
+        self.failed_flows = Counter()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record_call(self, api_name, latency, error_code=None):
+        """Record one API call
+        :param str api_name: API name (ex. "Confirm")
+        :param float latency: Seconds of the call
+        :param str error_code: returnCode or exception class of a failed
+            call, None when succeeded
+        """
+        with self._lock:
+            self.latencies[api_name].append(latency)
+            if error_code is not None:
+                self.errors[api_name][error_code] += 1
+
+    def record_flow(self, name, succeeded):
+        with self._lock:
+            self.flows[name] += 1
+            if not succeeded:
+                self.failed_flows[name] += 1
+
+    @property
+    def calls(self):
+        return sum(len(v) for v in self.latencies.values())
+
+    def format(self):
+        """Human readable report
+        :rtype str: report
+        """
+        elapsed = self.elapsed or 1e-9
+        lines = [
+            "{} flows, {} calls in {:.2f} s: {:.1f} flows/s, {:.1f} calls/s".format(
+                sum(self.flows.values()), self.calls, self.elapsed,
+                sum(self.flows.values()) / elapsed, self.calls / elapsed),
+            "",
+            "{:<18} {:>8} {:>8} {:>9} {:>9} {:>9} {:>9}".format(
+                "api", "calls", "errors", "p50 ms", "p90 ms", "p99 ms",
+                "max ms"),
+        ]
+        for api_name in sorted(self.latencies):
+            values = sorted(self.latencies[api_name])
+            lines.append(
+                "{:<18} {:>8} {:>8} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                    api_name, len(values), sum(self.errors[api_name].values()),
+                    percentile(values, 50) * 1e3, percentile(values, 90) * 1e3,
+                    percentile(values, 99) * 1e3, values[-1] * 1e3))
+        lines.append("")
+        lines.append("{:<18} {:>8} {:>8}".format("flow", "runs", "failed"))
+        for name in sorted(self.flows):
+            lines.append("{:<18} {:>8} {:>8}".format(
+                name, self.flows[name], self.failed_flows[name]))
+        errors = [
+            (api_name, code, count)
+            for api_name, counter in sorted(self.errors.items())
+            for code, count in counter.most_common()]
+        if errors:
+            lines.append("")
+            lines.append("{:<18} {:<24} {:>8}".format(
+                "api", "returnCode / error", "count"))
+            for api_name, code, count in errors:
+                lines.append("{:<18} {:<24} {:>8}".format(
+                    api_name, code, count))
+        return "\n".join(lines)
+
+
+def run(api, mix, concurrency, flows=None, duration=None, rate=None,
+        seed=None):
+    """Run flows of the mix on threads until flows or duration is reached
+    :param LinePayApi api: Client calling the target endpoint
+    :param list mix: (flow name, weight) tuples
+    :param int concurrency: Number of threads running flows
+    :param int flows: Number of flows to run
+    :param float duration: Seconds to run
+    :param float rate: Flows started per second. Unlimited when omitted
+    :param int seed: Random seed of the flow choice
+    :rtype LoadReport: report of the run
+    """
+    if flows is None and duration is None:
+        raise ValueError("flows or duration is required")
+    if concurrency <= 0:
+        raise ValueError("concurrency must be greater than 0")
+    report = LoadReport()
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    bucket = TokenBucket(rate, burst=1) if rate else None
+    remaining = [flows]
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = None if duration is None else started + duration
+
+    def take():
+        if deadline is not None and time.perf_counter() >= deadline:
+            return False
+        with lock:
+            if remaining[0] is not None:
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+        if bucket is not None:
+            bucket.acquire()
+        return True
+
+    def call(api_name, method, *args):
+        call_started = time.perf_counter()
+        try:
+            result = getattr(api, method)(*args)
+        except LinePayApiError as e:
+            report.record_call(
+                api_name, time.perf_counter() - call_started, e.return_code)
+            raise
+        except Exception as e:
+            report.record_call(
+                api_name, time.perf_counter() - call_started,
+                type(e).__name__)
+            raise
+        report.record_call(api_name, time.perf_counter() - call_started)
+        return result
+
+    def worker(index):
+        rng = random.Random(None if seed is None else seed + index)
+        while take():
+            name = rng.choices(names, weights)[0]
+            try:
+                FLOWS[name](call, rng)
+                report.record_flow(name, True)
+            except Exception:
+                report.record_flow(name, False)
+
+    threads = [
+        threading.Thread(target=worker, args=(i,), daemon=True)
+        for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m linepay.loadtest",
+        description="Drive mixes of LINE Pay payment flows against an "
+                    "endpoint and report throughput, latency and errors")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--endpoint", help="target API endpoint URL")
+    target.add_argument(
+        "--stub", action="store_true",
+        help="start a local stub LINE Pay API as the target")
+    parser.add_argument(
+        "--stub-latency", type=float, default=0.0,
+        help="stub API latency in seconds")
+    parser.add_argument(
+        "--mix", default="checkout=6,authorization=3,preapproved=1",
+        help="comma separated flow=weight of %s" % ", ".join(sorted(FLOWS)))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--flows", type=int, help="number of flows to run")
+    parser.add_argument("--duration", type=float, help="seconds to run")
+    parser.add_argument(
+        "--rate", type=float, help="flows started per second")
+    parser.add_argument(
+        "--pool-size", type=int,
+        help="connections kept alive. Same as concurrency when omitted")
+    parser.add_argument(
+        "--warmup", action="store_true",
+        help="open pooled connections before the run")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--channel-id", default=os.environ.get("LINE_PAY_CHANNEL_ID", "channel_id"))
+    parser.add_argument(
+        "--channel-secret",
+        default=os.environ.get("LINE_PAY_CHANNEL_SECRET", "channel_secret"))
+    parser.add_argument(
+        "--allow-production", action="store_true",
+        help="allow the production LINE Pay API endpoint as the target")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.flows is None and args.duration is None:
+        args.flows = 1000
+    endpoint = args.endpoint
+    if endpoint is not None and not args.allow_production \
+            and endpoint.rstrip("/") == LinePayApi.DEFAULT_API_ENDPOINT:
+        parser.error("refusing the production endpoint without --allow-production")
+
+    server = None
+    if args.stub:
+        from .stub import StubLinePayServer
+        server = StubLinePayServer(latency=args.stub_latency).start()
+        endpoint = server.url
+    try:
+        session = create_pooled_session(args.pool_size or args.concurrency)
+        api = LinePayApi(args.channel_id, args.channel_secret, session=session)
+        api.api_endpoint = endpoint.rstrip("/")
+        if args.warmup:
+            api.warmup(min(args.concurrency, args.pool_size or args.concurrency))
+        print("Target {}, mix {}, concurrency {}".format(
+            api.api_endpoint,
+            ", ".join("{}={:g}".format(name, weight) for name, weight in mix),
+            args.concurrency))
+        report = run(api, mix, args.concurrency, flows=args.flows,
+                     duration=args.duration, rate=args.rate, seed=args.seed)
+        print(report.format())
+        session.close()
+    finally:
+        if server is not None:
+            server.stop()
+    return report
+
+
+if __name__ == "__main__":
+    main()
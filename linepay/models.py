@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""Typed response models for LINE Pay API.
+
+Models are thin slotted views over the ``dict`` returned by LinePayApi.
+Scalar fields are read from the raw dict on access and nested objects are
+built on first access only, so wrapping a response is nearly free::
+
+    result = ConfirmResponse(api.confirm(transaction_id, amount, currency))
+    result.info.pay_info[0].amount
+    result.raw  # the original dict
+"""
+
+
+class _Field(object):
+    """Scalar field read from the raw dict on access."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        return obj.raw.get(self.key)
+
+
+class _Nested(object):
+    """Nested model built on first access and cached on the instance."""
+
+    __slots__ = ("key", "model", "many")
+
+    def __init__(self, key, model, many=False):
+        self.key = key
+        self.model = model
+        self.many = many
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        cache = obj._cache
+        if cache is None:
+            cache = obj._cache = {}
+        elif self.key in cache:
+            return cache[self.key]
+        value = obj.raw.get(self.key)
+        if value is not None:
+            model = self.model
+            if self.many:
+                value = tuple(model(item) for item in value)
+            else:
+                value = model(value)
+        cache[self.key] = value
+        return value
+
+
+class Model(object):
+    """Base class of response models."""
+
+    __slots__ = ("raw", "_cache")
+
+    def __init__(self, raw):
+        """__init__ method.
+        :param dict raw: raw API response (or part of it)
+        """
+        self.raw = raw
+        self._cache = None
+
+    def __eq__(self, other):
+        if isinstance(other, Model):
+            return type(self) is type(other) and self.raw == other.raw
+        return NotImplemented
+
+    def __repr__(self):
+        return "<{0} {1!r}>".format(self.__class__.__name__, self.raw)
+
+    def to_dict(self):
+        """Return raw dict
+        :rtype dict: raw API response
+        """
+        return self.raw
+
+
+class PaymentUrl(Model):
+    __slots__ = ()
+    web = _Field("web")
+    app = _Field("app")
+
+
+class PayInfo(Model):
+    __slots__ = ()
+    method = _Field("method")
+    amount = _Field("amount")
+    credit_card_nickname = _Field("creditCardNickname")
+    credit_card_brand = _Field("creditCardBrand")
+    masked_credit_card_number = _Field("maskedCreditCardNumber")
+
+
+class PackageInfo(Model):
+    __slots__ = ()
+    id = _Field("id")
+    amount = _Field("amount")
+    user_fee_amount = _Field("userFeeAmount")
+    name = _Field("name")
+
+
+class Shipping(Model):
+    __slots__ = ()
+    method_id = _Field("methodId")
+    fee_amount = _Field("feeAmount")
+    address = _Field("address")
+
+
+class RefundInfo(Model):
+    __slots__ = ()
+    refund_transaction_id = _Field("refundTransactionId")
+    transaction_type = _Field("transactionType")
+    refund_amount = _Field("refundAmount")
+    refund_transaction_date = _Field("refundTransactionDate")
+
+
+class RequestInfo(Model):
+    __slots__ = ()
+    transaction_id = _Field("transactionId")
+    payment_access_token = _Field("paymentAccessToken")
+    payment_url = _Nested("paymentUrl", PaymentUrl)
+
+
+class ConfirmInfo(Model):
+    __slots__ = ()
+    order_id = _Field("orderId")
+    transaction_id = _Field("transactionId")
+    authorization_expire_date = _Field("authorizationExpireDate")
+    reg_key = _Field("regKey")
+    pay_info = _Nested("payInfo", PayInfo, many=True)
+    packages = _Nested("packages", PackageInfo, many=True)
+    shipping = _Nested("shipping", Shipping)
+
+
+class CaptureInfo(Model):
+    __slots__ = ()
+    order_id = _Field("orderId")
+    transaction_id = _Field("transactionId")
+    pay_info = _Nested("payInfo", PayInfo, many=True)
+
+
+class RefundResultInfo(Model):
+    __slots__ = ()
+    refund_transaction_id = _Field("refundTransactionId")
+    refund_transaction_date = _Field("refundTransactionDate")
+
+
+class PayPreapprovedInfo(Model):
+    __slots__ = ()
+    transaction_id = _Field("transactionId")
+    transaction_date = _Field("transactionDate")
+    authorization_expire_date = _Field("authorizationExpireDate")
+
+
+class PaymentStatusInfo(Model):
+    __slots__ = ()
+    shipping = _Nested("shipping", Shipping)
+
+
+class PaymentDetail(Model):
+    __slots__ = ()
+    transaction_id = _Field("transactionId")
+    transaction_date = _Field("transactionDate")
+    transaction_type = _Field("transactionType")
+    pay_status = _Field("payStatus")
+    product_name = _Field("productName")
+    merchant_name = _Field("merchantName")
+    currency = _Field("currency")
+    authorization_expire_date = _Field("authorizationExpireDate")
+    original_transaction_id = _Field("originalTransactionId")
+    pay_info = _Nested("payInfo", PayInfo, many=True)
+    refund_list = _Nested("refundList", RefundInfo, many=True)
+    packages = _Nested("packages", PackageInfo, many=True)
+    shipping = _Nested("shipping", Shipping)
+
+
+class ApiResponse(Model):
+    """Base class of API response models."""
+
+    __slots__ = ()
+    return_code = _Field("returnCode")
+    return_message = _Field("returnMessage")
+
+
+class RequestResponse(ApiResponse):
+    __slots__ = ()
+    info = _Nested("info", RequestInfo)
+
+
+class ConfirmResponse(ApiResponse):
+    __slots__ = ()
+    info = _Nested("info", ConfirmInfo)
+
+
+class CaptureResponse(ApiResponse):
+    __slots__ = ()
+    info = _Nested("info", CaptureInfo)
+
+
+class VoidResponse(ApiResponse):
+    __slots__ = ()
+
+
+class RefundResponse(ApiResponse):
+    __slots__ = ()
+    info = _Nested("info", RefundResultInfo)
+
+
+class PayPreapprovedResponse(ApiResponse):
+    __slots__ = ()
+    info = _Nested("info", PayPreapprovedInfo)
+
+
+class CheckRegKeyResponse(ApiResponse):
+    __slots__ = ()
+
+
+class ExpireRegKeyResponse(ApiResponse):
+    __slots__ = ()
+
+
+class CheckPaymentStatusResponse(ApiResponse):
+    __slots__ = ()
+    info = _Nested("info", PaymentStatusInfo)
+
+
+class PaymentDetailsResponse(ApiResponse):
+    __slots__ = ()
+    info = _Nested("info", PaymentDetail, many=True)
+
+    def __iter__(self):
+        return iter(self.info or ())
+
+
+# LinePayApi method name -> response model
+RESPONSE_MODELS = {
+    "request": RequestResponse,
+    "confirm": ConfirmResponse,
+    "capture": CaptureResponse,
+    "void": VoidResponse,
+    "refund": RefundResponse,
+    "pay_preapproved": PayPreapprovedResponse,
+    "check_regkey": CheckRegKeyResponse,
+    "expire_regkey": ExpireRegKeyResponse,
+    "check_payment_status": CheckPaymentStatusResponse,
+    "payment_details": PaymentDetailsResponse,
+}
+
+
+def wrap_response(method_name, result):
+    """Wrap raw API response in the model of the LinePayApi method
+    :param str method_name: LinePayApi method name (ex. "confirm")
+    :param dict result: raw API response
+    :rtype ApiResponse: typed response
+    """
+    return RESPONSE_MODELS[method_name](result)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+"""Connection pool prewarming and health probing.
+
+The first API call after a deploy or an idle period pays DNS, TCP and
+TLS setup. warm_up opens keep-alive connections ahead of time with HEAD
+requests to the API endpoint, which are not payment calls and need no
+signature::
+
+    api = LinePayApi(channel_id, channel_secret)
+    api.warmup(connections=4)
+    keeper = api.keep_warm(connections=4, interval=30.0)
+    ...
+    api.probe()
+    keeper.stop()
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .util import LOGGER
+
+DEFAULT_POOL_MAXSIZE = 10
+
+
+class PoolHealth(namedtuple("PoolHealth", (
+        "endpoint", "reachable", "status_code", "rtt", "idle_connections",
+        "max_connections", "error"))):
+    """Health of the connection pool of an API endpoint.
+    :param str endpoint: API endpoint
+    :param bool reachable: Whether the endpoint answered the probe
+    :param int status_code: HTTP status code of the probe
+    :param float rtt: Round trip time of the probe in seconds
+    :param int idle_connections: Open connections waiting in the pool
+    :param int max_connections: Connections the pool keeps at most
+    :param str error: Error of the probe, or None when reachable
+    """
+
+    __slots__ = ()
+
+
+def create_pooled_session(pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """Session keeping up to pool_maxsize connections alive per host
+    :param int pool_maxsize: Connections kept alive per host
+    :rtype requests.Session: new session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def pool_status(session, url):
+    """Idle and maximum connections of the session's pool for url
+    :param requests.Session session: Session
+    :param str url: URL of the pooled host
+    :rtype tuple: (idle connections, max connections). (0, 0) when the
+        session does not pool connections with urllib3
+    """
+    adapter = session.get_adapter(url)
+    poolmanager = getattr(adapter, "poolmanager", None)
+    if poolmanager is None:
+        return 0, 0
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    idle = maxsize = 0
+    # requests may key pools with TLS settings, so match by host only
+    for key in poolmanager.pools.keys():
+        if (key.key_scheme, key.key_host, key.key_port) != (
+                parts.scheme, parts.hostname, port):
+            continue
+        pool = poolmanager.pools.get(key)
+        if pool is None:
+            continue
+        # empty slots of the pool are None
+        idle += sum(
+            1 for conn in list(pool.pool.queue)
+            if conn is not None and getattr(conn, "sock", None) is not None)
+        maxsize += pool.pool.maxsize
+    return idle, maxsize or getattr(adapter, "_pool_maxsize", 0)
+
+
+def _head(session, url, timeout, stream=False):
+    started = time.perf_counter()
+    response = session.head(url, timeout=timeout, stream=stream)
+    return response, time.perf_counter() - started
+
+
+def warm_up(session, url, connections, timeout=5.0):
+    """Open keep-alive connections to url
+    Every request holds its connection until all requests are answered,
+    so each one opens its own connection. Connections over the pool size
+    of the session are closed.
+    :param requests.Session session: Session to warm up
+    :param str url: URL of the host
+    :param int connections: Number of connections to open
+    :param float timeout: Timeout in seconds of each request
+    :rtype int: number of requests that succeeded
+    """
+    if connections <= 0:
+        raise ValueError("connections must be greater than 0")
+    barrier = threading.Barrier(connections)
+
+    def wait():
+        try:
+            barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            pass
+
+    def open_connection(_):
+        try:
+            response, _ = _head(session, url, timeout, stream=True)
+        except requests.RequestException as e:
+            LOGGER.warning("Failed to warm up connection to %s: %r", url, e)
+            barrier.abort()
+            return False
+        wait()
+        # reading the (empty) body returns the connection to the pool
+        response.content
+        return True
+
+    with ThreadPoolExecutor(connections) as executor:
+        return sum(executor.map(open_connection, range(connections)))
+
+
+def probe(session, url, timeout=5.0):
+    """Check the endpoint and the connection pool without an API call
+    :param requests.Session session: Session to probe
+    :param str url: URL of the host
+    :param float timeout: Timeout in seconds of the probe
+    :rtype PoolHealth: health of the pool
+    """
+    try:
+        response, rtt = _head(session, url, timeout)
+        status_code, error = response.status_code, None
+    except requests.RequestException as e:
+        rtt = status_code = None
+        error = repr(e)
+    idle, maxsize = pool_status(session, url)
+    return PoolHealth(
+        url, error is None, status_code, rtt, idle, maxsize, error)
+
+
+class ConnectionKeeper(object):
+    """Background thread keeping connections of a client warm."""
+
+    def __init__(self, api, connections, interval=30.0, timeout=5.0):
+        """__init__ method.
+        :param LinePayApi api: Client whose connections are kept warm
+        :param int connections: Number of connections to keep open
+        :param float interval: Seconds between rounds. Should be shorter
+            than the keep-alive timeout of the server
+        :param float timeout: Timeout in seconds of each request
+        """
+        self.api = api
+        self.connections = connections
+        self.interval = interval
+        self.timeout = timeout
+        self.last_health = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start background thread
+        :rtype ConnectionKeeper: self
+        """
+        if not self.running:
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="linepay-connection-keeper",
+                daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop background thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self):
+        """Warm up connections and probe the pool once
+        :rtype PoolHealth: health of the pool after warming up
+        """
+        self.api.warmup(self.connections, self.timeout)
+        self.last_health = self.api.probe(self.timeout)
+        if not self.last_health.reachable:
+            LOGGER.warning(
+                "LINE Pay API endpoint %s is unreachable: %s",
+                self.last_health.endpoint, self.last_health.error)
+        return self.last_health
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                LOGGER.exception("Failed to keep connections warm")
+            self._stop_event.wait(self.interval)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+"""Opt-in allocation profiling of the API call pipeline.
+
+AllocationProfiler is used as the tracer of LinePayApi. It records the
+traced memory retained by every API call and every phase (sign, send,
+parse ...) with tracemalloc, and every report_every calls diffs a
+tracemalloc snapshot against the previous one to find the allocation
+sites inside linepay that keep growing::
+
+    profiler = AllocationProfiler(report_every=10000)
+    api = LinePayApi(channel_id, channel_secret, tracer=profiler)
+    ...
+    print(profiler.last_report.format())
+
+tracemalloc counts the memory of the whole process, not of a thread. A
+span is only measured when no span of another thread started or was open
+while it ran, so with concurrent calls (ex. ShardedRunner workers) most
+spans are counted but not measured. Threads allocating outside any span
+(ex. hedged attempts) still distort the numbers, so profile a single
+threaded run for an exact per-call breakdown. The allocation site diffs
+are not affected.
+
+tracemalloc slows every allocation of the process, so this is meant for
+investigating memory growth, not for normal operation. Closing the client
+stops tracemalloc if the profiler started it.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+import os
+import threading
+import tracemalloc
+
+from .util import LOGGER
+
+_PACKAGE_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "*")
+
+
+class SpanAllocation(namedtuple("SpanAllocation", (
+        "calls", "measured_calls", "retained_bytes"))):
+    """Traced memory retained by calls of an API or a phase.
+    :param int calls: Number of calls
+    :param int measured_calls: Calls that overlapped no span of another
+        thread
+    :param int retained_bytes: Traced memory grown over the measured
+        calls. Freed memory counts negative
+    """
+
+    __slots__ = ()
+
+    @property
+    def bytes_per_call(self):
+        """Retained bytes per measured call, None when none was measured"""
+        if self.measured_calls == 0:
+            return None
+        return self.retained_bytes / self.measured_calls
+
+
+class AllocationSite(namedtuple("AllocationSite", (
+        "filename", "lineno", "size_diff", "count_diff", "size"))):
+    """Allocation site grown since the previous report.
+    :param str filename: Source file
+    :param int lineno: Line number
+    :param int size_diff: Bytes grown since the previous report
+    :param int count_diff: Blocks grown since the previous report
+    :param int size: Bytes allocated by the site and still alive
+    """
+
+    __slots__ = ()
+
+
+class AllocationReport(namedtuple("AllocationReport", (
+        "calls", "spans", "top_sites"))):
+    """Allocations of the API calls since the previous report.
+    :param int calls: API calls since the previous report
+    :param dict spans: Span name to SpanAllocation
+    :param list top_sites: Largest growing AllocationSite first
+    """
+
+    __slots__ = ()
+
+    def format(self):
+        """Human readable report
+        :rtype str: report
+        """
+        lines = ["Allocations of {} API calls".format(self.calls)]
+        for name in sorted(self.spans):
+            span = self.spans[name]
+            per_call = span.bytes_per_call
+            lines.append(
+                "  {:<28} {:>8} calls {:>8} measured {:>12} B/call".format(
+                    name, span.calls, span.measured_calls,
+                    "-" if per_call is None else "{:.1f}".format(per_call)))
+        lines.append("Top growing allocation sites")
+        for site in self.top_sites:
+            lines.append("  {}:{} {:+d} B {:+d} blocks ({} B alive)".format(
+                site.filename, site.lineno, site.size_diff, site.count_diff,
+                site.size))
+        return "\n".join(lines)
+
+
+class AllocationProfiler(object):
+    """Tracer recording allocations of API calls with tracemalloc."""
+
+    def __init__(self, report_every=1000, top=10, frames=1,
+                 linepay_only=True, on_report=None):
+        """__init__ method.
+        :param int report_every: API calls between reports
+        :param int top: Number of allocation sites in reports
+        :param int frames: Frames kept per traceback when this profiler
+            starts tracemalloc
+        :param bool linepay_only: Only report allocation sites in linepay
+        :param on_report: Function called with every AllocationReport.
+            Reports are logged at INFO level when omitted
+        """
+        if report_every <= 0:
+            raise ValueError("report_every must be greater than 0")
+        self.report_every = report_every
+        self.top = top
+        self.linepay_only = linepay_only
+        self.on_report = on_report
+        self.last_report = None
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(frames)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._calls = 0
+        self._spans = {}
+        # threads in a span, and spans started, to detect overlapping spans
+        self._active_threads = 0
+        self._started_spans = 0
+        self._snapshot = self._take_snapshot()
+
+    @contextmanager
+    def span(self, name, attributes=None):
+        """Record traced memory retained by a call or a phase
+        :param str name: Span name
+        :param dict attributes: Span attributes (ignored)
+        """
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        local.depth = depth + 1
+        own_spans = local.spans = getattr(local, "spans", 0) + 1
+        with self._lock:
+            if depth == 0:
+                self._active_threads += 1
+            self._started_spans += 1
+            alone = self._active_threads == 1
+            started_spans = self._started_spans
+        started = tracemalloc.get_traced_memory()[0]
+        try:
+            yield _NULL_SPAN
+        finally:
+            retained = tracemalloc.get_traced_memory()[0] - started
+            local.depth = depth
+            report = False
+            with self._lock:
+                if depth == 0:
+                    self._active_threads -= 1
+                # spans started meanwhile, other than children of this one
+                others = (self._started_spans - started_spans) - \
+                    (local.spans - own_spans)
+                measured = alone and others == 0
+                calls, measured_calls, total = self._spans.get(
+                    name, (0, 0, 0))
+                if measured:
+                    measured_calls += 1
+                    total += retained
+                self._spans[name] = (calls + 1, measured_calls, total)
+                if depth == 0:
+                    self._calls += 1
+                    report = self._calls % self.report_every == 0
+            if report:
+                self.report()
+
+    def report(self):
+        """Diff allocations since the previous report
+        :rtype AllocationReport: report, also passed to on_report
+        """
+        snapshot = self._take_snapshot()
+        with self._lock:
+            previous, self._snapshot = self._snapshot, snapshot
+            spans = {
+                name: SpanAllocation(*counters)
+                for name, counters in self._spans.items()}
+            calls = self._calls
+            self._spans = {}
+            self._calls = 0
+        top_sites = []
+        for stat in snapshot.compare_to(previous, "lineno")[:self.top]:
+            frame = stat.traceback[0]
+            top_sites.append(AllocationSite(
+                frame.filename, frame.lineno, stat.size_diff,
+                stat.count_diff, stat.size))
+        report = AllocationReport(calls, spans, top_sites)
+        self.last_report = report
+        if self.on_report is not None:
+            self.on_report(report)
+        else:
+            LOGGER.info("%s", report.format())
+        return report
+
+    def flush(self):
+        """Report calls made since the previous report, if any"""
+        with self._lock:
+            pending = self._calls
+        if pending:
+            self.report()
+
+    def stop(self):
+        """Stop tracemalloc if it was started by this profiler"""
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot()
+        if self.linepay_only:
+            snapshot = snapshot.filter_traces(
+                (tracemalloc.Filter(True, _PACKAGE_FILES),))
+        return snapshot
+
+
+class _NullSpan(object):
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
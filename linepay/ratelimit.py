@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""Token bucket rate limiter for batches of LINE Pay API calls."""
+
+import threading
+import time
+
+
+class TokenBucket(object):
+    """Token bucket refilled at a constant rate.
+
+    One token is one API call. Tokens accumulate up to burst while idle.
+    One bucket may be shared by several threads.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        """__init__ method.
+        :param float rate: Tokens added per second
+        :param float burst: Maximum number of tokens. Same as rate if omitted
+        :param clock: Function returning current time in seconds
+        """
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        if burst is None:
+            burst = max(rate, 1)
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def available(self):
+        """Number of tokens available now
+        :rtype float: available tokens
+        """
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available
+        :param int tokens: Number of tokens to take
+        :rtype bool: True when the tokens were taken
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def acquire(self, tokens=1):
+        """Take tokens, waiting until they are available
+        :param int tokens: Number of tokens to take
+        """
+        while not self.try_acquire(tokens):
+            time.sleep(self.delay(tokens))
+
+    def acquire_up_to(self, tokens):
+        """Take as many whole tokens as available, up to tokens
+        :param int tokens: Maximum number of tokens to take
+        :rtype int: number of tokens taken
+        """
+        with self._lock:
+            self._refill()
+            taken = min(int(self._tokens), tokens)
+            if taken > 0:
+                self._tokens -= taken
+            return max(taken, 0)
+
+    def release(self, tokens):
+        """Give back unused tokens taken by acquire_up_to
+        :param int tokens: Number of tokens to give back
+        """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + tokens)
+
+    def delay(self, tokens=1):
+        """Seconds until tokens are available
+        :param int tokens: Number of tokens
+        :rtype float: seconds to wait. 0 when available now
+        """
+        with self._lock:
+            self._refill()
+            missing = tokens - self._tokens
+            if missing <= 0:
+                return 0.0
+            return missing / self.rate
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+"""Incremental reconciliation against Payment Details API.
+
+A local store keeps a fingerprint of the last seen state of every tracked
+transaction. Each run queries only transactions whose state can still
+change, and emits differences against the merchant ledger only for
+transactions whose fingerprint changed::
+
+    store = ReconciliationStore("reconciliation.db")
+    reconciler = IncrementalReconciler(api, store, ledger=ledger)
+    reconciler.track(transactions_updated_since(reconciler.watermark))
+    for diff in reconciler.reconcile():
+        report(diff)
+
+Transactions are open while authorized or partially refunded. Captured,
+fully refunded, voided and expired transactions, and transactions not
+found in LINE Pay, are closed and not queried again until tracked again.
+"""
+
+from collections import namedtuple
+import hashlib
+import sqlite3
+import time
+
+from .exceptions import LinePayApiError, LinePayTransactionStateError
+from .ledger import payment_amounts
+from .util import ordered_map, LOGGER
+
+DIFF_NOT_FOUND = "not_found"
+DIFF_CHANGED = "changed"
+DIFF_UNKNOWN = "unknown"
+DIFF_PAID = "paid"
+DIFF_REFUNDED = "refunded"
+
+# returnCode of Payment Details API for a transaction that does not exist
+TRANSACTION_NOT_FOUND = "1150"
+
+# payStatus of Payment Details API that may still change
+OPEN_PAY_STATUS_LIST = ["AUTHORIZATION"]
+
+
+def fingerprint(detail):
+    """Fingerprint of the state of a transaction
+    :param dict detail: info entry of Payment Details API response
+    :rtype int: signed 64 bit fingerprint
+    """
+    state = (
+        detail.get("payStatus", None),
+        tuple(pay_info.get("amount", None)
+              for pay_info in detail.get("payInfo", None) or ()),
+        tuple((refund.get("refundTransactionId", None),
+               refund.get("refundAmount", None))
+              for refund in detail.get("refundList", None) or ()),
+    )
+    digest = hashlib.blake2b(repr(state).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class ReconciliationDiff(namedtuple(
+        "ReconciliationDiff",
+        ("transaction_id", "kind", "expected", "actual", "pay_status"))):
+    """Difference between LINE Pay and the merchant ledger.
+    :param int transaction_id: Transaction id
+    :param str kind: DIFF_* constant
+    :param expected: Amount in the ledger
+    :param actual: Amount in LINE Pay
+    :param str pay_status: payStatus of the transaction
+    """
+
+    __slots__ = ()
+
+
+class ReconcileSummary(namedtuple(
+        "ReconcileSummary", ("checked", "changed", "closed", "diffs"))):
+    """Result of a reconciliation run.
+    :param int checked: Number of transactions queried
+    :param int changed: Number of transactions whose state changed
+    :param int closed: Number of transactions closed in this run
+    :param int diffs: Number of differences emitted
+    """
+
+    __slots__ = ()
+
+
+class ReconciliationStore(object):
+    """SQLite store of watermark and transaction fingerprints.
+    Use from one thread at a time.
+    """
+
+    PAGE_SIZE = 1000
+
+    def __init__(self, path=":memory:"):
+        """__init__ method.
+        :param str path: SQLite database file path
+        """
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS reconciliation_state ("
+                "transaction_id INTEGER PRIMARY KEY, fingerprint INTEGER, "
+                "open INTEGER NOT NULL, checked_at REAL)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS reconciliation_state_open "
+                "ON reconciliation_state (open, transaction_id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS reconciliation_meta ("
+                "key TEXT PRIMARY KEY, value TEXT)")
+
+    def close(self):
+        """Close database connection"""
+        self._conn.close()
+
+    def get_watermark(self):
+        """Start time of the last completed run
+        :rtype float: POSIX time, or None before the first run
+        """
+        row = self._conn.execute(
+            "SELECT value FROM reconciliation_meta WHERE key = 'watermark'"
+        ).fetchone()
+        return None if row is None else float(row[0])
+
+    def set_watermark(self, watermark):
+        """Save start time of a completed run
+        :param float watermark: POSIX time
+        """
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reconciliation_meta (key, value) "
+                "VALUES ('watermark', ?)", (repr(watermark),))
+
+    def track(self, transaction_ids):
+        """Open transactions, forgetting their fingerprints
+        :param transaction_ids: Iterable of transaction ids
+        :rtype int: number of transactions tracked
+        """
+        with self._conn:
+            cursor = self._conn.executemany(
+                "INSERT OR REPLACE INTO reconciliation_state "
+                "(transaction_id, fingerprint, open, checked_at) "
+                "VALUES (?, NULL, 1, NULL)",
+                ((transaction_id,) for transaction_id in transaction_ids))
+            return cursor.rowcount
+
+    def iter_open(self):
+        """Open transactions, read a page at a time
+        :rtype generator: (transaction id, fingerprint) tuples
+        """
+        last = None
+        while True:
+            if last is None:
+                rows = self._conn.execute(
+                    "SELECT transaction_id, fingerprint "
+                    "FROM reconciliation_state WHERE open = 1 "
+                    "ORDER BY transaction_id LIMIT ?",
+                    (self.PAGE_SIZE,)).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT transaction_id, fingerprint "
+                    "FROM reconciliation_state "
+                    "WHERE open = 1 AND transaction_id > ? "
+                    "ORDER BY transaction_id LIMIT ?",
+                    (last, self.PAGE_SIZE)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def update(self, states):
+        """Save fingerprints of checked transactions
+        :param states: Iterable of (fingerprint, open, checked at,
+            transaction id) tuples
+        """
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE reconciliation_state "
+                "SET fingerprint = ?, open = ?, checked_at = ? "
+                "WHERE transaction_id = ?", states)
+
+    def count_open(self):
+        """Number of open transactions
+        :rtype int: number of open transactions
+        """
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM reconciliation_state WHERE open = 1"
+        ).fetchone()[0]
+
+
+class IncrementalReconciler(object):
+    """Reconciles open transactions and emits only differences."""
+
+    DEFAULT_CONCURRENCY = 8
+    # Save fingerprints every N transactions
+    COMMIT_INTERVAL = 500
+
+    def __init__(self, api, store, ledger=None,
+                 concurrency=DEFAULT_CONCURRENCY, rate_limiter=None,
+                 clock=time.time):
+        """__init__ method.
+        :param LinePayApi api: Client to call Payment Details API with
+        :param ReconciliationStore store: Watermark and fingerprint store
+        :param ledger: Merchant ledger with amounts(transaction_id)
+            returning (paid, refunded) or None, e.g. RefundLedger. Every
+            change is emitted as DIFF_CHANGED when omitted
+        :param int concurrency: Maximum number of API calls in progress
+        :param TokenBucket rate_limiter: Rate limiter of the API calls
+        :param clock: Function returning current POSIX time in seconds
+        """
+        if concurrency <= 0:
+            raise ValueError("concurrency must be greater than 0")
+        self.api = api
+        self.store = store
+        self.ledger = ledger
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter
+        self._clock = clock
+        self.last_summary = None
+
+    @property
+    def watermark(self):
+        """Start time of the last completed run, or None"""
+        return self.store.get_watermark()
+
+    def track(self, transaction_ids):
+        """Track transactions created or updated in the merchant ledger
+        :param transaction_ids: Iterable of transaction ids
+        :rtype int: number of transactions tracked
+        """
+        return self.store.track(transaction_ids)
+
+    def reconcile(self):
+        """Query open transactions and yield differences. The watermark and
+        last_summary are updated when the generator is exhausted.
+        :rtype generator: ReconciliationDiff
+        """
+        started_at = self._clock()
+        checked = changed = closed = diffs = 0
+        states = []
+        for (transaction_id, old_fingerprint), detail in ordered_map(
+                self._fetch, self.store.iter_open(), self.concurrency):
+            if detail is False:
+                # failed, query again in the next run
+                continue
+            checked += 1
+            if detail is None:
+                # reported once, then closed until tracked again
+                closed += 1
+                states.append((None, 0, started_at, transaction_id))
+                diffs += 1
+                yield ReconciliationDiff(
+                    transaction_id, DIFF_NOT_FOUND, None, None, None)
+                continue
+            new_fingerprint = fingerprint(detail)
+            if new_fingerprint == old_fingerprint:
+                # unchanged, so still open
+                continue
+            changed += 1
+            pay_status = detail.get("payStatus", None)
+            paid, refunded = payment_amounts(detail)
+            is_open = pay_status in OPEN_PAY_STATUS_LIST or \
+                0 < refunded < paid
+            if not is_open:
+                closed += 1
+            states.append(
+                (new_fingerprint, int(is_open), started_at, transaction_id))
+            if len(states) >= self.COMMIT_INTERVAL:
+                self.store.update(states)
+                states = []
+            for diff in self._diff(
+                    transaction_id, pay_status, paid, refunded):
+                diffs += 1
+                yield diff
+        self.store.update(states)
+        self.store.set_watermark(started_at)
+        self.last_summary = ReconcileSummary(checked, changed, closed, diffs)
+        LOGGER.info("Reconciliation completed: %s", self.last_summary)
+
+    def _diff(self, transaction_id, pay_status, paid, refunded):
+        if self.ledger is None:
+            yield ReconciliationDiff(
+                transaction_id, DIFF_CHANGED, None, (paid, refunded),
+                pay_status)
+            return
+        expected = self.ledger.amounts(transaction_id)
+        if expected is None:
+            yield ReconciliationDiff(
+                transaction_id, DIFF_UNKNOWN, None, (paid, refunded),
+                pay_status)
+            return
+        if expected[0] != paid:
+            yield ReconciliationDiff(
+                transaction_id, DIFF_PAID, expected[0], paid, pay_status)
+        if expected[1] != refunded:
+            yield ReconciliationDiff(
+                transaction_id, DIFF_REFUNDED, expected[1], refunded,
+                pay_status)
+
+    def _fetch(self, item):
+        """Call Payment Details API for an open transaction
+        :rtype dict: info entry of the transaction, None when not found or
+            False when failed
+        """
+        transaction_id = item[0]
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            result = self.api.payment_details(transaction_id=transaction_id)
+        except (LinePayApiError, OSError) as e:
+            # unknown transactions are answered with an error, not empty info
+            if isinstance(e, LinePayTransactionStateError) and \
+                    e.return_code == TRANSACTION_NOT_FOUND:
+                return None
+            LOGGER.warning(
+                "Payment Details of transaction %s failed: %s",
+                transaction_id, e)
+            return False
+        for detail in result.get("info", None) or ():
+            if detail.get("transactionId", None) == transaction_id:
+                return detail
+        return None
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""Streaming export of Payment Details API for reconciliation.
+
+Transactions are looked up by transaction id or order id with bounded
+concurrency, flattened into rows and written one by one, so memory stays
+constant however many transactions are exported::
+
+    exporter = ReconciliationExporter(api, concurrency=8)
+    summary = exporter.export(
+        "transactions-2020-01-31.csv", transaction_ids=transaction_ids)
+
+Every payInfo of a transaction becomes a "payment" row and every
+refundList entry a "refund" row. Parquet is written when the path ends
+with .parquet, which requires pyarrow (``pip install line-pay[parquet]``).
+"""
+
+from collections import namedtuple
+import csv
+import itertools
+
+from .exceptions import LinePayApiError
+from .util import ordered_map, LOGGER
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+ROW_TYPE_PAYMENT = "payment"
+ROW_TYPE_REFUND = "refund"
+
+LOOKUP_TRANSACTION_ID = "transaction_id"
+LOOKUP_ORDER_ID = "order_id"
+
+ROW_FIELDS = (
+    "row_type",
+    "transaction_id",
+    "order_id",
+    "transaction_date",
+    "transaction_type",
+    "pay_status",
+    "currency",
+    "product_name",
+    "merchant_name",
+    "original_transaction_id",
+    "authorization_expire_date",
+    "pay_method",
+    "amount",
+    "masked_credit_card_number",
+    "refund_transaction_id",
+    "refund_transaction_type",
+    "refund_transaction_date",
+)
+
+_INTEGER_FIELDS = frozenset((
+    "transaction_id", "original_transaction_id", "refund_transaction_id"))
+_FLOAT_FIELDS = frozenset(("amount",))
+
+
+class ReconciliationRow(namedtuple("ReconciliationRow", ROW_FIELDS)):
+    """One payment or refund of a transaction."""
+
+    __slots__ = ()
+
+
+def flatten_payment_detail(detail, order_id=None):
+    """Flatten one info entry of Payment Details API into rows
+    :param dict detail: info entry of Payment Details API response
+    :param str order_id: Order id, when looked up by order id
+    :rtype generator: ReconciliationRow of every payInfo and refundList entry
+    """
+    common = (
+        detail.get("transactionId", None),
+        detail.get("orderId", order_id),
+        detail.get("transactionDate", None),
+        detail.get("transactionType", None),
+        detail.get("payStatus", None),
+        detail.get("currency", None),
+        detail.get("productName", None),
+        detail.get("merchantName", None),
+        detail.get("originalTransactionId", None),
+        detail.get("authorizationExpireDate", None),
+    )
+    for pay_info in detail.get("payInfo", None) or ():
+        yield ReconciliationRow(
+            ROW_TYPE_PAYMENT, *common,
+            pay_info.get("method", None),
+            pay_info.get("amount", None),
+            pay_info.get("maskedCreditCardNumber", None),
+            None, None, None)
+    for refund in detail.get("refundList", None) or ():
+        yield ReconciliationRow(
+            ROW_TYPE_REFUND, *common,
+            None,
+            refund.get("refundAmount", None),
+            None,
+            refund.get("refundTransactionId", None),
+            refund.get("transactionType", None),
+            refund.get("refundTransactionDate", None))
+
+
+class ExportSummary(namedtuple(
+        "ExportSummary", ("lookups", "rows", "failed"))):
+    """Result of an export.
+    :param int lookups: Number of transaction and order ids looked up
+    :param int rows: Number of rows written
+    :param int failed: Number of lookups failed
+    """
+
+    __slots__ = ()
+
+
+class ReconciliationExporter(object):
+    """Exports Payment Details API of many transactions as rows."""
+
+    DEFAULT_CONCURRENCY = 8
+    DEFAULT_ROW_GROUP_SIZE = 10000
+
+    def __init__(self, api, concurrency=DEFAULT_CONCURRENCY,
+                 rate_limiter=None, on_error=None):
+        """__init__ method.
+        :param LinePayApi api: Client to call Payment Details API with
+        :param int concurrency: Maximum number of API calls in progress
+        :param TokenBucket rate_limiter: Rate limiter of the API calls
+        :param on_error: Function called with (lookup type, id, exception)
+            of failed lookups. Failures are logged and skipped by default
+        """
+        if concurrency <= 0:
+            raise ValueError("concurrency must be greater than 0")
+        self.api = api
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter
+        self.on_error = on_error
+        self._lookups = 0
+        self._failed = 0
+
+    def iter_rows(self, transaction_ids=(), order_ids=()):
+        """Look up transactions and yield their rows in order of the ids
+        :param transaction_ids: Iterable of transaction ids
+        :param order_ids: Iterable of order ids
+        :rtype generator: ReconciliationRow
+        """
+        lookups = itertools.chain(
+            ((LOOKUP_TRANSACTION_ID, i) for i in transaction_ids),
+            ((LOOKUP_ORDER_ID, i) for i in order_ids))
+        for (lookup, value), details in ordered_map(
+                self._fetch, lookups, self.concurrency):
+            self._lookups += 1
+            if details is None:
+                self._failed += 1
+                continue
+            order_id = value if lookup == LOOKUP_ORDER_ID else None
+            for detail in details:
+                yield from flatten_payment_detail(detail, order_id)
+
+    def export(self, path, transaction_ids=(), order_ids=(),
+               file_format=None):
+        """Export rows to a file
+        :param str path: Output file path
+        :param transaction_ids: Iterable of transaction ids
+        :param order_ids: Iterable of order ids
+        :param str file_format: "csv" or "parquet". Chosen by extension of
+            path when omitted
+        :rtype ExportSummary: numbers of lookups, rows and failures
+        """
+        if file_format is None:
+            file_format = "parquet" if path.endswith(".parquet") else "csv"
+        if file_format == "csv":
+            write = write_csv
+        elif file_format == "parquet":
+            write = write_parquet
+        else:
+            raise ValueError(
+                "file_format[{}] is not supported".format(file_format))
+        self._lookups = 0
+        self._failed = 0
+        rows = write(path, self.iter_rows(transaction_ids, order_ids))
+        return ExportSummary(self._lookups, rows, self._failed)
+
+    def _fetch(self, lookup):
+        """Call Payment Details API for a transaction id or order id
+        :rtype list: info of the response, or None when failed
+        """
+        lookup_type, value = lookup
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            if lookup_type == LOOKUP_TRANSACTION_ID:
+                result = self.api.payment_details(transaction_id=value)
+            else:
+                result = self.api.payment_details(order_id=value)
+        except (LinePayApiError, OSError) as e:
+            if self.on_error is None:
+                LOGGER.warning(
+                    "Payment Details of %s %s failed: %s",
+                    lookup_type, value, e)
+            else:
+                self.on_error(lookup_type, value, e)
+            return None
+        return result.get("info", None) or ()
+
+
+def write_csv(path, rows):
+    """Write rows to a CSV file with header
+    :param str path: Output file path
+    :param rows: Iterable of ReconciliationRow
+    :rtype int: number of rows written
+    """
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(ROW_FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def parquet_schema():
+    """Parquet schema of ReconciliationRow
+    :rtype pyarrow.Schema: schema
+    """
+    if pyarrow is None:
+        raise ImportError(
+            "Parquet export requires pyarrow. "
+            "Install it with: pip install line-pay[parquet]")
+    fields = []
+    for name in ROW_FIELDS:
+        if name in _INTEGER_FIELDS:
+            fields.append(pyarrow.field(name, pyarrow.int64()))
+        elif name in _FLOAT_FIELDS:
+            fields.append(pyarrow.field(name, pyarrow.float64()))
+        else:
+            fields.append(pyarrow.field(name, pyarrow.string()))
+    return pyarrow.schema(fields)
+
+
+def write_parquet(path, rows,
+                  row_group_size=ReconciliationExporter.DEFAULT_ROW_GROUP_SIZE):
+    """Write rows to a Parquet file, one row group at a time
+    :param str path: Output file path
+    :param rows: Iterable of ReconciliationRow
+    :param int row_group_size: Rows kept in memory before writing
+    :rtype int: number of rows written
+    """
+    schema = parquet_schema()
+    rows = iter(rows)
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        while True:
+            chunk = list(itertools.islice(rows, row_group_size))
+            if not chunk:
+                break
+            columns = [
+                pyarrow.array([row[i] for row in chunk], type=field.type)
+                for i, field in enumerate(schema)]
+            writer.write_table(
+                pyarrow.Table.from_arrays(columns, schema=schema))
+            count += len(chunk)
+    return count
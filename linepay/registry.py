@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""Registry of LinePayApi clients of many merchants (channels).
+
+Clients are created on first use and cached with LRU eviction. Every
+client of the registry shares one pooled requests.Session per API
+endpoint host, while metrics and rate limits are kept per channel::
+
+    registry = ClientRegistry(load_channel_secret, max_clients=5000,
+                              rate=20)
+    api = registry.get(channel_id)
+    api.confirm(transaction_id, amount, currency)
+    registry.metrics(channel_id).calls
+
+Evicted clients are closed, which flushes their interceptors, as soon as
+they have no call in flight. Until then they are kept, and close() of the
+registry waits for them too. Do not keep clients returned by get() for
+later calls, as an evicted client rejects new calls once closed.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .api import LinePayApi
+from .exceptions import RateLimitExceededError
+from .interceptors import Interceptor
+from .pool import create_pooled_session
+from .ratelimit import TokenBucket
+
+
+class TenantMetrics(Interceptor):
+    """API call counters of one channel. Calls failing to send or with a
+    returnCode not safe for the API count as failures."""
+
+    def __init__(self, channel_id):
+        """__init__ method.
+        :param str channel_id: Channel id
+        """
+        self.channel_id = channel_id
+        self.calls = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rate_limited = 0
+        # clients of the registry are called from many threads
+        self._lock = threading.Lock()
+
+    def before_send(self, call):
+        call.state(self)["started"] = time.perf_counter()
+
+    def after_response(self, call):
+        self._record(
+            call,
+            call.result.get("returnCode", None) not in call.safe_return_codes)
+
+    def on_error(self, call, error):
+        self._record(call, True)
+
+    def record_rate_limited(self):
+        """Count a call rejected by the rate limit"""
+        with self._lock:
+            self.rate_limited += 1
+
+    def _record(self, call, failed):
+        elapsed = time.perf_counter() - call.state(self)["started"]
+        with self._lock:
+            self.calls += 1
+            self.total_seconds += elapsed
+            if elapsed > self.max_seconds:
+                self.max_seconds = elapsed
+            if failed:
+                self.failures += 1
+
+    @property
+    def mean_seconds(self):
+        """Mean round trip time of API calls"""
+        if self.calls == 0:
+            return 0.0
+        return self.total_seconds / self.calls
+
+
+class TenantRateLimit(Interceptor):
+    """Rejects API calls of one channel over its rate limit."""
+
+    def __init__(self, channel_id, bucket, metrics=None):
+        """__init__ method.
+        :param str channel_id: Channel id
+        :param TokenBucket bucket: Rate limiter of the channel
+        :param TenantMetrics metrics: Metrics counting rejected calls
+        """
+        self.channel_id = channel_id
+        self.bucket = bucket
+        self.metrics = metrics
+
+    def before_sign(self, call):
+        if not self.bucket.try_acquire():
+            if self.metrics is not None:
+                self.metrics.record_rate_limited()
+            raise RateLimitExceededError(
+                self.channel_id, self.bucket.delay(),
+                "Rate limit of the channel is exceeded")
+
+
+class _Tenant(object):
+
+    __slots__ = ("api", "metrics")
+
+    def __init__(self, api, metrics):
+        self.api = api
+        self.metrics = metrics
+
+
+class ClientRegistry(object):
+    """LRU cache of LinePayApi clients keyed by channel id."""
+
+    DEFAULT_MAX_CLIENTS = 1000
+    DEFAULT_POOL_MAXSIZE = 32
+
+    def __init__(
+            self,
+            channel_secrets,
+            max_clients=DEFAULT_MAX_CLIENTS,
+            is_sandbox=False,
+            api_endpoint=None,
+            rate=None,
+            burst=None,
+            pool_maxsize=DEFAULT_POOL_MAXSIZE,
+            session_factory=None,
+            on_evict=None,
+            **api_kwargs):
+        """__init__ method.
+        :param channel_secrets: dict or function mapping channel id to
+            channel secret. KeyError of unknown channels is propagated
+        :param int max_clients: Maximum number of cached clients
+        :param bool is_sandbox: Sandbox or not
+        :param str api_endpoint: API endpoint overriding the default
+        :param float rate: API calls per second allowed per channel.
+            Unlimited when omitted
+        :param float burst: Burst size of the rate limit
+        :param int pool_maxsize: Connections kept alive per endpoint host
+        :param session_factory: Function creating the session of an
+            endpoint host. Pooled requests.Session when omitted
+        :param on_evict: Function called with (channel id, TenantMetrics)
+            of evicted clients, once their calls in flight have finished
+        :param api_kwargs: Other LinePayApi arguments shared by all clients
+        """
+        if max_clients <= 0:
+            raise ValueError("max_clients must be greater than 0")
+        if isinstance(channel_secrets, dict):
+            channel_secrets = channel_secrets.__getitem__
+        self._channel_secrets = channel_secrets
+        self.max_clients = max_clients
+        self.is_sandbox = is_sandbox
+        self.api_endpoint = api_endpoint
+        self.rate = rate
+        self.burst = burst
+        self.pool_maxsize = pool_maxsize
+        self.session_factory = session_factory or self._create_session
+        self.on_evict = on_evict
+        self._api_kwargs = api_kwargs
+        self._tenants = OrderedDict()
+        # (channel id, tenant) evicted with calls in flight
+        self._retired = []
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._tenants
+
+    def get(self, channel_id):
+        """Get client of the channel, creating it on first use
+        :param str channel_id: Channel id
+        :rtype LinePayApi: client of the channel
+        """
+        with self._lock:
+            tenant = self._tenants.get(channel_id)
+            if tenant is not None:
+                self._tenants.move_to_end(channel_id)
+                return tenant.api
+        # secrets may be loaded from a database, so outside the lock
+        tenant = self._create(channel_id, self._channel_secrets(channel_id))
+        evicted = []
+        with self._lock:
+            existing = self._tenants.get(channel_id)
+            if existing is not None:
+                self._tenants.move_to_end(channel_id)
+                return existing.api
+            self._tenants[channel_id] = tenant
+            while len(self._tenants) > self.max_clients:
+                evicted.append(self._tenants.popitem(last=False))
+        if evicted:
+            self._retire(evicted)
+        return tenant.api
+
+    def metrics(self, channel_id):
+        """Metrics of the channel
+        :param str channel_id: Channel id
+        :rtype TenantMetrics: metrics, or None when the client is not cached
+        """
+        tenant = self._tenants.get(channel_id)
+        return None if tenant is None else tenant.metrics
+
+    def evict(self, channel_id):
+        """Remove client of the channel, e.g. after its secret is rotated
+        :param str channel_id: Channel id
+        """
+        with self._lock:
+            tenant = self._tenants.pop(channel_id, None)
+        if tenant is not None:
+            self._retire([(channel_id, tenant)])
+
+    def session_for(self, endpoint):
+        """Pooled session shared by clients calling the endpoint host
+        :param str endpoint: API endpoint URL
+        :rtype requests.Session: shared session
+        """
+        host = urlsplit(endpoint).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._sessions[host] = self.session_factory()
+            return session
+
+    def close(self, timeout=None):
+        """Drain all clients, evicted ones included, then close shared
+        sessions and drop clients
+        :param float timeout: Seconds to wait for in-flight calls of all
+            clients. Wait until all calls finish when omitted
+        :rtype bool: True when no call was in flight anymore
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            tenants = list(self._tenants.values())
+            retired, self._retired = self._retired, []
+            self._sessions.clear()
+            self._tenants.clear()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            if deadline is None:
+                return None
+            return max(0.0, deadline - time.monotonic())
+
+        drained = True
+        for channel_id, tenant in retired:
+            drained = self._close_evicted(
+                channel_id, tenant, remaining()) and drained
+        for tenant in tenants:
+            drained = tenant.api.close(remaining()) and drained
+        for session in sessions:
+            session.close()
+        return drained
+
+    def _retire(self, evicted):
+        """Close evicted clients without calls in flight, and keep the
+        others until a later eviction or close()
+        :param list evicted: (channel id, tenant) of evicted clients
+        """
+        with self._lock:
+            retired = self._retired + evicted
+            self._retired = []
+        busy = []
+        for channel_id, tenant in retired:
+            if tenant.api.in_flight():
+                busy.append((channel_id, tenant))
+            else:
+                self._close_evicted(channel_id, tenant, 0)
+        if busy:
+            with self._lock:
+                self._retired.extend(busy)
+
+    def _close_evicted(self, channel_id, tenant, timeout):
+        drained = tenant.api.close(timeout)
+        if self.on_evict is not None:
+            self.on_evict(channel_id, tenant.metrics)
+        return drained
+
+    def _create_session(self):
+        return create_pooled_session(self.pool_maxsize)
+
+    def _create(self, channel_id, channel_secret):
+        metrics = TenantMetrics(channel_id)
+        interceptors = [metrics]
+        if self.rate is not None:
+            interceptors.insert(0, TenantRateLimit(
+                channel_id, TokenBucket(self.rate, self.burst), metrics))
+        api = LinePayApi(
+            channel_id, channel_secret, is_sandbox=self.is_sandbox,
+            interceptors=interceptors, **self._api_kwargs)
+        if self.api_endpoint is not None:
+            api.api_endpoint = self.api_endpoint
+        api.session = self.session_for(api.api_endpoint)
+        return _Tenant(api, metrics)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+"""Sweeper checking or expiring large numbers of preapproved regKeys.
+
+RegKeys are streamed from an iterator or a file with one regKey per line,
+called with bounded concurrency, and written to a tab separated output
+file as ``regKey<TAB>returnCode`` lines in input order::
+
+    sweeper = RegKeySweeper(api, concurrency=16)
+    summary = sweeper.sweep(
+        read_reg_keys("reg_keys.txt"), "check_results.tsv",
+        checkpoint_path="check_results.checkpoint")
+
+With checkpoint_path, an interrupted sweep resumes after the last
+checkpointed regKey. The checkpoint keeps the size of the output file,
+and lines written after the last checkpoint are truncated on resume, so
+every regKey is written once.
+"""
+
+from collections import Counter, namedtuple
+from functools import partial
+import itertools
+import json
+import os
+
+from .exceptions import LinePayApiError
+from .util import ordered_map, LOGGER
+
+ACTION_CHECK = "check"
+ACTION_EXPIRE = "expire"
+# returnCode written when the API could not be called
+ERROR_RETURN_CODE = "ERROR"
+
+
+def read_reg_keys(path):
+    """Read regKeys from a file with one regKey per line
+    :param str path: File path
+    :rtype generator: regKeys, without blank lines
+    """
+    with open(path) as f:
+        for line in f:
+            reg_key = line.strip()
+            if reg_key:
+                yield reg_key
+
+
+def _load_checkpoint(path):
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_checkpoint(path):
+    """Read number of regKeys already swept
+    :param str path: Checkpoint file path
+    :rtype int: position to resume from. 0 when no checkpoint exists
+    """
+    return int(_load_checkpoint(path).get("position", 0))
+
+
+def read_checkpoint_offset(path):
+    """Read size of the output file at the checkpoint
+    :param str path: Checkpoint file path
+    :rtype int: size in bytes, or None when not checkpointed
+    """
+    offset = _load_checkpoint(path).get("offset", None)
+    return None if offset is None else int(offset)
+
+
+def write_checkpoint(path, position, offset=None):
+    """Write number of regKeys already swept, atomically
+    :param str path: Checkpoint file path
+    :param int position: Number of regKeys written to the output
+    :param int offset: Size in bytes of the output file holding those
+        regKeys
+    """
+    checkpoint = {"position": position}
+    if offset is not None:
+        checkpoint["offset"] = offset
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+class SweepSummary(namedtuple(
+        "SweepSummary", ("processed", "skipped", "return_codes"))):
+    """Result of a sweep.
+    :param int processed: Number of regKeys called in this sweep
+    :param int skipped: Number of regKeys skipped by the checkpoint
+    :param dict return_codes: Number of regKeys per returnCode
+    """
+
+    __slots__ = ()
+
+
+class RegKeySweeper(object):
+    """Calls Check RegKey or Expire RegKey API for a stream of regKeys."""
+
+    DEFAULT_CONCURRENCY = 8
+    DEFAULT_CHECKPOINT_INTERVAL = 1000
+
+    def __init__(
+            self,
+            api,
+            concurrency=DEFAULT_CONCURRENCY,
+            credit_card_auth=False,
+            rate_limiter=None,
+            checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """__init__ method.
+        :param LinePayApi api: Client to call the APIs with
+        :param int concurrency: Maximum number of API calls in progress
+        :param bool credit_card_auth: Check with creditCardAuth=true
+        :param TokenBucket rate_limiter: Rate limiter of the API calls
+        :param int checkpoint_interval: Write checkpoint every N regKeys
+        """
+        if concurrency <= 0:
+            raise ValueError("concurrency must be greater than 0")
+        if checkpoint_interval <= 0:
+            raise ValueError("checkpoint_interval must be greater than 0")
+        self.api = api
+        self.concurrency = concurrency
+        self.credit_card_auth = credit_card_auth
+        self.rate_limiter = rate_limiter
+        self.checkpoint_interval = checkpoint_interval
+
+    def sweep(self, reg_keys, output_path, action=ACTION_CHECK,
+              checkpoint_path=None):
+        """Call the API for every regKey and write the returnCodes
+        :param reg_keys: Iterable of regKeys
+        :param str output_path: Output file path. Truncated to the
+            checkpointed size and appended to on resume
+        :param str action: ACTION_CHECK or ACTION_EXPIRE
+        :param str checkpoint_path: Checkpoint file path
+        :rtype SweepSummary: numbers of regKeys per returnCode
+        """
+        if action not in (ACTION_CHECK, ACTION_EXPIRE):
+            raise ValueError("action[{}] is not supported".format(action))
+        skipped = read_checkpoint(checkpoint_path)
+        reg_keys = iter(reg_keys)
+        if skipped:
+            LOGGER.info("Resuming regKey sweep from %d", skipped)
+            reg_keys = itertools.islice(reg_keys, skipped, None)
+        position = skipped
+        counts = Counter()
+        results = ordered_map(
+            partial(self._call, action), reg_keys, self.concurrency)
+        # binary, so tell() is the byte offset kept by checkpoints
+        with open(output_path, "ab" if skipped else "wb") as output:
+            offset = read_checkpoint_offset(checkpoint_path) \
+                if skipped else None
+            if offset is not None and output.tell() > offset:
+                # drop lines written after the checkpoint
+                output.truncate(offset)
+            for reg_key, return_code in results:
+                counts[return_code] += 1
+                output.write(
+                    (reg_key + "\t" + return_code + "\n").encode("utf-8"))
+                position += 1
+                if checkpoint_path is not None and \
+                        position % self.checkpoint_interval == 0:
+                    output.flush()
+                    write_checkpoint(checkpoint_path, position, output.tell())
+            output.flush()
+            if checkpoint_path is not None:
+                write_checkpoint(checkpoint_path, position, output.tell())
+        return SweepSummary(position - skipped, skipped, dict(counts))
+
+    def _call(self, action, reg_key):
+        """Call the API for a regKey
+        :rtype str: returnCode, or ERROR_RETURN_CODE
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            if action == ACTION_CHECK:
+                result = self.api.check_regkey(
+                    reg_key, credit_card_auth=self.credit_card_auth)
+            else:
+                result = self.api.expire_regkey(reg_key)
+        except LinePayApiError as e:
+            return e.return_code or ERROR_RETURN_CODE
+        except Exception as e:
+            LOGGER.warning("%s regKey failed: %s", action, e)
+            return ERROR_RETURN_CODE
+        return result.get("returnCode", None) or ERROR_RETURN_CODE
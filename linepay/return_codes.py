@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+"""Registry of LINE Pay API return codes.
+
+see https://pay.line.me/jp/developers/apis/onlineApis?locale=en_US
+"""
+
+from collections import namedtuple
+from enum import Enum
+
+
+class ReturnCodeCategory(Enum):
+    SUCCESS = "success"
+    INVALID_REQUEST = "invalid_request"
+    MERCHANT = "merchant"
+    PAYMENT_DECLINED = "payment_declined"
+    TRANSACTION_STATE = "transaction_state"
+    EXPIRED = "expired"
+    REGKEY = "regkey"
+    TRANSIENT = "transient"
+    UNKNOWN = "unknown"
+
+
+class RecommendedAction(Enum):
+    NONE = "none"
+    FIX_REQUEST = "fix_request"
+    CHECK_MERCHANT_SETTINGS = "check_merchant_settings"
+    ASK_CUSTOMER = "ask_customer"
+    CHECK_TRANSACTION = "check_transaction"
+    RETRY = "retry"
+    RETRY_LATER = "retry_later"
+    STOP = "stop"
+
+
+ReturnCodeInfo = namedtuple(
+    "ReturnCodeInfo",
+    ("return_code", "category", "retryable", "action", "description"))
+
+
+def _info(return_code, category, action, description, retryable=False):
+    return ReturnCodeInfo(
+        return_code, category, retryable, action, description)
+
+
+_C = ReturnCodeCategory
+_A = RecommendedAction
+
+RETURN_CODES = {info.return_code: info for info in (
+    # Success and payment statuses of Check Payment Status API
+    _info("0000", _C.SUCCESS, _A.NONE, "Success"),
+    _info("0110", _C.SUCCESS, _A.NONE, "Authorization completed"),
+    _info("0121", _C.SUCCESS, _A.NONE, "Payment cancelled by customer"),
+    _info("0122", _C.SUCCESS, _A.NONE, "Payment failed"),
+    _info("0123", _C.SUCCESS, _A.NONE, "Payment completed"),
+    # Customer side
+    _info("1101", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Purchaser status error"),
+    _info("1102", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Purchaser is restricted from transactions"),
+    _info("1110", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Unavailable credit card"),
+    _info("1141", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Payment account status error"),
+    _info("1142", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Insufficient balance"),
+    _info("1154", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Preapproved payment method is unavailable"),
+    _info("1169", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Payment method and password must be authenticated in LINE Pay"),
+    _info("1170", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Balance of purchaser's account has changed"),
+    _info("1280", _C.TRANSIENT, _A.RETRY_LATER,
+          "Temporary error during credit card payment", retryable=True),
+    _info("1281", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Credit card payment error"),
+    _info("1282", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Credit card authorization error"),
+    _info("1283", _C.PAYMENT_DECLINED, _A.STOP,
+          "Payment refused due to suspected fraud"),
+    _info("1284", _C.TRANSIENT, _A.RETRY_LATER,
+          "Credit card payment is temporarily suspended", retryable=True),
+    _info("1285", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Missing credit card billing information"),
+    _info("1286", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Wrong credit card billing information"),
+    _info("1287", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Credit card expiration date is wrong"),
+    _info("1288", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Credit card number is wrong"),
+    _info("1289", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Exceeds credit card limit"),
+    _info("1290", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Exceeds limit per payment"),
+    _info("1291", _C.PAYMENT_DECLINED, _A.STOP,
+          "Credit card reported stolen"),
+    _info("1292", _C.PAYMENT_DECLINED, _A.STOP,
+          "Credit card is suspended"),
+    _info("1293", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Invalid CVN"),
+    _info("1294", _C.PAYMENT_DECLINED, _A.STOP,
+          "Credit card is blacklisted"),
+    _info("1295", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Wrong credit card number"),
+    _info("1296", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Unavailable amount"),
+    _info("1298", _C.PAYMENT_DECLINED, _A.ASK_CUSTOMER,
+          "Credit card declined"),
+    # Merchant side
+    _info("1104", _C.MERCHANT, _A.CHECK_MERCHANT_SETTINGS,
+          "Merchant not found"),
+    _info("1105", _C.MERCHANT, _A.CHECK_MERCHANT_SETTINGS,
+          "Merchant cannot use LINE Pay"),
+    _info("1106", _C.MERCHANT, _A.CHECK_MERCHANT_SETTINGS,
+          "Request header information error"),
+    _info("1178", _C.MERCHANT, _A.CHECK_MERCHANT_SETTINGS,
+          "Currency is not supported by merchant"),
+    _info("1194", _C.MERCHANT, _A.CHECK_MERCHANT_SETTINGS,
+          "Merchant cannot use preapproved payment"),
+    # Request
+    _info("1124", _C.INVALID_REQUEST, _A.FIX_REQUEST,
+          "Amount information error"),
+    _info("1153", _C.INVALID_REQUEST, _A.FIX_REQUEST,
+          "Amount differs from the requested amount"),
+    _info("1177", _C.INVALID_REQUEST, _A.FIX_REQUEST,
+          "Exceeds maximum number of transactions retrievable"),
+    _info("1183", _C.INVALID_REQUEST, _A.FIX_REQUEST,
+          "Payment amount must be greater than 0"),
+    _info("1184", _C.INVALID_REQUEST, _A.FIX_REQUEST,
+          "Payment amount exceeds the requested amount"),
+    _info("2101", _C.INVALID_REQUEST, _A.FIX_REQUEST,
+          "Parameter error"),
+    _info("2102", _C.INVALID_REQUEST, _A.FIX_REQUEST,
+          "JSON data format error"),
+    # Transaction state
+    _info("1145", _C.TRANSACTION_STATE, _A.CHECK_TRANSACTION,
+          "Payment is in progress", retryable=True),
+    _info("1150", _C.TRANSACTION_STATE, _A.CHECK_TRANSACTION,
+          "Transaction record not found"),
+    _info("1152", _C.TRANSACTION_STATE, _A.CHECK_TRANSACTION,
+          "Transaction already exists"),
+    _info("1155", _C.TRANSACTION_STATE, _A.STOP,
+          "Transaction is not eligible for refund"),
+    _info("1159", _C.TRANSACTION_STATE, _A.CHECK_TRANSACTION,
+          "Payment request information not found"),
+    _info("1164", _C.TRANSACTION_STATE, _A.FIX_REQUEST,
+          "Exceeds refundable amount"),
+    _info("1165", _C.TRANSACTION_STATE, _A.STOP,
+          "Transaction already refunded"),
+    _info("1172", _C.TRANSACTION_STATE, _A.CHECK_TRANSACTION,
+          "Transaction with the same order id already exists"),
+    _info("1179", _C.TRANSACTION_STATE, _A.CHECK_TRANSACTION,
+          "Transaction status cannot be processed"),
+    _info("1197", _C.TRANSACTION_STATE, _A.RETRY_LATER,
+          "Payment by regKey is being processed", retryable=True),
+    _info("1198", _C.TRANSACTION_STATE, _A.CHECK_TRANSACTION,
+          "Request is duplicated"),
+    # Expired
+    _info("1163", _C.EXPIRED, _A.STOP,
+          "Refund period has expired"),
+    _info("1180", _C.EXPIRED, _A.STOP,
+          "Payment deadline has expired"),
+    # RegKey
+    _info("1190", _C.REGKEY, _A.STOP,
+          "RegKey does not exist"),
+    _info("1193", _C.REGKEY, _A.STOP,
+          "RegKey has expired"),
+    # Temporary errors
+    _info("1199", _C.TRANSIENT, _A.RETRY,
+          "Internal request error", retryable=True),
+    _info("1900", _C.TRANSIENT, _A.RETRY_LATER,
+          "Temporary error", retryable=True),
+    _info("1902", _C.TRANSIENT, _A.RETRY_LATER,
+          "Temporary error", retryable=True),
+    _info("1999", _C.TRANSIENT, _A.RETRY_LATER,
+          "Temporary error", retryable=True),
+    _info("9000", _C.TRANSIENT, _A.RETRY,
+          "Internal error", retryable=True),
+)}
+
+del _C, _A
+
+
+def lookup(return_code):
+    """Look up return code information
+    :param str return_code: LINE Pay API return code
+    :rtype ReturnCodeInfo: registered information, or UNKNOWN category
+        information for unregistered return code
+    """
+    info = RETURN_CODES.get(return_code)
+    if info is None:
+        info = ReturnCodeInfo(
+            return_code, ReturnCodeCategory.UNKNOWN, False,
+            RecommendedAction.CHECK_TRANSACTION, "Unknown return code")
+    return info
+
+
+def is_retryable(return_code):
+    """Check return code is retryable or not
+    :param str return_code: LINE Pay API return code
+    :rtype bool: retryable or not
+    """
+    info = RETURN_CODES.get(return_code)
+    return info is not None and info.retryable
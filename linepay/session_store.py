@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+"""Order session stores keeping order data between Request and Confirm API.
+
+Handlers save the order at Request API and resolve amount and currency by
+transactionId at the confirmUrl::
+
+    store.save(order_id, amount, currency)
+    response = api.request(options)
+    store.attach_transaction(order_id, response["info"]["transactionId"])
+    ...
+    session = store.get_by_transaction(transaction_id)
+    api.confirm(transaction_id, float(session.amount), session.currency)
+
+MemoryOrderSessionStore is per process. SQLiteOrderSessionStore is shared
+by every worker process on the same host.
+"""
+
+from collections import namedtuple, OrderedDict
+import json
+import sqlite3
+import threading
+import time
+
+
+class OrderSession(namedtuple(
+        "OrderSession",
+        ("order_id", "amount", "currency", "transaction_id", "data",
+         "expires_at"))):
+    """Order data saved between Request and Confirm API."""
+
+    __slots__ = ()
+
+
+class OrderSessionStore(object):
+    """Base class of order session stores."""
+
+    DEFAULT_TTL = 3600
+    DEFAULT_MAX_ENTRIES = 100000
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 clock=time.time):
+        """__init__ method.
+        :param float ttl: Seconds to keep a session
+        :param int max_entries: Maximum number of sessions. Sessions closest
+            to expiry are evicted first
+        :param clock: Function returning current time in seconds
+        """
+        if ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if max_entries <= 0:
+            raise ValueError("max_entries must be greater than 0")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+
+    def save(self, order_id, amount, currency, transaction_id=None,
+             data=None):
+        """Save order session. Existing session of the order is replaced
+        :param str order_id: Order id
+        :param amount: Payment amount
+        :param str currency: Payment currency
+        :param int transaction_id: Transaction id, if already known
+        :param dict data: Additional JSON serializable data
+        :rtype OrderSession: saved session
+        """
+        session = OrderSession(
+            order_id, amount, currency, transaction_id, data or {},
+            self._clock() + self.ttl)
+        self._put(session)
+        return session
+
+    def attach_transaction(self, order_id, transaction_id):
+        """Attach transaction id returned from Request API to the order
+        :param str order_id: Order id
+        :param int transaction_id: Transaction id
+        :rtype bool: False when session of the order is not found
+        """
+        session = self.get(order_id)
+        if session is None:
+            return False
+        self._put(session._replace(transaction_id=transaction_id))
+        return True
+
+    def update_data(self, order_id, **data):
+        """Merge additional data into the session of the order
+        :param str order_id: Order id
+        :rtype bool: False when session of the order is not found
+        """
+        session = self.get(order_id)
+        if session is None:
+            return False
+        merged = dict(session.data)
+        merged.update(data)
+        self._put(session._replace(data=merged))
+        return True
+
+    def get(self, order_id):
+        """Get session by order id
+        :param str order_id: Order id
+        :rtype OrderSession: session, or None when not found or expired
+        """
+        raise NotImplementedError
+
+    def get_by_transaction(self, transaction_id):
+        """Get session by transaction id
+        :param int transaction_id: Transaction id
+        :rtype OrderSession: session, or None when not found or expired
+        """
+        raise NotImplementedError
+
+    def delete(self, order_id):
+        """Delete session of the order
+        :param str order_id: Order id
+        """
+        raise NotImplementedError
+
+    def _put(self, session):
+        raise NotImplementedError
+
+
+class MemoryOrderSessionStore(OrderSessionStore):
+    """In-process order session store."""
+
+    def __init__(self, ttl=OrderSessionStore.DEFAULT_TTL,
+                 max_entries=OrderSessionStore.DEFAULT_MAX_ENTRIES,
+                 clock=time.time):
+        super(MemoryOrderSessionStore, self).__init__(ttl, max_entries, clock)
+        # ordered by expiry, as every session has the same ttl
+        self._sessions = OrderedDict()
+        self._order_ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, order_id):
+        with self._lock:
+            return self._get(order_id)
+
+    def get_by_transaction(self, transaction_id):
+        with self._lock:
+            order_id = self._order_ids.get(transaction_id)
+            if order_id is None:
+                return None
+            return self._get(order_id)
+
+    def delete(self, order_id):
+        with self._lock:
+            self._delete(order_id)
+
+    def _get(self, order_id):
+        session = self._sessions.get(order_id)
+        if session is not None and session.expires_at <= self._clock():
+            self._delete(order_id)
+            return None
+        return session
+
+    def _delete(self, order_id):
+        session = self._sessions.pop(order_id, None)
+        if session is not None and session.transaction_id is not None:
+            self._order_ids.pop(session.transaction_id, None)
+
+    def _put(self, session):
+        with self._lock:
+            old = self._sessions.get(session.order_id)
+            if old is not None and old.transaction_id is not None and \
+                    old.transaction_id != session.transaction_id:
+                self._order_ids.pop(old.transaction_id, None)
+            self._sessions[session.order_id] = session
+            if old is None or old.expires_at != session.expires_at:
+                self._sessions.move_to_end(session.order_id)
+            if session.transaction_id is not None:
+                self._order_ids[session.transaction_id] = session.order_id
+            self._evict()
+
+    def _evict(self):
+        now = self._clock()
+        sessions = self._sessions
+        while sessions:
+            order_id, session = next(iter(sessions.items()))
+            if len(sessions) <= self.max_entries and \
+                    session.expires_at > now:
+                break
+            self._delete(order_id)
+
+
+class SQLiteOrderSessionStore(OrderSessionStore):
+    """Order session store on a SQLite database file.
+
+    Every process opening the same file shares the sessions, so the
+    confirmUrl may be handled by any worker on the host.
+    """
+
+    # Prune expired and excess sessions every N saves
+    PRUNE_INTERVAL = 256
+
+    def __init__(self, path, ttl=OrderSessionStore.DEFAULT_TTL,
+                 max_entries=OrderSessionStore.DEFAULT_MAX_ENTRIES,
+                 clock=time.time, timeout=5.0):
+        """__init__ method.
+        :param str path: SQLite database file path
+        :param float ttl: Seconds to keep a session
+        :param int max_entries: Maximum number of sessions
+        :param clock: Function returning current time in seconds
+        :param float timeout: Seconds to wait for the database lock
+        """
+        super(SQLiteOrderSessionStore, self).__init__(ttl, max_entries, clock)
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._saves = 0
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS order_sessions ("
+                "order_id TEXT PRIMARY KEY, transaction_id INTEGER, "
+                "amount TEXT, currency TEXT, data TEXT, expires_at REAL)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS order_sessions_transaction_id "
+                "ON order_sessions (transaction_id)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS order_sessions_expires_at "
+                "ON order_sessions (expires_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close database connection of the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def __len__(self):
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM order_sessions WHERE expires_at > ?",
+            (self._clock(),)).fetchone()
+        return row[0]
+
+    def get(self, order_id):
+        return self._select("order_id", order_id)
+
+    def get_by_transaction(self, transaction_id):
+        return self._select("transaction_id", transaction_id)
+
+    def delete(self, order_id):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM order_sessions WHERE order_id = ?", (order_id,))
+
+    def _select(self, column, value):
+        row = self._connection().execute(
+            "SELECT order_id, amount, currency, transaction_id, data, "
+            "expires_at FROM order_sessions "
+            "WHERE {} = ? AND expires_at > ?".format(column),
+            (value, self._clock())).fetchone()
+        if row is None:
+            return None
+        return OrderSession(
+            row[0], json.loads(row[1]), row[2], row[3], json.loads(row[4]),
+            row[5])
+
+    def _put(self, session):
+        conn = self._connection()
+        with conn:
+            if session.transaction_id is not None:
+                # transactionId belongs to one order only
+                conn.execute(
+                    "DELETE FROM order_sessions "
+                    "WHERE transaction_id = ? AND order_id != ?",
+                    (session.transaction_id, session.order_id))
+            conn.execute(
+                "INSERT OR REPLACE INTO order_sessions "
+                "(order_id, transaction_id, amount, currency, data, "
+                "expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (session.order_id, session.transaction_id,
+                 json.dumps(session.amount), session.currency,
+                 json.dumps(session.data), session.expires_at))
+        self._saves += 1
+        if self._saves % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        """Delete expired sessions and sessions over max_entries"""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM order_sessions WHERE expires_at <= ?",
+                (self._clock(),))
+            excess = conn.execute(
+                "SELECT COUNT(*) FROM order_sessions").fetchone()[0] - \
+                self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM order_sessions WHERE order_id IN ("
+                    "SELECT order_id FROM order_sessions "
+                    "ORDER BY expires_at LIMIT ?)", (excess,))
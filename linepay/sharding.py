@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""Multi-process runner for very large batches of LINE Pay API calls.
+
+Signing, JSON encoding and response parsing are CPU bound, so a single
+process saturates one core. ShardedRunner spreads calls over worker
+processes by a stable hash of the transaction id (or regKey, or order
+id), so every call of a transaction goes to the same worker. Each worker
+holds one LinePayApi with a pooled requests.Session and calls it from a
+few threads::
+
+    with ShardedRunner(channel_id, channel_secret, processes=4) as runner:
+        for job in runner.map("refund", ({"transaction_id": t}
+                                         for t in transaction_ids)):
+            if not job.succeeded:
+                print(job.error)
+
+Results are yielded in submission order, or as they complete with
+ordered=False. Only one map may run at a time.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import os
+import queue
+import threading
+import zlib
+
+from .exceptions import ErrorRecord, LinePayApiError
+from .util import LOGGER
+
+# kwargs used as shard key, in order of preference
+SHARD_KEYS = ("transaction_id", "reg_key", "order_id")
+
+SUPPORTED_METHODS = frozenset((
+    "request", "confirm", "capture", "void", "refund", "pay_preapproved",
+    "check_regkey", "expire_regkey", "check_payment_status",
+    "payment_details"))
+
+
+def shard_of(key, shards):
+    """Stable shard of a key, the same in every process and run
+    :param key: Transaction id, regKey or order id
+    :param int shards: Number of shards
+    :rtype int: shard index
+    """
+    return zlib.crc32(str(key).encode()) % shards
+
+
+class JobResult(namedtuple(
+        "JobResult", ("index", "method", "kwargs", "result", "error"))):
+    """Result of one API call.
+    :param int index: Position of the job in the job stream
+    :param str method: LinePayApi method name
+    :param dict kwargs: Arguments of the call
+    :param dict result: API response, or None when failed
+    :param ErrorRecord error: Error of the call, or None when succeeded.
+        return_code is None when LINE Pay could not be reached
+    """
+
+    __slots__ = ()
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+
+def _create_api(config, threads):
+    from .api import LinePayApi
+    from .pool import create_pooled_session
+    api = LinePayApi(
+        session=create_pooled_session(threads), **config["api_kwargs"])
+    if config["api_endpoint"] is not None:
+        api.api_endpoint = config["api_endpoint"]
+    return api
+
+
+def _worker_main(config, threads, jobs, results):
+    """Entry point of worker processes"""
+    api = _create_api(config, threads)
+    slots = threading.BoundedSemaphore(threads * 2)
+
+    def run(index, method, kwargs):
+        try:
+            result = getattr(api, method)(**kwargs)
+            error = None
+        except LinePayApiError as e:
+            result = None
+            error = e.to_record(index)
+        except Exception as e:
+            result = None
+            error = ErrorRecord(None, None, repr(e), index)
+        finally:
+            slots.release()
+        results.put((index, result, error))
+
+    with ThreadPoolExecutor(threads) as executor:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            slots.acquire()
+            executor.submit(run, *job)
+    api.session.close()
+
+
+class ShardedRunner(object):
+    """Runs LinePayApi calls on a pool of worker processes."""
+
+    DEFAULT_THREADS = 8
+
+    def __init__(
+            self,
+            channel_id,
+            channel_secret,
+            is_sandbox=False,
+            processes=None,
+            threads=DEFAULT_THREADS,
+            api_endpoint=None,
+            max_in_flight=None,
+            mp_context=None,
+            **api_kwargs):
+        """__init__ method.
+        :param str channel_id: Your channel id
+        :param str channel_secret: Your channel secret
+        :param bool is_sandbox: Sandbox or not
+        :param int processes: Number of worker processes. Number of CPUs
+            when omitted
+        :param int threads: Threads and pooled connections per worker
+        :param str api_endpoint: API endpoint overriding the default
+        :param int max_in_flight: Maximum number of jobs submitted but not
+            yielded, including results of ordered map waiting for an
+            earlier job. 4 x processes x threads when omitted
+        :param mp_context: multiprocessing context, e.g.
+            multiprocessing.get_context("spawn")
+        :param api_kwargs: Other LinePayApi arguments. Must be picklable
+        """
+        processes = processes or os.cpu_count() or 1
+        if processes <= 0 or threads <= 0:
+            raise ValueError("processes and threads must be greater than 0")
+        self.processes = processes
+        self.threads = threads
+        self.max_in_flight = max_in_flight or processes * threads * 4
+        api_kwargs.update(
+            channel_id=channel_id, channel_secret=channel_secret,
+            is_sandbox=is_sandbox)
+        self._config = {
+            "api_kwargs": api_kwargs, "api_endpoint": api_endpoint}
+        self._context = mp_context or multiprocessing.get_context()
+        self._workers = []
+        self._job_queues = []
+        self._results = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """Start worker processes. Called by map when not started"""
+        if self._workers:
+            return self
+        self._results = self._context.Queue()
+        for _ in range(self.processes):
+            jobs = self._context.Queue()
+            worker = self._context.Process(
+                target=_worker_main,
+                args=(self._config, self.threads, jobs, self._results),
+                daemon=True)
+            worker.start()
+            self._job_queues.append(jobs)
+            self._workers.append(worker)
+        return self
+
+    def close(self):
+        """Stop worker processes after their running jobs"""
+        for jobs in self._job_queues:
+            jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self._job_queues = []
+
+    def map(self, method, jobs, ordered=True):
+        """Call a LinePayApi method for every job
+        :param str method: LinePayApi method name, e.g. "refund"
+        :param jobs: Iterable of kwargs dicts of the method
+        :param bool ordered: Yield in order of jobs. Yield as completed when
+            False
+        :rtype generator: JobResult of every job
+        """
+        if method not in SUPPORTED_METHODS:
+            raise ValueError("method[{}] is not supported".format(method))
+        self.start()
+        submitted = {}
+        completed = {}
+        next_index = 0
+
+        def ready(job_result):
+            nonlocal next_index
+            if not ordered:
+                return (job_result,)
+            completed[job_result.index] = job_result
+            results = []
+            while next_index in completed:
+                results.append(completed.pop(next_index))
+                next_index += 1
+            return results
+
+        for index, kwargs in enumerate(jobs):
+            # results buffered behind a slow job count too, so one stalled
+            # job does not let submissions grow without bound
+            while len(submitted) + len(completed) >= self.max_in_flight:
+                yield from ready(self._receive(method, submitted))
+            submitted[index] = kwargs
+            self._job_queues[self._shard(index, kwargs)].put(
+                (index, method, kwargs))
+        while submitted:
+            yield from ready(self._receive(method, submitted))
+
+    def _shard(self, index, kwargs):
+        for name in SHARD_KEYS:
+            key = kwargs.get(name, None)
+            if key is not None:
+                return shard_of(key, self.processes)
+        return index % self.processes
+
+    def _receive(self, method, submitted):
+        while True:
+            try:
+                index, result, error = self._results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [w for w in self._workers if not w.is_alive()]
+                if dead:
+                    LOGGER.error("%d sharded runner workers died", len(dead))
+                    raise RuntimeError(
+                        "worker process exited with code {}".format(
+                            dead[0].exitcode))
+                continue
+            return JobResult(
+                index, method, submitted.pop(index), result, error)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""Local stub of LINE Pay API for load tests and benchmarks.
+
+Answers every v3 endpoint used by LinePayApi with a successful response
+after an optional artificial latency. Signatures are not verified::
+
+    with StubLinePayServer(latency=0.05) as server:
+        api = LinePayApi(channel_id, channel_secret)
+        api.api_endpoint = server.url
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import itertools
+import json
+import re
+import socket
+from socketserver import ThreadingMixIn
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+_TRANSACTION_IDS = itertools.count(2019000000000000000)
+
+_ROUTES = [
+    ("POST", re.compile(r"^/v3/payments/request$"), "request"),
+    ("POST", re.compile(r"^/v3/payments/(\d+)/confirm$"), "confirm"),
+    ("POST", re.compile(r"^/v3/payments/authorizations/(\d+)/capture$"),
+     "capture"),
+    ("POST", re.compile(r"^/v3/payments/authorizations/(\d+)/void$"),
+     "void"),
+    ("POST", re.compile(r"^/v3/payments/(\d+)/refund$"), "refund"),
+    ("POST", re.compile(r"^/v3/payments/preapprovedPay/([^/]+)/payment$"),
+     "pay_preapproved"),
+    ("GET", re.compile(r"^/v3/payments/preapprovedPay/([^/]+)/check$"),
+     "check_regkey"),
+    ("POST", re.compile(r"^/v3/payments/preapprovedPay/([^/]+)/expire$"),
+     "expire_regkey"),
+    ("GET", re.compile(r"^/v3/payments/requests/(\d+)/check$"),
+     "check_payment_status"),
+    ("GET", re.compile(r"^/v3/payments$"), "payment_details"),
+]
+
+
+def _success(info=None):
+    result = {"returnCode": "0000", "returnMessage": "Success."}
+    if info is not None:
+        result["info"] = info
+    return result
+
+
+def stub_response(name, param, body, query):
+    """Build stub response of the endpoint
+    :param str name: LinePayApi method name of the endpoint
+    :param str param: transaction id or regKey in the path
+    :param dict body: request body
+    :param dict query: parsed Query String
+    :rtype dict: response body
+    """
+    if name == "request":
+        transaction_id = next(_TRANSACTION_IDS)
+        return _success({
+            "transactionId": transaction_id,
+            "paymentAccessToken": "123456789012",
+            "paymentUrl": {
+                "web": "https://sandbox-web-pay.line.me/web/payment/wait"
+                       "?transactionReserveId=stub",
+                "app": "line://pay/payment/stub"
+            }
+        })
+    if name in ("confirm", "capture"):
+        return _success({
+            "orderId": "order-{}".format(param),
+            "transactionId": int(param),
+            "payInfo": [{"method": "BALANCE", "amount": body.get("amount")}]
+        })
+    if name == "refund":
+        return _success({
+            "refundTransactionId": next(_TRANSACTION_IDS),
+            "refundTransactionDate": "2020-01-01T00:00:00Z"
+        })
+    if name == "pay_preapproved":
+        return _success({
+            "transactionId": next(_TRANSACTION_IDS),
+            "transactionDate": "2020-01-01T00:00:00Z"
+        })
+    if name == "check_payment_status":
+        return {"returnCode": "0123", "returnMessage": "Payment completed."}
+    if name == "payment_details":
+        transaction_id = int(query.get("transactionId", ["0"])[0])
+        return _success([{
+            "transactionId": transaction_id,
+            "transactionDate": "2020-01-01T00:00:00Z",
+            "transactionType": "PAYMENT",
+            "payStatus": "CAPTURE",
+            "currency": "JPY",
+            "payInfo": [{"method": "BALANCE", "amount": 100}]
+        }])
+    return _success()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, and Nagle's algorithm
+    # would hold the body until the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        for route_method, pattern, name in _ROUTES:
+            if route_method != method:
+                continue
+            match = pattern.match(url.path)
+            if match is None:
+                continue
+            body = json.loads(raw_body) if raw_body else {}
+            param = match.group(1) if pattern.groups else None
+            result = self.server.responder(
+                name, param, body, parse_qs(url.query))
+            break
+        else:
+            result = {"returnCode": "1106", "returnMessage": "Not found."}
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        payload = json.dumps(result).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_HEAD(self):
+        # connection warm up and health probe
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class _StubHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    # default backlog of 5 resets connections under concurrent load
+    request_queue_size = 1024
+
+
+class StubLinePayServer(object):
+    """Threaded HTTP server serving stub LINE Pay API on localhost."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0,
+                 responder=stub_response, reuse_port=False):
+        """__init__ method.
+        :param str host: Host to listen on
+        :param int port: Port to listen on. Random free port when 0
+        :param float latency: Seconds to wait before each response
+        :param responder: Function building response body, see
+            stub_response
+        :param bool reuse_port: Share the port with other stub processes
+            (SO_REUSEPORT), so the stub itself is not the bottleneck of
+            multi-process load tests
+        """
+        self._server = _StubHTTPServer(
+            (host, port), _StubHandler, bind_and_activate=False)
+        try:
+            if reuse_port:
+                self._server.socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self._server.server_bind()
+            self._server.server_activate()
+        except OSError:
+            self._server.server_close()
+            raise
+        self._server.latency = latency
+        self._server.responder = responder
+        self._thread = None
+
+    @property
+    def url(self):
+        """API endpoint URL to set on LinePayApi.api_endpoint"""
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        """Start serving in a background thread"""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Stub LINE Pay API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="seconds to wait before each response")
+    parser.add_argument(
+        "--reuse-port", action="store_true",
+        help="share the port with other stub processes")
+    args = parser.parse_args()
+    server = StubLinePayServer(
+        args.host, args.port, args.latency, reuse_port=args.reuse_port)
+    print("Stub LINE Pay API listening on {}".format(server.url))
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
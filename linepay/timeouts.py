@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""Read timeouts derived from observed latencies, and hedged requests.
+
+AdaptiveTimeouts keeps a rolling window of latencies per API. The read
+timeout of the next call is a percentile of the window (p99 by default)
+times factor, clamped between floor and ceiling::
+
+    timeouts = AdaptiveTimeouts(factor=3.0, floor=1.0, ceiling=30.0)
+    api = LinePayApi(channel_id, channel_secret, timeouts=timeouts)
+
+Read-only APIs (Check Payment Status and Payment Details) are hedged: a
+second attempt is sent when the first one has not answered within the
+hedge percentile (p95 by default), and the first answer wins. Hedges are
+capped to max_hedge_ratio of the calls, so a slow endpoint does not get
+twice the load.
+
+Latencies of failed and timed out attempts are recorded too, so timeouts
+grow towards the ceiling during partial outages instead of failing every
+call.
+"""
+
+import bisect
+from collections import deque, namedtuple
+import threading
+
+DEFAULT_HEDGED_APIS = frozenset(("Check Payment Status", "Payment Details"))
+
+
+class TimeoutStats(namedtuple("TimeoutStats", (
+        "api_name", "samples", "p50", "p95", "p99", "read_timeout",
+        "hedges"))):
+    """Latencies and derived timeout of an API.
+    :param str api_name: API name
+    :param int samples: Latencies in the window
+    :param float p50: Median latency in seconds
+    :param float p95: 95th percentile latency in seconds
+    :param float p99: 99th percentile latency in seconds
+    :param float read_timeout: Read timeout of the next call in seconds
+    :param int hedges: Hedged attempts sent
+    """
+
+    __slots__ = ()
+
+
+class _Window(object):
+
+    __slots__ = ("latencies", "calls", "hedges", "_sorted")
+
+    def __init__(self, size):
+        self.latencies = deque(maxlen=size)
+        self.calls = 0
+        self.hedges = 0
+        # same latencies kept sorted, so percentiles never sort the window
+        self._sorted = []
+
+    def add(self, seconds):
+        latencies = self._sorted
+        if len(self.latencies) == self.latencies.maxlen:
+            del latencies[bisect.bisect_left(latencies, self.latencies[0])]
+        self.latencies.append(seconds)
+        bisect.insort(latencies, seconds)
+
+    def percentile(self, p):
+        values = self._sorted
+        index = min(len(values) - 1, int(len(values) * p / 100.0))
+        return values[index]
+
+
+class AdaptiveTimeouts(object):
+    """Rolling latency percentiles and timeouts derived from them per API.
+
+    One object may be shared by several clients and threads.
+    """
+
+    def __init__(self, factor=3.0, floor=1.0, ceiling=30.0, percentile=99,
+                 window=1000, min_samples=20, connect_timeout=None,
+                 hedged_apis=DEFAULT_HEDGED_APIS, hedge_percentile=95,
+                 max_hedge_ratio=0.1):
+        """__init__ method.
+        :param float factor: Read timeout is the latency percentile times
+            factor
+        :param float floor: Minimum read timeout in seconds
+        :param float ceiling: Maximum read timeout in seconds, also used
+            until min_samples latencies are observed
+        :param float percentile: Latency percentile the timeout derives from
+        :param int window: Latencies kept per API
+        :param int min_samples: Latencies needed before deriving timeouts
+            or hedging
+        :param float connect_timeout: Fixed connect timeout in seconds.
+            Only the read timeout is set when omitted
+        :param hedged_apis: Names of read-only APIs to hedge. Never add
+            APIs moving money
+        :param float hedge_percentile: Latency percentile after which the
+            second attempt is sent
+        :param float max_hedge_ratio: Maximum hedged attempts per call
+        """
+        if factor <= 0:
+            raise ValueError("factor must be greater than 0")
+        if floor <= 0 or ceiling < floor:
+            raise ValueError("floor must be greater than 0 and not "
+                             "greater than ceiling")
+        if window < min_samples or min_samples <= 0:
+            raise ValueError("window must not be less than min_samples, "
+                             "which must be greater than 0")
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.connect_timeout = connect_timeout
+        self.hedged_apis = frozenset(hedged_apis)
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _window(self, api_name):
+        window = self._windows.get(api_name, None)
+        if window is None:
+            window = self._windows.setdefault(api_name, _Window(self.window))
+        return window
+
+    def record(self, api_name, seconds):
+        """Record latency of an attempt, failed or not
+        :param str api_name: API name
+        :param float seconds: Latency in seconds
+        """
+        with self._lock:
+            self._window(api_name).add(seconds)
+
+    def read_timeout(self, api_name):
+        """Read timeout of the next call
+        :param str api_name: API name
+        :rtype float: timeout in seconds
+        """
+        with self._lock:
+            window = self._window(api_name)
+            if len(window.latencies) < self.min_samples:
+                return self.ceiling
+            timeout = window.percentile(self.percentile) * self.factor
+        return min(self.ceiling, max(self.floor, timeout))
+
+    def timeout_for(self, api_name):
+        """Timeout of the next call as passed to requests
+        :param str api_name: API name
+        :rtype float: read timeout, or (connect, read) tuple when
+            connect_timeout is set
+        """
+        read = self.read_timeout(api_name)
+        if self.connect_timeout is None:
+            return read
+        return self.connect_timeout, read
+
+    def hedge_delay(self, api_name):
+        """Seconds to wait before sending a hedged attempt of the next call
+        Counts the call, so call once per API call.
+        :param str api_name: API name
+        :rtype float: delay, or None when the call is not hedged
+        """
+        if api_name not in self.hedged_apis:
+            return None
+        with self._lock:
+            window = self._window(api_name)
+            window.calls += 1
+            if len(window.latencies) < self.min_samples:
+                return None
+            return window.percentile(self.hedge_percentile)
+
+    def try_hedge(self, api_name):
+        """Take a hedge from the budget of max_hedge_ratio
+        :param str api_name: API name
+        :rtype bool: True when the hedged attempt may be sent
+        """
+        with self._lock:
+            window = self._window(api_name)
+            if window.hedges + 1 > window.calls * self.max_hedge_ratio:
+                return False
+            window.hedges += 1
+            return True
+
+    def stats(self):
+        """Latencies and timeouts per API
+        :rtype dict: API name to TimeoutStats
+        """
+        with self._lock:
+            names = [
+                name for name, window in self._windows.items()
+                if window.latencies]
+        result = {}
+        for name in names:
+            read = self.read_timeout(name)
+            with self._lock:
+                window = self._windows[name]
+                result[name] = TimeoutStats(
+                    name, len(window.latencies), window.percentile(50),
+                    window.percentile(95), window.percentile(99), read,
+                    window.hedges)
+        return result
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""Tracing of the API call pipeline.
+
+With a tracer, every API call is one span with a child span per phase:
+
+* ``linepay.validate``: options validation of request(validate=True).
+  Validation runs before the API call span starts, so this span is its
+  sibling
+* ``linepay.serialize``: JSON encoding of the body or the Query String
+* ``linepay.sign``: HMAC signature, with before/after sign interceptors
+* ``linepay.acquire``: wait for a slot of a priority lane
+* ``linepay.send``: connection checkout or setup, request and response.
+  urllib3 does not expose its connection checkout separately
+* ``linepay.parse``: JSON decoding of the response
+
+OpenTelemetry is only imported by OpenTelemetryTracer::
+
+    api = LinePayApi(channel_id, channel_secret,
+                     tracer=OpenTelemetryTracer())
+
+Any object with a ``span(name, attributes)`` method returning a context
+manager of a span with ``set_attribute(key, value)`` may be used. Its
+``flush()`` method, if any, is called by LinePayApi.drain().
+"""
+
+from collections import deque, namedtuple
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+from .call_log import redact_path
+
+_TRANSACTION_ID_PATH = re.compile(r"/payments/(?:authorizations/)?(\d+)/")
+
+
+def request_attributes(api_request, api_endpoint):
+    """Span attributes known before an API call is sent
+    :param ApiRequest api_request: API call to execute
+    :param str api_endpoint: API endpoint
+    :rtype dict: attributes
+    """
+    attributes = {
+        "linepay.api": api_request.api_name,
+        "http.method": api_request.method,
+        "http.url": api_endpoint + redact_path(api_request.path),
+    }
+    match = _TRANSACTION_ID_PATH.search(api_request.path)
+    if match is not None:
+        attributes["linepay.transaction_id"] = match.group(1)
+    options = api_request.options
+    if options is not None and "orderId" in options:
+        attributes["linepay.order_id"] = options["orderId"]
+    return attributes
+
+
+def response_attributes(response, result):
+    """Span attributes of an API response
+    OpenTelemetry rejects None values, so missing values are left out.
+    :param response: HTTP response
+    :param dict result: parsed response body
+    :rtype dict: attributes
+    """
+    attributes = {"http.status_code": response.status_code}
+    return_code = result.get("returnCode", None)
+    if return_code is not None:
+        attributes["linepay.return_code"] = return_code
+    info = result.get("info", None)
+    if isinstance(info, dict) and "transactionId" in info:
+        attributes["linepay.transaction_id"] = str(info["transactionId"])
+    return attributes
+
+
+class _NullSpan(object):
+    """Span of a phase when tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def null_span(name, attributes=None):
+    """span() of no tracer
+    :rtype: span doing nothing
+    """
+    return NULL_SPAN
+
+
+class OpenTelemetryTracer(object):
+    """Tracer creating OpenTelemetry spans."""
+
+    def __init__(self, tracer=None):
+        """__init__ method.
+        :param tracer: opentelemetry.trace.Tracer. Tracer named "linepay"
+            of the global tracer provider when omitted
+        """
+        if tracer is None:
+            from opentelemetry import trace
+            tracer = trace.get_tracer("linepay")
+        self._tracer = tracer
+
+    def span(self, name, attributes=None):
+        """Start span as a child of the current span
+        :param str name: Span name
+        :param dict attributes: Span attributes
+        :rtype: context manager of opentelemetry.trace.Span
+        """
+        return self._tracer.start_as_current_span(name, attributes=attributes)
+
+    def flush(self):
+        """Export finished spans of the global tracer provider"""
+        from opentelemetry import trace
+        force_flush = getattr(trace.get_tracer_provider(), "force_flush", None)
+        if force_flush is not None:
+            force_flush()
+
+
+class FinishedSpan(namedtuple("FinishedSpan", (
+        "name", "parent", "attributes", "start", "end", "error"))):
+    """Span recorded by RecordingTracer.
+    :param str name: Span name
+    :param str parent: Name of the parent span, or None for root spans
+    :param dict attributes: Span attributes
+    :param float start: Start time in seconds (time.perf_counter())
+    :param float end: End time in seconds (time.perf_counter())
+    :param str error: Exception raised in the span, or None
+    """
+
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class _RecordingSpan(object):
+
+    __slots__ = ("name", "parent", "attributes")
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or ())
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class RecordingTracer(object):
+    """Tracer keeping finished spans in memory, e.g. for tests or for
+    profiling without OpenTelemetry."""
+
+    def __init__(self, max_spans=10000):
+        """__init__ method.
+        :param int max_spans: Spans kept. Older spans are dropped
+        """
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, name, attributes=None):
+        """Start span as a child of the current span of the thread
+        :param str name: Span name
+        :param dict attributes: Span attributes
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = _RecordingSpan(name, stack[-1].name if stack else None,
+                              attributes)
+        stack.append(span)
+        error = None
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                self.spans.append(FinishedSpan(
+                    span.name, span.parent, span.attributes, start, end,
+                    error))
+
+    def clear(self):
+        """Drop recorded spans"""
+        with self._lock:
+            self.spans.clear()
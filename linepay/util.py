@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import inspect
 import logging
 
@@ -11,8 +13,10 @@ def validate_function_args_return_value(func):
     :param func:
     :return:
     """
+    # signature is inspected once, not per call
+    sig = inspect.signature(func)
+
     def validate_function_args_return_value_wrapper(*args, **kwargs):
-        sig = inspect.signature(func)
         bound_args = sig.bind(*args, **kwargs)
         # 引数の検証
         for args_name, bound_args in bound_args.arguments.items():
@@ -41,3 +45,25 @@ def validate_function_args_return_value(func):
             )
         return results
     return validate_function_args_return_value_wrapper
+
+
+def ordered_map(func, items, concurrency):
+    """Call func for every item on a thread pool
+    Only 4 x concurrency calls are kept in memory, so items may be an
+    unbounded stream.
+    :param func: Function taking an item
+    :param items: Iterable of items
+    :param int concurrency: Maximum number of calls in progress
+    :rtype generator: (item, result) tuples in order of items
+    """
+    window = deque()
+    window_size = concurrency * 4
+    with ThreadPoolExecutor(concurrency) as executor:
+        for item in items:
+            if len(window) >= window_size:
+                done_item, future = window.popleft()
+                yield done_item, future.result()
+            window.append((item, executor.submit(func, item)))
+        while window:
+            done_item, future = window.popleft()
+            yield done_item, future.result()
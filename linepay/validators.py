@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""Client side validation of LINE Pay API request bodies."""
+
+from .api import CurrencyType
+
+SUPPORTED_CURRENCIES = frozenset(CurrencyType.__members__)
+# Currencies without decimal amounts
+INTEGER_AMOUNT_CURRENCIES = frozenset([CurrencyType.JPY.value])
+MAX_ORDER_ID_LENGTH = 100
+# Allowed difference between amount and sum of its items
+AMOUNT_TOLERANCE = 1e-6
+
+_NUMBER_TYPES = (int, float)
+
+
+def _is_number(value):
+    return isinstance(value, _NUMBER_TYPES) and type(value) is not bool
+
+
+def _is_text(value):
+    return type(value) is str and value != ""
+
+
+def _check_amount(errors, name, value, integer_only):
+    if not _is_number(value):
+        errors.append("{} must be a number".format(name))
+        return False
+    if integer_only and value != int(value):
+        errors.append("{} must be an integer for the currency".format(name))
+    return True
+
+
+def request_options_errors(options):
+    """Collect validation errors of Request API body
+    :param dict options: LINE Pay Request API Options
+    :rtype list: error messages. Empty when options are valid
+    """
+    errors = []
+    if type(options) is not dict:
+        return ["options must be a dict"]
+
+    currency = options.get("currency")
+    if currency not in SUPPORTED_CURRENCIES:
+        errors.append(
+            "currency[{}] is not supported by LINE Pay".format(currency))
+    integer_only = currency in INTEGER_AMOUNT_CURRENCIES
+
+    amount = options.get("amount")
+    amount_ok = _check_amount(errors, "amount", amount, integer_only)
+    if amount_ok and amount <= 0:
+        errors.append("amount must be greater than 0")
+
+    order_id = options.get("orderId")
+    if not _is_text(order_id):
+        errors.append("orderId is required")
+    elif len(order_id) > MAX_ORDER_ID_LENGTH:
+        errors.append("orderId must be at most {} characters".format(
+            MAX_ORDER_ID_LENGTH))
+
+    redirect_urls = options.get("redirectUrls")
+    if type(redirect_urls) is not dict:
+        errors.append("redirectUrls is required")
+    else:
+        if not _is_text(redirect_urls.get("confirmUrl")):
+            errors.append("redirectUrls.confirmUrl is required")
+        if not _is_text(redirect_urls.get("cancelUrl")):
+            errors.append("redirectUrls.cancelUrl is required")
+
+    packages = options.get("packages")
+    if type(packages) is not list or len(packages) == 0:
+        errors.append("packages is required")
+        return errors
+
+    packages_total = 0
+    # amount includes user fees of packages and the shipping fee
+    fees_total = 0
+    totals_ok = amount_ok
+    for i, package in enumerate(packages):
+        name = "packages[{}]".format(i)
+        if type(package) is not dict:
+            errors.append("{} must be a dict".format(name))
+            totals_ok = False
+            continue
+        if not _is_text(package.get("id")):
+            errors.append("{}.id is required".format(name))
+        package_amount = package.get("amount")
+        if _check_amount(
+                errors, name + ".amount", package_amount, integer_only):
+            packages_total += package_amount
+        else:
+            totals_ok = False
+            package_amount = None
+        user_fee = package.get("userFee")
+        if user_fee is not None:
+            if _check_amount(
+                    errors, name + ".userFee", user_fee, integer_only):
+                fees_total += user_fee
+            else:
+                totals_ok = False
+
+        products = package.get("products")
+        if type(products) is not list or len(products) == 0:
+            errors.append("{}.products is required".format(name))
+            totals_ok = False
+            continue
+        products_total = 0
+        products_ok = package_amount is not None
+        for j, product in enumerate(products):
+            product_name = "{}.products[{}]".format(name, j)
+            if type(product) is not dict:
+                errors.append("{} must be a dict".format(product_name))
+                products_ok = False
+                continue
+            if not _is_text(product.get("name")):
+                errors.append("{}.name is required".format(product_name))
+            quantity = product.get("quantity")
+            if type(quantity) is not int or quantity <= 0:
+                errors.append(
+                    "{}.quantity must be a positive integer".format(
+                        product_name))
+                products_ok = False
+            price = product.get("price")
+            if not _check_amount(
+                    errors, product_name + ".price", price, integer_only):
+                products_ok = False
+            if products_ok:
+                products_total += quantity * price
+        if products_ok and \
+                abs(products_total - package_amount) > AMOUNT_TOLERANCE:
+            errors.append(
+                "{}.amount[{}] does not match sum of products[{}]".format(
+                    name, package_amount, products_total))
+
+    shipping = (options.get("options") or {}).get("shipping") or {}
+    shipping_fee = shipping.get("feeAmount")
+    if shipping_fee is not None:
+        if _check_amount(errors, "options.shipping.feeAmount", shipping_fee,
+                         integer_only):
+            fees_total += shipping_fee
+        else:
+            totals_ok = False
+
+    if totals_ok and \
+            abs(packages_total + fees_total - amount) > AMOUNT_TOLERANCE:
+        if fees_total:
+            errors.append(
+                "amount[{}] does not match sum of packages[{}] and "
+                "fees[{}]".format(amount, packages_total, fees_total))
+        else:
+            errors.append(
+                "amount[{}] does not match sum of packages[{}]".format(
+                    amount, packages_total))
+    return errors
+
+
+def validate_request_options(options):
+    """Validate Request API body
+    :param dict options: LINE Pay Request API Options
+    :raises ValueError: when options are invalid
+    """
+    errors = request_options_errors(options)
+    if errors:
+        raise ValueError("Invalid request options: " + "; ".join(errors))
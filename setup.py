@@ -21,6 +21,13 @@ setup(
     license="MIT",
     packages=find_packages(exclude=("tests", "docs", "requests", "examples")),
         install_requires=_requirements(),
+    extras_require={
+        # httpx 0.23 needs Python 3.7+
+        "async": ["httpx>=0.23.0"],
+        "asgi": ["httpx>=0.23.0", "starlette>=0.20.0"],
+        "parquet": ["pyarrow>=6.0.0"],
+        "tracing": ["opentelemetry-api>=1.0.0"],
+    },
     classifiers=[
         "Development Status :: 4 - Beta",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,10 @@
+import asyncio
+
+
+def run_sync(coroutine):
+    """Run coroutine on a new event loop. asyncio.run needs Python 3.7"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import unittest
+from linepay.exceptions import ClientClosedError, LinePayApiError, LinePayTransientError
+from linepay.ledger import RefundLedger
+from linepay.exceptions import RefundRejectedError
+from tests import run_sync
+
+try:
+    import httpx
+    from linepay.aio import AsyncLinePayApi
+except ImportError:
+    httpx = None
+
+
+def create_api(handler, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncLinePayApi("channel_id", "channel_secret", is_sandbox=True, client=client, **kwargs)
+
+
+@unittest.skipIf(httpx is None, "httpx is not installed")
+class TestAsyncLinePayApi(unittest.TestCase):
+
+    def test_confirm(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={"returnCode": "0000"})
+
+        api = create_api(handler)
+        result = run_sync(api.confirm(1234567890, 10.0, "JPY"))
+        self.assertEqual(result, {"returnCode": "0000"})
+        self.assertEqual(len(requests), 1)
+        request = requests[0]
+        self.assertEqual(request.method, "POST")
+        self.assertEqual(str(request.url), "https://sandbox-api-pay.line.me/v3/payments/1234567890/confirm")
+        self.assertEqual(json.loads(request.content), {"amount": 10, "currency": "JPY"})
+        self.assertIn("X-LINE-Authorization", request.headers)
+        self.assertEqual(request.headers["X-LINE-ChannelId"], "channel_id")
+
+    def test_payment_details(self):
+        def handler(request):
+            self.assertEqual(request.method, "GET")
+            self.assertEqual(request.url.query, b"transactionId=1234567890&orderId=order-1")
+            return httpx.Response(200, json={"returnCode": "0000", "info": []})
+
+        api = create_api(handler)
+        result = run_sync(api.payment_details(transaction_id=1234567890, order_id="order-1"))
+        self.assertEqual(result["info"], [])
+
+    def test_failed_return_code(self):
+        def handler(request):
+            return httpx.Response(200, json={"returnCode": "9000", "returnMessage": "Internal error."})
+
+        api = create_api(handler)
+        with self.assertRaises(LinePayTransientError):
+            run_sync(api.void(1234567890))
+
+    def test_invalid_argument(self):
+        api = create_api(lambda request: httpx.Response(200, json={"returnCode": "0000"}))
+        with self.assertRaises(ValueError):
+            run_sync(api.confirm("1234567890", 10.0, "JPY"))
+
+    def test_refund_ledger(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            if request.method == "GET":
+                return httpx.Response(200, json={"returnCode": "0000", "info": [{
+                    "transactionId": 1234567890, "payStatus": "CAPTURE",
+                    "payInfo": [{"amount": 100}]}]})
+            return httpx.Response(200, json={"returnCode": "0000"})
+
+        api = create_api(handler, refund_ledger=RefundLedger())
+
+        async def run():
+            await api.refund(1234567890, refund_amount=80)
+            with self.assertRaises(RefundRejectedError):
+                await api.refund(1234567890, refund_amount=80)
+
+        run_sync(run())
+        self.assertEqual(calls, ["/v3/payments", "/v3/payments/1234567890/refund"])
+
+    def test_owned_client(self):
+        async def run():
+            async with AsyncLinePayApi("channel_id", "channel_secret") as api:
+                self.assertIsInstance(api.client, httpx.AsyncClient)
+            self.assertTrue(api.client.is_closed)
+
+        run_sync(run())
+
+    def test_sync_close_is_rejected(self):
+        api = create_api(lambda request: httpx.Response(200))
+        with self.assertRaises(TypeError) as cm:
+            with api:
+                pass
+        self.assertIn("async with", str(cm.exception))
+        with self.assertRaises(TypeError) as cm:
+            api.close()
+        self.assertIn("aclose()", str(cm.exception))
+        self.assertFalse(api.closing)
+
+    def test_aclose_drains_in_flight_calls(self):
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={"returnCode": "0000"})
+
+        async def run():
+            api = create_api(handler)
+            call = asyncio.ensure_future(api.confirm(1234567890, 10.0, "JPY"))
+            await asyncio.sleep(0)
+            self.assertEqual(api.in_flight(), 1)
+            self.assertTrue(await api.aclose(timeout=5))
+            self.assertEqual(await call, {"returnCode": "0000"})
+            with self.assertRaises(ClientClosedError):
+                await api.confirm(1234567890, 10.0, "JPY")
+            self.assertFalse(api.client.is_closed)
+
+        run_sync(run())
+
+    def test_drain_timeout(self):
+        async def handler(request):
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json={"returnCode": "0000"})
+
+        async def run():
+            api = create_api(handler)
+            call = asyncio.ensure_future(api.confirm(1234567890, 10.0, "JPY"))
+            await asyncio.sleep(0)
+            self.assertFalse(await api.drain(timeout=0.01))
+            await call
+            self.assertTrue(await api.drain(timeout=0.01))
+
+        run_sync(run())
+
+    def test_warmup_and_probe(self):
+        methods = []
+
+        def handler(request):
+            methods.append(request.method)
+            return httpx.Response(200)
+
+        api = create_api(handler)
+        self.assertEqual(run_sync(api.warmup(3)), 3)
+        health = run_sync(api.probe())
+        self.assertEqual(methods, ["HEAD"] * 4)
+        self.assertTrue(health.reachable)
+        self.assertEqual(health.endpoint, "https://sandbox-api-pay.line.me")
+        self.assertIsNone(health.idle_connections)
+
+    def test_keep_warm(self):
+        methods = []
+
+        def handler(request):
+            methods.append(request.method)
+            return httpx.Response(200)
+
+        async def keep_warm():
+            api = create_api(handler)
+            keeper = api.keep_warm(connections=2, interval=0.01)
+            await asyncio.sleep(0.1)
+            await api.aclose()
+            await asyncio.sleep(0)
+            return keeper
+
+        keeper = run_sync(keep_warm())
+        self.assertTrue(keeper.cancelled())
+        self.assertGreaterEqual(len(methods), 6)
+        self.assertEqual(set(methods), {"HEAD"})
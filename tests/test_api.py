@@ -1,8 +1,10 @@
 import json
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 import linepay
-from linepay.exceptions import LinePayApiError
+from linepay.exceptions import ClientClosedError, LinePayApiError
+from linepay.interceptors import Interceptor
 from copy import deepcopy
 
 
@@ -1092,3 +1094,82 @@ class TestLinePayApi(unittest.TestCase):
             api = linepay.LinePayApi("channel_id", "channel_secret", is_sandbox=True)
             with self.assertRaises(LinePayApiError):
                 result = api.payment_details()
+
+
+class BlockingSession(object):
+
+    def __init__(self):
+        self.sent = threading.Event()
+        self.release = threading.Event()
+        self.closed = False
+
+    def post(self, url, data=None, headers=None):
+        self.sent.set()
+        self.release.wait(5)
+        response = MagicMock()
+        response.json.return_value = {"returnCode": "0000"}
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+class FlushRecorder(Interceptor):
+
+    def __init__(self):
+        self.flushed = 0
+
+    def flush(self):
+        self.flushed += 1
+
+
+class TestLinePayApiShutdown(unittest.TestCase):
+
+    def start_confirm(self, api):
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(api.confirm(1234567890, 10.0, "JPY")))
+        thread.start()
+        api.session.sent.wait(5)
+        return thread, results
+
+    def test_drain_waits_for_in_flight_calls(self):
+        recorder = FlushRecorder()
+        api = linepay.LinePayApi(
+            "channel_id", "channel_secret", session=BlockingSession(), interceptors=[recorder])
+        thread, results = self.start_confirm(api)
+        self.assertEqual(api.in_flight(), 1)
+        threading.Timer(0.05, api.session.release.set).start()
+        self.assertTrue(api.drain(timeout=5))
+        thread.join()
+        self.assertEqual(results, [{"returnCode": "0000"}])
+        self.assertEqual(api.in_flight(), 0)
+        self.assertEqual(recorder.flushed, 1)
+        with self.assertRaises(ClientClosedError) as cm:
+            api.confirm(1234567890, 10.0, "JPY")
+        self.assertEqual(cm.exception.api_name, "Confirm")
+
+    def test_drain_timeout(self):
+        api = linepay.LinePayApi("channel_id", "channel_secret", session=BlockingSession())
+        thread, results = self.start_confirm(api)
+        self.assertFalse(api.drain(timeout=0.01))
+        self.assertTrue(api.closing)
+        api.session.release.set()
+        thread.join()
+        self.assertEqual(len(results), 1)
+
+    def test_close_keeps_session_passed_to_client(self):
+        session = BlockingSession()
+        with linepay.LinePayApi("channel_id", "channel_secret", session=session) as api:
+            pass
+        self.assertTrue(api.closing)
+        self.assertFalse(session.closed)
+
+    def test_close_owned_session(self):
+        api = linepay.LinePayApi("channel_id", "channel_secret")
+        with patch("linepay.pool.probe"):
+            api.probe()
+        session = api.session
+        with patch.object(session, "close") as close:
+            self.assertTrue(api.close())
+        close.assert_called_once_with()
@@ -0,0 +1,104 @@
+import threading
+import unittest
+from linepay.session_store import MemoryOrderSessionStore
+
+try:
+    import httpx
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from starlette.testclient import TestClient
+    from linepay.aio import AsyncLinePayApi
+    from linepay.asgi import create_payment_router
+except ImportError:
+    Starlette = None
+
+
+def line_pay_handler(request):
+    path = request.url.path
+    if path == "/v3/payments/request":
+        return httpx.Response(200, json={"returnCode": "0000", "info": {
+            "transactionId": 1234567890,
+            "paymentUrl": {"web": "https://sandbox-web-pay.line.me/pay", "app": "line://pay"}}})
+    if path == "/v3/payments/1234567890/confirm":
+        return httpx.Response(200, json={"returnCode": "0000", "info": {"transactionId": 1234567890}})
+    return httpx.Response(200, json={"returnCode": "1150", "returnMessage": "Not found."})
+
+
+class ThreadRecordingStore(MemoryOrderSessionStore):
+    """Records threads calling the store"""
+
+    def __init__(self):
+        super(ThreadRecordingStore, self).__init__()
+        self.threads = set()
+
+    def _put(self, session):
+        self.threads.add(threading.get_ident())
+        super(ThreadRecordingStore, self)._put(session)
+
+    def get_by_transaction(self, transaction_id):
+        self.threads.add(threading.get_ident())
+        return super(ThreadRecordingStore, self).get_by_transaction(transaction_id)
+
+
+async def build_order(request):
+    return {
+        "amount": 100,
+        "currency": "JPY",
+        "orderId": "order-1",
+        "packages": [{"id": "package-1", "amount": 100, "products": [
+            {"name": "Sample product", "quantity": 1, "price": 100}]}]
+    }
+
+
+@unittest.skipIf(Starlette is None, "starlette or httpx is not installed")
+class TestPaymentRouter(unittest.TestCase):
+
+    def setUp(self):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(line_pay_handler))
+        self.api = AsyncLinePayApi("channel_id", "channel_secret", is_sandbox=True, client=client)
+        self.store = ThreadRecordingStore()
+        app = Starlette(routes=[Mount("/pay", create_payment_router(self.api, self.store, build_order))])
+        self.client = TestClient(app)
+
+    def test_request_confirm(self):
+        response = self.client.get("/pay/request", follow_redirects=False)
+        self.assertEqual(response.status_code, 307)
+        self.assertEqual(response.headers["location"], "https://sandbox-web-pay.line.me/pay")
+        session = self.store.get_by_transaction(1234567890)
+        self.assertEqual((session.order_id, session.amount, session.currency), ("order-1", 100, "JPY"))
+
+        response = self.client.get("/pay/confirm?transactionId=1234567890")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["returnCode"], "0000")
+        self.assertIsNone(self.store.get("order-1"))
+        # reloaded confirmUrl
+        response = self.client.get("/pay/confirm?transactionId=1234567890")
+        self.assertEqual(response.status_code, 404)
+
+    def test_confirm_unknown_transaction(self):
+        response = self.client.get("/pay/confirm?transactionId=1")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/pay/confirm")
+        self.assertEqual(response.status_code, 400)
+
+    def test_cancel(self):
+        self.client.get("/pay/request", follow_redirects=False)
+        response = self.client.get("/pay/cancel?transactionId=1234567890")
+        self.assertEqual(response.json(), {"cancelled": True})
+        self.assertIsNone(self.store.get("order-1"))
+
+    def test_store_is_called_off_event_loop(self):
+        loop_threads = []
+
+        async def recording_build_order(request):
+            loop_threads.append(threading.get_ident())
+            return await build_order(request)
+
+        app = Starlette(routes=[Mount("/pay", create_payment_router(self.api, self.store, recording_build_order))])
+        # one event loop thread for both requests
+        with TestClient(app) as client:
+            client.get("/pay/request", follow_redirects=False)
+            client.get("/pay/confirm?transactionId=1234567890")
+        self.assertEqual(len(loop_threads), 1)
+        self.assertTrue(self.store.threads)
+        self.assertNotIn(loop_threads[0], self.store.threads)
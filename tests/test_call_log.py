@@ -0,0 +1,66 @@
+import logging
+import unittest
+from unittest.mock import MagicMock, patch
+from linepay import LinePayApi
+from linepay.call_log import CallLog, REDACTED, redact, redact_path
+from linepay.exceptions import LinePayApiError
+
+
+def create_response(result):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = result
+    return response
+
+
+class TestCallLog(unittest.TestCase):
+
+    def test_redact(self):
+        value = {"regKey": "RK0001", "info": [{"shipping": {"address": {"city": "Tokyo"}}, "amount": 100}]}
+        self.assertEqual(redact(value), {"regKey": REDACTED, "info": [{"shipping": {"address": REDACTED}, "amount": 100}]})
+        self.assertEqual(value["regKey"], "RK0001")
+        self.assertEqual(
+            redact_path("/v3/payments/preapprovedPay/RK0001/check"),
+            "/v3/payments/preapprovedPay/***/check")
+
+    @patch("linepay.api.requests.post")
+    def test_debug_logs_do_not_leak_credentials(self, mock_post):
+        mock_post.return_value = create_response({"returnCode": "0000"})
+        api = LinePayApi("channel_id", "channel_secret", is_sandbox=True)
+        with self.assertLogs("linepay", level=logging.DEBUG) as cm:
+            api.pay_preapproved("RK0001", "product", 100.0, "JPY", "order-1")
+        self.assertEqual(len(cm.records), 1)
+        record = cm.records[0]
+        self.assertEqual(record.linepay["api"], "Pay Preapproved")
+        self.assertEqual(record.linepay["return_code"], "0000")
+        self.assertTrue(record.linepay["succeeded"])
+        self.assertNotIn("request", record.linepay)
+        for output in cm.output:
+            self.assertNotIn("X-LINE-Authorization", output)
+            self.assertNotIn("RK0001", output)
+        self.assertNotIn("RK0001", str(record.linepay))
+
+    @patch("linepay.api.requests.get")
+    def test_sampling_keeps_failures(self, mock_get):
+        mock_get.side_effect = [
+            create_response({"returnCode": "0000"}),
+            create_response({"returnCode": "1150", "returnMessage": "Not found."}),
+        ]
+        call_log = CallLog(level=logging.INFO, sample_rates={"Payment Details": 0.01}, random=lambda: 0.5, include_bodies=True)
+        api = LinePayApi("channel_id", "channel_secret", is_sandbox=True, call_log=call_log)
+        with self.assertLogs("linepay", level=logging.INFO) as cm:
+            api.payment_details(transaction_id=1)
+            with self.assertRaises(LinePayApiError):
+                api.payment_details(transaction_id=2)
+        self.assertEqual(len(cm.records), 1)
+        event = cm.records[0].linepay
+        self.assertFalse(event["succeeded"])
+        self.assertEqual(event["request"], "transactionId=2")
+        self.assertEqual(event["response"]["returnMessage"], "Not found.")
+
+    def test_disabled_logger_is_not_called(self):
+        logger = MagicMock()
+        logger.isEnabledFor.return_value = False
+        api = LinePayApi("channel_id", "channel_secret", call_log=CallLog(logger=logger))
+        self.assertIsNone(api._log_started())
+        logger.isEnabledFor.assert_called_once_with(logging.DEBUG)
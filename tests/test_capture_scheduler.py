@@ -0,0 +1,145 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+from linepay.capture_scheduler import (
+    CaptureScheduler, parse_expire_date, ACTION_CAPTURE, ACTION_VOID, ACTION_EXPIRED)
+from linepay.exceptions import LinePayTransientError, LinePayTransactionStateError
+from linepay.ratelimit import TokenBucket
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_scheduler(api=None, clock=None, **kwargs):
+    clock = clock or FakeClock()
+    api = api or MagicMock()
+    api.capture.return_value = {"returnCode": "0000"}
+    api.void.return_value = {"returnCode": "0000"}
+    kwargs.setdefault("rate_limiter", TokenBucket(1000, clock=clock))
+    return CaptureScheduler(api, void_margin=100, clock=clock, **kwargs), api, clock
+
+
+class TestCaptureScheduler(unittest.TestCase):
+
+    def test_parse_expire_date(self):
+        self.assertEqual(parse_expire_date("1970-01-02T00:00:00Z"), 86400.0)
+
+    def test_ready_authorizations_are_captured_by_expiry(self):
+        scheduler, api, clock = create_scheduler()
+        scheduler.add(1, 100, "JPY", clock.now + 5000)
+        scheduler.add(2, 9.99, "USD", clock.now + 1000, ready=True)
+        scheduler.add(3, 10, "JPY", clock.now + 3000)
+        self.assertTrue(scheduler.mark_ready(1))
+        outcomes = scheduler.run_batch()
+        self.assertEqual([(o.transaction_id, o.action) for o in outcomes],
+                         [(2, ACTION_CAPTURE), (1, ACTION_CAPTURE)])
+        self.assertTrue(all(o.succeeded for o in outcomes))
+        api.capture.assert_any_call(2, 9.99, "USD")
+        self.assertEqual(len(scheduler), 1)
+        self.assertEqual(scheduler.next_deadline(), clock.now + 2900)
+        self.assertEqual(scheduler.run_batch(), [])
+
+    def test_cancelled_and_near_expiry_are_voided(self):
+        scheduler, api, clock = create_scheduler()
+        scheduler.add(1, 100, "JPY", clock.now + 150)
+        scheduler.add(2, 100, "JPY", clock.now + 5000)
+        scheduler.add(3, 100, "JPY", clock.now + 5000)
+        self.assertTrue(scheduler.cancel(2))
+        self.assertFalse(scheduler.mark_ready(2))
+        self.assertEqual(scheduler.run_batch(), [
+            (2, ACTION_VOID, {"returnCode": "0000"}, None)])
+        clock.now += 50
+        outcomes = scheduler.run_batch()
+        self.assertEqual([(o.transaction_id, o.action) for o in outcomes], [(1, ACTION_VOID)])
+        api.capture.assert_not_called()
+        self.assertEqual(list(scheduler._entries), [3])
+
+    def test_expired_before_capture(self):
+        scheduler, api, clock = create_scheduler()
+        scheduler.add(1, 100, "JPY", clock.now + 10, ready=True)
+        clock.now += 10
+        outcomes = scheduler.run_batch()
+        self.assertEqual(outcomes[0].action, ACTION_EXPIRED)
+        self.assertFalse(outcomes[0].succeeded)
+        api.capture.assert_not_called()
+
+    def test_batches_are_rate_limited(self):
+        clock = FakeClock()
+        scheduler, api, _ = create_scheduler(
+            clock=clock, batch_size=3, rate_limiter=TokenBucket(2, burst=2, clock=clock))
+        for i in range(5):
+            scheduler.add(i, 100, "JPY", clock.now + 5000, ready=True)
+        self.assertEqual(len(scheduler.run_batch()), 2)
+        self.assertEqual(scheduler.run_batch(), [])
+        clock.now += 1
+        self.assertEqual(len(scheduler.run_batch()), 2)
+        clock.now += 10
+        self.assertEqual(len(scheduler.run_batch()), 1)
+        self.assertEqual(api.capture.call_count, 5)
+
+    def test_retryable_errors(self):
+        scheduler, api, clock = create_scheduler(max_attempts=2)
+        scheduler.add(1, 100, "JPY", clock.now + 5000, ready=True)
+        scheduler.add(2, 100, "JPY", clock.now + 6000, ready=True)
+        api.capture.side_effect = [
+            LinePayTransientError("9000", 200, None, None),
+            LinePayTransactionStateError("1172", 200, None, None),
+            {"returnCode": "0000"}
+        ]
+        outcomes = scheduler.run_batch()
+        self.assertEqual(len(outcomes), 1)
+        self.assertEqual(outcomes[0].transaction_id, 2)
+        self.assertIsInstance(outcomes[0].error, LinePayTransactionStateError)
+        outcomes = scheduler.run_batch()
+        self.assertTrue(outcomes[0].succeeded)
+        self.assertEqual(len(scheduler), 0)
+
+    def test_add_confirmed(self):
+        scheduler, api, clock = create_scheduler()
+        scheduler.add_confirmed(1, 100, "JPY", {
+            "returnCode": "0000", "info": {"authorizationExpireDate": "2020-01-31T00:00:00Z"}})
+        self.assertEqual(scheduler.next_deadline(), parse_expire_date("2020-01-31T00:00:00Z") - 100)
+        with self.assertRaises(ValueError):
+            scheduler.add_confirmed(2, 100, "JPY", {"returnCode": "0000", "info": {}})
+        with self.assertRaises(ValueError):
+            scheduler.add(1, 100, "JPY", clock.now)
+
+    def test_run_until_stopped(self):
+        scheduler, api, clock = create_scheduler()
+        scheduler.add(1, 100, "JPY", clock.now + 5000, ready=True)
+        stop_event = threading.Event()
+        outcomes = []
+
+        def on_outcome(outcome):
+            outcomes.append(outcome)
+            stop_event.set()
+
+        thread = threading.Thread(target=scheduler.run, args=(stop_event, on_outcome, 0.01))
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(outcomes[0].action, ACTION_CAPTURE)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_acquire(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, burst=4, clock=clock)
+        self.assertEqual(bucket.acquire_up_to(10), 4)
+        self.assertFalse(bucket.try_acquire())
+        self.assertEqual(bucket.delay(), 0.5)
+        clock.now += 1
+        self.assertTrue(bucket.try_acquire(2))
+        bucket.release(1)
+        self.assertEqual(bucket.available(), 1)
+        clock.now += 100
+        self.assertEqual(bucket.available(), 4)
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
@@ -0,0 +1,103 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+import requests
+from linepay import LinePayApi
+from linepay.cassette import Cassette, RecordingSession, ReplaySession
+from linepay.exceptions import CassetteMissError, LinePayApiError
+from linepay.stub import StubLinePayServer, stub_response
+
+
+def responder(name, param, body, query):
+    if name == "refund" and param == "2":
+        return {"returnCode": "1165", "returnMessage": "Already refunded."}
+    return stub_response(name, param, body, query)
+
+
+REQUEST_OPTIONS = {
+    "amount": 100, "currency": "JPY", "orderId": "order-1",
+    "packages": [{"id": "1", "amount": 100, "products": [{"name": "item", "quantity": 1, "price": 100}]}],
+    "redirectUrls": {"confirmUrl": "https://example.com/confirm", "cancelUrl": "https://example.com/cancel"},
+}
+
+
+def flow(api):
+    transaction_id = api.request(REQUEST_OPTIONS)["info"]["transactionId"]
+    confirmed = api.confirm(transaction_id, 100.0, "JPY")
+    details = api.payment_details(transaction_id=transaction_id)
+    preapproved = api.pay_preapproved("RK0123456789", "item", 100.0, "JPY", "order-2")
+    try:
+        api.refund(2)
+        refund_error = None
+    except LinePayApiError as e:
+        refund_error = e.return_code
+    return [confirmed, details, preapproved, refund_error]
+
+
+class TestCassette(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "flow.jsonl.gz")
+        cassette = Cassette()
+        with StubLinePayServer(responder=responder) as server:
+            api = LinePayApi("channel_id", "channel_secret", session=RecordingSession(cassette, requests.Session()))
+            api.api_endpoint = server.url
+            cls.recorded = flow(api)
+            api.session.close()
+        cassette.save(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_record_and_replay(self):
+        recorded = self.recorded
+        cassette = Cassette.load(self.path)
+        self.assertEqual(len(cassette), 5)
+        api = LinePayApi("channel_id", "another_secret", is_sandbox=True, session=ReplaySession(cassette))
+        for _ in range(3):
+            self.assertEqual(flow(api), recorded)
+        self.assertEqual(recorded[-1], "1165")
+
+    def test_cassette_has_no_secrets(self):
+        with gzip.open(self.path, "rt") as f:
+            content = f.read()
+        self.assertNotIn("X-LINE-Authorization", content)
+        self.assertNotIn("channel_secret", content)
+        self.assertNotIn("RK0123456789", content)
+        first = json.loads(content.splitlines()[0])
+        self.assertEqual(first["method"], "POST")
+        self.assertEqual(first["path"], "/v3/payments/request")
+        self.assertEqual(json.loads(first["body"])["orderId"], "order-1")
+
+    def test_matching(self):
+        session = ReplaySession(Cassette.load(self.path), repeat=False)
+        reordered = json.dumps(dict(reversed(list(REQUEST_OPTIONS.items()))))
+        response = session.post("https://api-pay.line.me/v3/payments/request", reordered, headers={})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["returnCode"], "0000")
+        with self.assertRaises(CassetteMissError):
+            session.post("https://api-pay.line.me/v3/payments/request", reordered)
+        with self.assertRaises(CassetteMissError) as cm:
+            session.get("https://api-pay.line.me/v3/payments?transactionId=1")
+        self.assertEqual(cm.exception.path, "/v3/payments?transactionId=1")
+
+    def test_response_not_json(self):
+        session = MagicMock()
+        session.get.return_value.status_code = 502
+        session.get.return_value.headers = {"Content-Type": "text/html"}
+        session.get.return_value.text = "<html><body>502 Bad Gateway</body></html>"
+        cassette = Cassette()
+        url = "https://api-pay.line.me/v3/payments?transactionId=1"
+        RecordingSession(cassette, session).get(url)
+        path = os.path.join(self.directory.name, "bad_gateway.jsonl")
+        cassette.save(path)
+        response = ReplaySession(Cassette.load(path)).get(url)
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.text, "<html><body>502 Bad Gateway</body></html>")
+        self.assertFalse(response.ok)
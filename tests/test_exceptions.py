@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import linepay
+from linepay import return_codes
+from linepay.exceptions import (
+    LinePayApiError, ErrorRecord, LinePayRegKeyError, LinePayTransactionStateError,
+    LinePayTransientError, error_class_for
+)
+from requests.structures import CaseInsensitiveDict
+
+
+class TestLinePayApiError(unittest.TestCase):
+
+    def test_headers_are_materialized_lazily(self):
+        headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+        error = LinePayApiError("1165", 200, headers, {"returnCode": "1165", "returnMessage": "Already refunded."})
+        self.assertIs(error._headers, headers)
+        self.assertEqual(error.headers, {"Content-Type": "application/json"})
+        self.assertIs(type(error.headers), dict)
+        self.assertEqual(error.message, "Already refunded.")
+
+    def test_str(self):
+        error = LinePayApiError("1165", 200, {}, {"returnCode": "1165", "returnMessage": "Already refunded."})
+        self.assertEqual(
+            str(error),
+            "LinePayApiError: return_code=1165, http_status_code=200, return_message=Already refunded.")
+
+    def test_without_details(self):
+        error = LinePayApiError("1165", 200, None, None, return_message="Already refunded.")
+        self.assertIsNone(error.headers)
+        self.assertIsNone(error.api_response)
+        self.assertEqual(error.message, "Already refunded.")
+
+    def test_to_record(self):
+        error = LinePayApiError("1165", 200, {}, {"returnCode": "1165", "returnMessage": "Already refunded."})
+        record = error.to_record(key=1234567890)
+        self.assertEqual(record, ErrorRecord("1165", 200, "Already refunded.", 1234567890))
+        self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_client_without_error_details(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(
+                return_value={"returnCode": "1165", "returnMessage": "Already refunded."})
+            post.return_value.status_code = 200
+            api = linepay.LinePayApi(
+                "channel_id", "channel_secret", is_sandbox=True, capture_error_details=False)
+            with self.assertRaises(LinePayApiError) as cm:
+                api.refund(1234567890)
+            self.assertEqual(cm.exception.return_code, "1165")
+            self.assertEqual(cm.exception.message, "Already refunded.")
+            self.assertIsNone(cm.exception.headers)
+            self.assertIsNone(cm.exception.api_response)
+
+
+class TestReturnCodeErrors(unittest.TestCase):
+
+    def test_lookup(self):
+        info = return_codes.lookup("1165")
+        self.assertEqual(info.category, return_codes.ReturnCodeCategory.TRANSACTION_STATE)
+        self.assertFalse(info.retryable)
+        self.assertEqual(info.action, return_codes.RecommendedAction.STOP)
+        self.assertTrue(return_codes.lookup("9000").retryable)
+        self.assertEqual(return_codes.lookup("8888").category, return_codes.ReturnCodeCategory.UNKNOWN)
+        self.assertFalse(return_codes.is_retryable("8888"))
+        self.assertFalse(return_codes.is_retryable(None))
+
+    def test_error_class_for(self):
+        self.assertIs(error_class_for("9000"), LinePayTransientError)
+        self.assertIs(error_class_for("1165"), LinePayTransactionStateError)
+        self.assertIs(error_class_for("1193"), LinePayRegKeyError)
+        self.assertIs(error_class_for("0000"), LinePayApiError)
+        self.assertIs(error_class_for(None), LinePayApiError)
+
+    def test_error_attributes(self):
+        error = LinePayTransientError("9000", 200, {}, {"returnCode": "9000", "returnMessage": "Internal error."})
+        self.assertTrue(error.retryable)
+        self.assertEqual(error.category, return_codes.ReturnCodeCategory.TRANSIENT)
+        self.assertEqual(error.action, return_codes.RecommendedAction.RETRY)
+
+    def test_client_raises_subclass(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(
+                return_value={"returnCode": "1165", "returnMessage": "Already refunded."})
+            api = linepay.LinePayApi("channel_id", "channel_secret", is_sandbox=True)
+            with self.assertRaises(LinePayTransactionStateError) as cm:
+                api.refund(1234567890)
+            self.assertIsInstance(cm.exception, LinePayApiError)
+            self.assertFalse(cm.exception.retryable)
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+import linepay
+from linepay.exceptions import LinePayApiError
+from linepay.idempotency import IdempotencyGuard
+from tests import run_sync
+
+try:
+    import httpx
+    from linepay.aio import AsyncLinePayApi
+except ImportError:
+    httpx = None
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestIdempotencyGuard(unittest.TestCase):
+
+    def test_completed_result_is_reused(self):
+        guard = IdempotencyGuard()
+        func = MagicMock(return_value={"returnCode": "0000"})
+        first = guard.call("order-1", func, 1)
+        second = guard.call("order-1", func, 2)
+        self.assertIs(first, second)
+        func.assert_called_once_with(1)
+        self.assertIn("order-1", guard)
+        guard.forget("order-1")
+        self.assertNotIn("order-1", guard)
+
+    def test_ttl_and_max_entries(self):
+        clock = FakeClock()
+        guard = IdempotencyGuard(ttl=10, max_entries=2, clock=clock)
+        for order_id in ("order-1", "order-2", "order-3"):
+            guard.call(order_id, lambda: order_id)
+        self.assertEqual(len(guard), 2)
+        self.assertNotIn("order-1", guard)
+        clock.now += 10
+        self.assertNotIn("order-2", guard)
+        self.assertEqual(guard.call("order-2", lambda: "again"), "again")
+        with self.assertRaises(ValueError):
+            IdempotencyGuard(ttl=0)
+
+    def test_failure_is_not_kept(self):
+        guard = IdempotencyGuard()
+        func = MagicMock(side_effect=[ValueError("failed"), "ok"])
+        with self.assertRaises(ValueError):
+            guard.call("order-1", func)
+        self.assertEqual(guard.call("order-1", func), "ok")
+        self.assertEqual(func.call_count, 2)
+
+    def test_concurrent_duplicates_attach_to_in_flight_call(self):
+        guard = IdempotencyGuard()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def func():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"returnCode": "0000"}
+
+        results = []
+        owner = threading.Thread(target=lambda: results.append(guard.call("order-1", func)))
+        owner.start()
+        started.wait(5)
+        waiters = [
+            threading.Thread(target=lambda: results.append(guard.call("order-1", func)))
+            for _ in range(4)]
+        for t in waiters:
+            t.start()
+        self.assertEqual(guard.in_flight(), 1)
+        release.set()
+        for t in [owner] + waiters:
+            t.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(guard.in_flight(), 0)
+
+    def test_concurrent_coroutines_share_error(self):
+        guard = IdempotencyGuard()
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        async def run():
+            return await asyncio.gather(
+                *[guard.call_async("order-1", func) for _ in range(3)],
+                return_exceptions=True)
+
+        results = run_sync(run())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(len(guard), 0)
+
+
+class TestLinePayApiIdempotency(unittest.TestCase):
+
+    def test_request_with_same_order_id(self):
+        guard = IdempotencyGuard()
+        api = linepay.LinePayApi("channel_id", "channel_secret", idempotency_guard=guard)
+        options = {"amount": 1, "currency": "JPY", "orderId": "order-1"}
+        with patch("linepay.api.requests.post") as post:
+            post.return_value.json.side_effect = lambda: {"returnCode": "0000"}
+            first = api.request(options)
+            second = api.request(dict(options))
+            third = api.request(dict(options, orderId="order-2"))
+        self.assertIs(first, second)
+        self.assertIsNot(first, third)
+        self.assertEqual(post.call_count, 2)
+
+    def test_pay_preapproved_failure_is_retried(self):
+        guard = IdempotencyGuard()
+        api = linepay.LinePayApi("channel_id", "channel_secret", idempotency_guard=guard)
+        with patch("linepay.api.requests.post") as post:
+            post.return_value.json.side_effect = [
+                {"returnCode": "9000", "returnMessage": "Internal error."},
+                {"returnCode": "0000"}
+            ]
+            with self.assertRaises(LinePayApiError):
+                api.pay_preapproved("regkey", "product", 10.0, "JPY", "order-1")
+            api.pay_preapproved("regkey", "product", 10.0, "JPY", "order-1")
+            api.pay_preapproved("regkey", "product", 10.0, "JPY", "order-1")
+        self.assertEqual(post.call_count, 2)
+
+    def test_guard_shared_by_channels(self):
+        guard = IdempotencyGuard()
+        api_1 = linepay.LinePayApi("channel_1", "channel_secret", idempotency_guard=guard)
+        api_2 = linepay.LinePayApi("channel_2", "channel_secret", idempotency_guard=guard)
+        options = {"amount": 1, "currency": "JPY", "orderId": "order-1"}
+        with patch("linepay.api.requests.post") as post:
+            post.return_value.json.side_effect = [
+                {"returnCode": "0000", "info": {"transactionId": 1}},
+                {"returnCode": "0000", "info": {"transactionId": 2}}
+            ]
+            first = api_1.request(options)
+            second = api_2.request(dict(options))
+            self.assertIs(api_1.request(dict(options)), first)
+        self.assertEqual(first["info"]["transactionId"], 1)
+        self.assertEqual(second["info"]["transactionId"], 2)
+        self.assertEqual(post.call_count, 2)
+
+    def test_without_guard(self):
+        api = linepay.LinePayApi("channel_id", "channel_secret")
+        options = {"amount": 1, "currency": "JPY", "orderId": "order-1"}
+        with patch("linepay.api.requests.post") as post:
+            post.return_value.json.return_value = {"returnCode": "0000"}
+            api.request(options)
+            api.request(options)
+        self.assertEqual(post.call_count, 2)
+
+    @unittest.skipIf(httpx is None, "httpx is not installed")
+    def test_async_request_with_same_order_id(self):
+        requests = []
+
+        async def handler(request):
+            requests.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"returnCode": "0000"})
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            api = AsyncLinePayApi(
+                "channel_id", "channel_secret", client=client, idempotency_guard=IdempotencyGuard())
+            options = {"amount": 1, "currency": "JPY", "orderId": "order-1"}
+            return await asyncio.gather(*[api.request(options) for _ in range(5)])
+
+        results = run_sync(run())
+        self.assertEqual(len(requests), 1)
+        self.assertTrue(all(r is results[0] for r in results))
@@ -0,0 +1,115 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+import linepay
+from linepay.exceptions import LinePayApiError
+from linepay.interceptors import Interceptor, InterceptorChain, LinePayCall
+
+
+class RecordingInterceptor(Interceptor):
+
+    def __init__(self, name, events):
+        self.name = name
+        self.events = events
+
+    def before_sign(self, call):
+        self.events.append((self.name, "before_sign"))
+
+    def after_sign(self, call):
+        self.events.append((self.name, "after_sign"))
+
+    def before_send(self, call):
+        self.events.append((self.name, "before_send"))
+
+    def after_response(self, call):
+        self.events.append((self.name, "after_response", call.result["returnCode"]))
+
+
+class HeaderInterceptor(Interceptor):
+
+    def after_sign(self, call):
+        call.headers["X-Trace-Id"] = "trace-1234"
+
+
+class TestInterceptorChain(unittest.TestCase):
+
+    def test_compile_empty_chain(self):
+        self.assertIsNone(InterceptorChain().compile())
+        self.assertIsNone(InterceptorChain([Interceptor()]).compile())
+
+    def test_compile_only_overridden_hooks(self):
+        interceptor = HeaderInterceptor()
+        hooks = InterceptorChain([interceptor]).compile()
+        self.assertEqual(hooks.before_sign, ())
+        self.assertEqual(hooks.after_sign, (interceptor.after_sign,))
+        self.assertEqual(hooks.before_send, ())
+        self.assertEqual(hooks.after_response, ())
+
+    def test_hooks_called_in_order(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(return_value={"returnCode": "0000"})
+            events = []
+            api = linepay.LinePayApi(
+                "channel_id", "channel_secret", is_sandbox=True,
+                interceptors=[RecordingInterceptor("a", events), RecordingInterceptor("b", events)])
+            api.void(1234567890)
+            self.assertEqual(events, [
+                ("a", "before_sign"), ("b", "before_sign"),
+                ("a", "after_sign"), ("b", "after_sign"),
+                ("a", "before_send"), ("b", "before_send"),
+                ("a", "after_response", "0000"), ("b", "after_response", "0000"),
+            ])
+
+    def test_after_response_called_for_failed_return_code(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(return_value={"returnCode": "1150"})
+            events = []
+            api = linepay.LinePayApi("channel_id", "channel_secret", is_sandbox=True)
+            api.add_interceptor(RecordingInterceptor("a", events))
+            with self.assertRaises(LinePayApiError):
+                api.void(1234567890)
+            self.assertEqual(events[-1], ("a", "after_response", "1150"))
+
+    def test_after_sign_adds_header(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(return_value={"returnCode": "0000"})
+            api = linepay.LinePayApi(
+                "channel_id", "channel_secret", is_sandbox=True,
+                interceptors=[HeaderInterceptor()])
+            api.refund(1234567890, refund_amount=10)
+            headers = post.call_args[1]["headers"]
+            self.assertEqual(headers["X-Trace-Id"], "trace-1234")
+            self.assertIn("X-LINE-Authorization", headers)
+            self.assertNotIn("X-Trace-Id", api.headers)
+            self.assertEqual(post.call_args[0][1], json.dumps({"refundAmount": 10}))
+
+    def test_before_sign_does_not_touch_client_headers(self):
+        class BeforeSign(Interceptor):
+            def before_sign(self, call):
+                call.headers["X-Audit"] = "yes"
+
+        with patch('linepay.api.requests.get') as get:
+            get.return_value.json = MagicMock(return_value={"returnCode": "0000"})
+            api = linepay.LinePayApi(
+                "channel_id", "channel_secret", is_sandbox=True,
+                interceptors=[BeforeSign()])
+            api.payment_details(transaction_id=1234567890)
+            self.assertEqual(get.call_args[1]["headers"]["X-Audit"], "yes")
+            self.assertNotIn("X-Audit", api.headers)
+
+    def test_remove_interceptor(self):
+        interceptor = HeaderInterceptor()
+        api = linepay.LinePayApi(
+            "channel_id", "channel_secret", is_sandbox=True,
+            interceptors=[interceptor])
+        self.assertIsNotNone(api._hooks)
+        api.remove_interceptor(interceptor)
+        self.assertIsNone(api._hooks)
+
+    def test_state_per_interceptor(self):
+        first, second = HeaderInterceptor(), HeaderInterceptor()
+        call = LinePayCall(None, "Confirm", "POST", "/v3/payments/1/confirm", "", "", {})
+        call.state(first)["started"] = 1.0
+        call.context = "shared"
+        self.assertEqual(call.state(first), {"started": 1.0})
+        self.assertEqual(call.state(second), {})
@@ -0,0 +1,89 @@
+import threading
+import time
+import unittest
+from linepay import LinePayApi
+from linepay.exceptions import BulkheadFullError
+from linepay.lanes import BACKGROUND, INTERACTIVE, Lane, PriorityLanes
+from linepay.stub import StubLinePayServer
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.001)
+
+
+class TestPriorityLanes(unittest.TestCase):
+
+    def test_calls_are_routed_to_lanes(self):
+        with StubLinePayServer() as server:
+            lanes = PriorityLanes()
+            api = LinePayApi("channel_id", "channel_secret", lanes=lanes)
+            api.api_endpoint = server.url
+            api.confirm(1, 100.0, "JPY")
+            api.payment_details(transaction_id=1)
+            api.refund(1)
+            with lanes.use(BACKGROUND):
+                api.confirm(2, 100.0, "JPY")
+            api.confirm(3, 100.0, "JPY")
+            lanes.close()
+        stats = lanes.stats()
+        self.assertEqual(stats[INTERACTIVE].calls, 2)
+        self.assertEqual(stats[BACKGROUND].calls, 3)
+        self.assertEqual(stats[INTERACTIVE].in_flight, 0)
+        self.assertIsNot(lanes[INTERACTIVE].session, lanes[BACKGROUND].session)
+        with self.assertRaises(ValueError):
+            with lanes.use("unknown"):
+                pass
+        with self.assertRaises(ValueError):
+            PriorityLanes(routes={"Confirm": "unknown"})
+
+    def test_higher_priority_lane_runs_first(self):
+        lanes = PriorityLanes(max_concurrent=1)
+        order = []
+        holding = lanes.slot("Refund")
+        holding.__enter__()
+
+        def call(api_name):
+            with lanes.slot(api_name) as lane:
+                order.append(lane.name)
+
+        background = threading.Thread(target=call, args=("Payment Details",))
+        background.start()
+        wait_until(lambda: lanes.stats()[BACKGROUND].queued == 1)
+        interactive = threading.Thread(target=call, args=("Confirm",))
+        interactive.start()
+        wait_until(lambda: lanes.stats()[INTERACTIVE].queued == 1)
+        holding.__exit__(None, None, None)
+        background.join()
+        interactive.join()
+        self.assertEqual(order, [INTERACTIVE, BACKGROUND])
+        stats = lanes.stats()
+        self.assertEqual(stats[BACKGROUND].peak_queued, 1)
+        self.assertGreater(stats[BACKGROUND].max_wait, stats[INTERACTIVE].max_wait)
+        self.assertGreater(stats[INTERACTIVE].mean_wait, 0)
+
+    def test_full_lane_rejects_calls(self):
+        lanes = PriorityLanes(lanes=[
+            Lane(INTERACTIVE, 0, 1), Lane(BACKGROUND, 1, 1, max_queued=0)])
+        with lanes.slot("Refund"):
+            with self.assertRaises(BulkheadFullError) as cm:
+                with lanes.slot("Refund"):
+                    pass
+            self.assertEqual(cm.exception.lane, BACKGROUND)
+            # other lanes are not affected
+            with lanes.slot("Confirm"):
+                pass
+        self.assertEqual(lanes.stats()[BACKGROUND].rejected, 1)
+
+    def test_wait_timeout(self):
+        lanes = PriorityLanes(lanes=[
+            Lane(INTERACTIVE, 0, 1, timeout=0.01), Lane(BACKGROUND, 1, 1)])
+        with lanes.slot("Confirm"):
+            with self.assertRaises(BulkheadFullError):
+                with lanes.slot("Confirm"):
+                    pass
+        stats = lanes.stats()[INTERACTIVE]
+        self.assertEqual((stats.calls, stats.rejected, stats.queued), (1, 1, 0))
@@ -0,0 +1,140 @@
+import threading
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+import linepay
+from linepay.exceptions import RefundRejectedError, LinePayApiError
+from linepay.ledger import RefundLedger
+
+
+def payment_details(transaction_id, amount, refunds=(), pay_status="CAPTURE"):
+    return {
+        "returnCode": "0000",
+        "info": [{
+            "transactionId": transaction_id,
+            "transactionType": "PAYMENT",
+            "payStatus": pay_status,
+            "payInfo": [{"method": "BALANCE", "amount": amount}],
+            "refundList": [{"refundAmount": -r} for r in refunds]
+        }]
+    }
+
+
+class TestRefundLedger(unittest.TestCase):
+
+    def test_partial_refunds(self):
+        ledger = RefundLedger()
+        ledger.record_payment(1, 100)
+        ledger.commit_refund(1, ledger.reserve_refund(1, 60))
+        self.assertEqual(ledger.refundable_amount(1), Decimal(40))
+        with self.assertRaises(RefundRejectedError) as cm:
+            ledger.reserve_refund(1, 50)
+        self.assertEqual(cm.exception.refundable_amount, Decimal(40))
+        ledger.commit_refund(1, ledger.reserve_refund(1))
+        self.assertEqual(ledger.refundable_amount(1), Decimal(0))
+
+    def test_duplicate_full_refund(self):
+        ledger = RefundLedger()
+        ledger.record_payment(1, 9.99)
+        ledger.commit_refund(1, ledger.reserve_refund(1))
+        with self.assertRaises(RefundRejectedError):
+            ledger.reserve_refund(1)
+
+    def test_release_refund(self):
+        ledger = RefundLedger()
+        ledger.record_payment(1, 100)
+        reserved = ledger.reserve_refund(1, 100)
+        with self.assertRaises(RefundRejectedError):
+            ledger.reserve_refund(1, 1)
+        ledger.release_refund(1, reserved)
+        self.assertEqual(ledger.refundable_amount(1), Decimal(100))
+
+    def test_seed_lazily_from_payment_details(self):
+        ledger = RefundLedger()
+        loader = MagicMock(return_value=payment_details(1, 100, refunds=(30,)))
+        self.assertEqual(ledger.reserve_refund(1, 70, loader), Decimal(70))
+        loader.assert_called_once_with(1)
+        with self.assertRaises(RefundRejectedError):
+            ledger.reserve_refund(1, 1, loader)
+        loader.assert_called_once_with(1)
+
+    def test_seed_authorization_is_not_refundable(self):
+        ledger = RefundLedger()
+        ledger.seed(1, payment_details(1, 100, pay_status="AUTHORIZATION"))
+        with self.assertRaises(RefundRejectedError):
+            ledger.reserve_refund(1, 10)
+
+    def test_unknown_transaction_without_loader(self):
+        ledger = RefundLedger()
+        self.assertEqual(ledger.reserve_refund(1, 10), Decimal(0))
+        self.assertIsNone(ledger.refundable_amount(1))
+
+    def test_concurrent_reservations(self):
+        ledger = RefundLedger()
+        ledger.record_payment(1, 100)
+        accepted = []
+        rejected = []
+
+        def worker():
+            try:
+                accepted.append(ledger.reserve_refund(1, 10))
+            except RefundRejectedError:
+                rejected.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(accepted), 10)
+        self.assertEqual(len(rejected), 10)
+
+
+class TestLinePayApiWithRefundLedger(unittest.TestCase):
+
+    def test_refund_rejected_locally(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(return_value={"returnCode": "0000"})
+            ledger = RefundLedger()
+            api = linepay.LinePayApi("channel_id", "channel_secret", is_sandbox=True, refund_ledger=ledger)
+            api.confirm(1234567890, 100.0, "JPY")
+            api.refund(1234567890, refund_amount=60)
+            self.assertEqual(post.call_count, 2)
+            with self.assertRaises(RefundRejectedError):
+                api.refund(1234567890, refund_amount=60)
+            self.assertEqual(post.call_count, 2)
+            api.refund(1234567890)
+            with self.assertRaises(RefundRejectedError):
+                api.refund(1234567890)
+            self.assertEqual(post.call_count, 3)
+
+    def test_authorization_only_confirm_is_not_recorded(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(return_value={
+                "returnCode": "0000", "info": {"authorizationExpireDate": "2020-01-01T00:00:00Z"}})
+            ledger = RefundLedger()
+            api = linepay.LinePayApi("channel_id", "channel_secret", is_sandbox=True, refund_ledger=ledger)
+            api.confirm(1234567890, 100.0, "JPY")
+            self.assertNotIn(1234567890, ledger)
+            api.capture(1234567890, 100.0, "JPY")
+            self.assertEqual(ledger.refundable_amount(1234567890), Decimal(100))
+
+    def test_refund_seeds_from_payment_details(self):
+        with patch('linepay.api.requests.post') as post, patch('linepay.api.requests.get') as get:
+            post.return_value.json = MagicMock(return_value={"returnCode": "0000"})
+            get.return_value.json = MagicMock(return_value=payment_details(1234567890, 100, refunds=(100,)))
+            api = linepay.LinePayApi("channel_id", "channel_secret", is_sandbox=True, refund_ledger=RefundLedger())
+            with self.assertRaises(RefundRejectedError):
+                api.refund(1234567890)
+            get.assert_called_once()
+            post.assert_not_called()
+
+    def test_already_refunded_error_marks_ledger(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(return_value={"returnCode": "1165"})
+            ledger = RefundLedger()
+            ledger.record_payment(1234567890, 100)
+            api = linepay.LinePayApi("channel_id", "channel_secret", is_sandbox=True, refund_ledger=ledger)
+            with self.assertRaises(LinePayApiError):
+                api.refund(1234567890, refund_amount=10)
+            self.assertEqual(ledger.refundable_amount(1234567890), Decimal(0))
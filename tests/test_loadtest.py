@@ -0,0 +1,50 @@
+import contextlib
+import io
+import unittest
+from linepay import LinePayApi
+from linepay.loadtest import main, parse_mix, percentile, run
+from linepay.stub import StubLinePayServer, stub_response
+
+
+def responder(name, param, body, query):
+    if name == "refund":
+        return {"returnCode": "1165", "returnMessage": "Already refunded."}
+    return stub_response(name, param, body, query)
+
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("checkout=6, preapproved"), [("checkout", 6.0), ("preapproved", 1.0)])
+        with self.assertRaises(ValueError):
+            parse_mix("unknown=1")
+        with self.assertRaises(ValueError):
+            parse_mix("checkout=0")
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 51)
+        self.assertEqual(percentile(values, 99), 100)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_run_reports_errors_by_return_code(self):
+        with StubLinePayServer(responder=responder) as server:
+            api = LinePayApi("channel_id", "channel_secret")
+            api.api_endpoint = server.url
+            report = run(api, parse_mix("checkout=1,authorization=1"), 4, flows=20, seed=1)
+        self.assertEqual(sum(report.flows.values()), 20)
+        self.assertEqual(report.failed_flows["checkout"], report.flows["checkout"])
+        self.assertEqual(report.failed_flows["authorization"], 0)
+        self.assertEqual(report.errors["Refund"]["1165"], report.flows["checkout"])
+        self.assertEqual(len(report.latencies["Confirm"]), 20)
+        self.assertIn("1165", report.format())
+
+    def test_main(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            report = main(["--stub", "--flows", "10", "--concurrency", "2", "--mix", "preapproved", "--warmup"])
+        self.assertEqual(report.flows["preapproved"], 10)
+        self.assertEqual(len(report.latencies["Expire RegKey"]), 10)
+        self.assertIn("Pay Preapproved", output.getvalue())
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            main(["--endpoint", "https://api-pay.line.me", "--flows", "1"])
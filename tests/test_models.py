@@ -0,0 +1,87 @@
+import unittest
+from linepay import models
+
+
+CONFIRM_RESPONSE = {
+    "returnCode": "0000",
+    "returnMessage": "Success.",
+    "info": {
+        "orderId": "order-1234567890",
+        "transactionId": 2019049910005496810,
+        "payInfo": [
+            {"method": "BALANCE", "amount": 10},
+            {"method": "DISCOUNT", "amount": 5}
+        ]
+    }
+}
+
+PAYMENT_DETAILS_RESPONSE = {
+    "returnCode": "0000",
+    "returnMessage": "success",
+    "info": [
+        {
+            "transactionId": 2019049910005496810,
+            "transactionDate": "2019-04-17T07:40:53Z",
+            "transactionType": "PAYMENT",
+            "payStatus": "CAPTURE",
+            "currency": "JPY",
+            "payInfo": [{"method": "BALANCE", "amount": 15}],
+            "refundList": [
+                {
+                    "refundTransactionId": 2019049910005497012,
+                    "transactionType": "PARTIAL_REFUND",
+                    "refundAmount": -5,
+                    "refundTransactionDate": "2019-04-17T07:42:10Z"
+                }
+            ]
+        }
+    ]
+}
+
+
+class TestModels(unittest.TestCase):
+
+    def test_confirm_response(self):
+        result = models.ConfirmResponse(CONFIRM_RESPONSE)
+        self.assertEqual(result.return_code, "0000")
+        self.assertEqual(result.return_message, "Success.")
+        self.assertEqual(result.info.order_id, "order-1234567890")
+        self.assertEqual(result.info.transaction_id, 2019049910005496810)
+        self.assertEqual([p.amount for p in result.info.pay_info], [10, 5])
+        self.assertIsNone(result.info.reg_key)
+        self.assertIsNone(result.info.shipping)
+        self.assertIs(result.raw, CONFIRM_RESPONSE)
+
+    def test_nested_fields_are_parsed_lazily_and_cached(self):
+        result = models.ConfirmResponse(CONFIRM_RESPONSE)
+        self.assertIsNone(result._cache)
+        info = result.info
+        self.assertIs(result.info, info)
+        self.assertIs(info.pay_info, info.pay_info)
+
+    def test_payment_details_response(self):
+        result = models.wrap_response("payment_details", PAYMENT_DETAILS_RESPONSE)
+        self.assertIsInstance(result, models.PaymentDetailsResponse)
+        details = list(result)
+        self.assertEqual(len(details), 1)
+        self.assertEqual(details[0].pay_status, "CAPTURE")
+        self.assertEqual(details[0].pay_info[0].amount, 15)
+        self.assertEqual(details[0].refund_list[0].refund_amount, -5)
+        self.assertEqual(details[0].refund_list[0].transaction_type, "PARTIAL_REFUND")
+
+    def test_response_without_info(self):
+        result = models.wrap_response("void", {"returnCode": "0000", "returnMessage": "OK"})
+        self.assertIsInstance(result, models.VoidResponse)
+        self.assertEqual(result.to_dict(), {"returnCode": "0000", "returnMessage": "OK"})
+        self.assertEqual(list(models.PaymentDetailsResponse({"returnCode": "0000"})), [])
+
+    def test_models_are_slotted(self):
+        result = models.ConfirmResponse(CONFIRM_RESPONSE)
+        with self.assertRaises(AttributeError):
+            result.foo = "bar"
+        self.assertFalse(hasattr(result.info.pay_info[0], "__dict__"))
+
+    def test_all_endpoints_have_model(self):
+        import linepay
+        for name in models.RESPONSE_MODELS:
+            self.assertTrue(callable(getattr(linepay.LinePayApi, name)))
@@ -0,0 +1,163 @@
+"""Performance budgets of the per-call path.
+
+Calls per second are compared relative to a calibration workload run in
+the same process, so the stored baseline holds on faster and slower
+machines. The calibration does the standard library work of a signed
+call (JSON, HMAC, uuid) in Python and C alike, so the ratio also holds
+across Python versions, and these budgets are checked in every test run.
+
+Allocations are the peak bytes traced by tracemalloc during one call, a
+proxy for its allocations. They change with the Python version, so they
+are only checked on the Python version the baseline was stored with.
+
+    $ LINEPAY_PERF_UPDATE=1 python -m pytest tests/test_performance.py  # store baseline
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+import unittest
+import uuid
+from linepay import LinePayApi
+from linepay.api import ApiRequest
+from linepay.util import validate_function_args_return_value
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "perf_baseline.json")
+UPDATE = bool(os.environ.get("LINEPAY_PERF_UPDATE"))
+# allowed regression relative to the baseline
+RATE_TOLERANCE = float(os.environ.get("LINEPAY_PERF_RATE_TOLERANCE", "0.3"))
+ALLOC_TOLERANCE = float(os.environ.get("LINEPAY_PERF_ALLOC_TOLERANCE", "0.25"))
+ALLOC_SLACK = 256
+PYTHON_VERSION = "{}.{}".format(*sys.version_info[:2])
+
+
+class StubResponse(object):
+    status_code = 200
+    headers = {}
+
+    def json(self):
+        return {"returnCode": "0000", "returnMessage": "Success."}
+
+
+class StubSession(object):
+    response = StubResponse()
+
+    def post(self, url, data=None, headers=None):
+        return self.response
+
+
+def calibration():
+    payload = {"amount": 100, "currency": "JPY", "orderId": "order-1"}
+    body = json.dumps(payload)
+    headers = dict({"Content-Type": "application/json"}, nonce=str(uuid.uuid4()))
+    digest = hmac.new(b"secret", (body + headers["nonce"]).encode(), hashlib.sha256).digest()
+    base64.b64encode(digest).decode()
+
+
+@validate_function_args_return_value
+def validated(transaction_id: int, amount: float, currency: str) -> dict:
+    return {}
+
+
+def calls_per_second(func):
+    number = 1
+    while timeit.timeit(func, number=number) < 0.01:
+        number *= 2
+    return number / min(timeit.repeat(func, number=number, repeat=7))
+
+
+def relative_rate(func, rounds=3):
+    """Median of calls per calibration call, measured back to back"""
+    rates = sorted(
+        calls_per_second(func) / calls_per_second(calibration)
+        for _ in range(rounds))
+    return rates[len(rates) // 2]
+
+
+def peak_bytes(func):
+    func()
+    peaks = []
+    for _ in range(3):
+        # starting again clears traces and the peak (reset_peak needs 3.9)
+        tracemalloc.start()
+        try:
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return min(peaks)
+
+
+def operations():
+    api = LinePayApi("channel_id", "channel_secret", is_sandbox=True, session=StubSession())
+    body = json.dumps({"amount": 100, "currency": "JPY"})
+    confirm_request = ApiRequest(
+        "Confirm", "POST", "/v3/payments/1234567890/confirm", {"amount": 100, "currency": "JPY"})
+    return {
+        "sign": lambda: api.sign(api.headers, "/v3/payments/1234567890/confirm", body),
+        "validate_arguments": lambda: validated(1234567890, 100.0, "JPY"),
+        "encode_body": lambda: api._prepare(confirm_request),
+        "confirm": lambda: api.confirm(1234567890, 100.0, "JPY"),
+    }
+
+
+class TestPerformanceBudget(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.measured = {}
+        cls.baseline = {}
+        cls.baseline_python = None
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                stored = json.load(f)
+            cls.baseline = stored["operations"]
+            cls.baseline_python = stored.get("python")
+
+    @classmethod
+    def tearDownClass(cls):
+        if UPDATE and cls.measured:
+            baseline = dict(cls.baseline, **cls.measured)
+            with open(BASELINE_PATH, "w") as f:
+                json.dump({"python": PYTHON_VERSION, "operations": baseline}, f, indent=2, sort_keys=True)
+                f.write("\n")
+
+    def check_budget(self, name):
+        func = operations()[name]
+        rate = relative_rate(func, 5 if UPDATE else 3)
+        allocated = peak_bytes(func)
+        self.measured[name] = {"relative_rate": round(rate, 4), "peak_bytes": allocated}
+        if UPDATE:
+            return
+        if name not in self.baseline:
+            self.skipTest("no baseline of {}. Run with LINEPAY_PERF_UPDATE=1".format(name))
+        budget = self.baseline[name]
+        min_rate = budget["relative_rate"] * (1.0 - RATE_TOLERANCE)
+        self.assertGreaterEqual(
+            rate, min_rate,
+            "{} is slower than the baseline: {:.4f} < {:.4f} calls per calibration call".format(
+                name, rate, min_rate))
+        if self.baseline_python != PYTHON_VERSION:
+            return
+        max_alloc = max(budget["peak_bytes"] * (1.0 + ALLOC_TOLERANCE), budget["peak_bytes"] + ALLOC_SLACK)
+        self.assertLessEqual(
+            allocated, max_alloc,
+            "{} allocates more than the baseline: {} > {:.0f} bytes per call".format(
+                name, allocated, max_alloc))
+
+    def test_sign(self):
+        self.check_budget("sign")
+
+    def test_validate_arguments(self):
+        self.check_budget("validate_arguments")
+
+    def test_encode_body(self):
+        self.check_budget("encode_body")
+
+    def test_confirm(self):
+        self.check_budget("confirm")
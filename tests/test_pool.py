@@ -0,0 +1,77 @@
+import time
+import unittest
+from linepay import LinePayApi
+from linepay.lanes import BACKGROUND, INTERACTIVE, Lane, PriorityLanes
+from linepay.pool import create_pooled_session, pool_status, probe, warm_up
+from linepay.stub import StubLinePayServer
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubLinePayServer(latency=0.01).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def create_api(self, **kwargs):
+        api = LinePayApi("channel_id", "channel_secret", **kwargs)
+        api.api_endpoint = self.server.url
+        return api
+
+    def test_warmup_opens_connections(self):
+        api = self.create_api()
+        self.assertEqual(api.warmup(4), 4)
+        self.assertIsNotNone(api.session)
+        self.assertEqual(pool_status(api.session, api.api_endpoint)[0], 4)
+        # API calls reuse the warm connections
+        api.payment_details(transaction_id=1)
+        self.assertEqual(pool_status(api.session, api.api_endpoint)[0], 4)
+        with self.assertRaises(ValueError):
+            api.warmup(0)
+
+    def test_probe(self):
+        session = create_pooled_session(2)
+        api = self.create_api(session=session)
+        health = api.probe()
+        self.assertTrue(health.reachable)
+        self.assertEqual(health.status_code, 200)
+        self.assertGreater(health.rtt, 0)
+        self.assertEqual((health.idle_connections, health.max_connections), (1, 2))
+        self.assertIsNone(health.error)
+
+    def test_probe_unreachable(self):
+        session = create_pooled_session()
+        self.assertEqual(warm_up(session, "http://127.0.0.1:1", 2, timeout=1.0), 0)
+        health = probe(session, "http://127.0.0.1:1", timeout=1.0)
+        self.assertFalse(health.reachable)
+        self.assertIsNone(health.rtt)
+        self.assertEqual(health.idle_connections, 0)
+        self.assertIn("ConnectionError", health.error)
+
+    def test_keep_warm(self):
+        api = self.create_api()
+        keeper = api.keep_warm(connections=2, interval=0.05)
+        deadline = time.monotonic() + 5
+        while keeper.last_health is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(keeper.running)
+        keeper.stop()
+        self.assertFalse(keeper.running)
+        self.assertTrue(keeper.last_health.reachable)
+        self.assertEqual(keeper.last_health.idle_connections, 2)
+
+    def test_warmup_and_probe_lanes(self):
+        lanes = PriorityLanes([Lane(INTERACTIVE, 0, 3), Lane(BACKGROUND, 1, 2)])
+        api = self.create_api(lanes=lanes)
+        self.assertEqual(api.warmup(4), 5)
+        self.assertIsNone(api.session)
+        self.assertEqual(pool_status(lanes[INTERACTIVE].session, api.api_endpoint), (3, 3))
+        self.assertEqual(pool_status(lanes[BACKGROUND].session, api.api_endpoint), (2, 2))
+        health = api.probe()
+        self.assertTrue(health.reachable)
+        self.assertEqual((health.idle_connections, health.max_connections), (5, 5))
+        self.assertIsNone(api.session)
+        lanes.close()
@@ -0,0 +1,102 @@
+import threading
+import tracemalloc
+import unittest
+from linepay import LinePayApi
+from linepay.exceptions import LinePayApiError
+from linepay.idempotency import IdempotencyGuard
+from linepay.profiling import AllocationProfiler
+
+
+class StubResponse(object):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, result):
+        self.result = result
+
+    def json(self):
+        return dict(self.result)
+
+
+class StubSession(object):
+
+    def post(self, url, data=None, headers=None):
+        if url.endswith("/refund"):
+            return StubResponse({"returnCode": "1165", "returnMessage": "Already refunded."})
+        return StubResponse({"returnCode": "0000", "info": {"transactionId": 1}})
+
+
+OPTIONS = {
+    "amount": 100, "currency": "JPY",
+    "packages": [{"id": "1", "amount": 100, "products": [{"name": "item", "quantity": 1, "price": 100}]}],
+    "redirectUrls": {"confirmUrl": "https://example.com/confirm", "cancelUrl": "https://example.com/cancel"},
+}
+
+
+class TestAllocationProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.reports = []
+        self.profiler = AllocationProfiler(report_every=50, top=5, on_report=self.reports.append)
+        self.addCleanup(self.profiler.stop)
+
+    def test_report_every_n_calls(self):
+        api = LinePayApi("channel_id", "channel_secret", tracer=self.profiler, session=StubSession())
+        for i in range(60):
+            api.confirm(i + 1, 100.0, "JPY")
+            with self.assertRaises(LinePayApiError):
+                api.refund(i + 1)
+        self.assertEqual(len(self.reports), 2)
+        report = self.reports[0]
+        self.assertEqual(report.calls, 50)
+        self.assertEqual(report.spans["LINE Pay Confirm"].calls, 25)
+        self.assertEqual(report.spans["LINE Pay Refund"].calls, 25)
+        self.assertEqual(report.spans["linepay.sign"].calls, 50)
+        self.assertIs(self.profiler.last_report, self.reports[-1])
+        self.assertIn("LINE Pay Confirm", report.format())
+
+    def test_top_sites_show_growth_inside_linepay(self):
+        guard = IdempotencyGuard(max_entries=100000)
+        api = LinePayApi(
+            "channel_id", "channel_secret", tracer=self.profiler, session=StubSession(),
+            idempotency_guard=guard)
+        self.profiler.report()
+        for i in range(50):
+            api.request(dict(OPTIONS, orderId="order-{}".format(i)))
+        report = self.reports[-1]
+        self.assertTrue(report.top_sites)
+        self.assertTrue(all("linepay" in site.filename for site in report.top_sites))
+        self.assertTrue(any(site.filename.endswith("idempotency.py") for site in report.top_sites))
+        self.assertGreater(report.spans["LINE Pay Request"].bytes_per_call, 0)
+
+    def test_overlapping_spans_are_not_measured(self):
+        api = LinePayApi("channel_id", "channel_secret", tracer=self.profiler, session=StubSession())
+        barrier = threading.Barrier(2)
+
+        def confirm():
+            with self.profiler.span("job"):
+                barrier.wait()
+                api.confirm(1, 100.0, "JPY")
+                barrier.wait()
+
+        threads = [threading.Thread(target=confirm) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        api.confirm(2, 100.0, "JPY")
+        report = self.profiler.report()
+        self.assertEqual(report.spans["job"].measured_calls, 0)
+        self.assertIsNone(report.spans["job"].bytes_per_call)
+        self.assertEqual(report.spans["LINE Pay Confirm"].calls, 3)
+        self.assertEqual(report.spans["LINE Pay Confirm"].measured_calls, 1)
+        self.assertEqual(report.spans["linepay.sign"].measured_calls, 1)
+        self.assertIn("-", report.format())
+
+    def test_close_stops_tracemalloc(self):
+        api = LinePayApi("channel_id", "channel_secret", tracer=self.profiler, session=StubSession())
+        api.confirm(1, 100.0, "JPY")
+        self.assertTrue(tracemalloc.is_tracing())
+        api.close()
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(self.reports[-1].calls, 1)
@@ -0,0 +1,152 @@
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock
+from linepay import LinePayApi
+from linepay.exceptions import LinePayTransientError
+from linepay.ledger import RefundLedger
+from linepay.stub import StubLinePayServer, stub_response
+from linepay.reconciler import (
+    IncrementalReconciler, ReconciliationStore, fingerprint,
+    DIFF_CHANGED, DIFF_NOT_FOUND, DIFF_PAID, DIFF_REFUNDED, DIFF_UNKNOWN)
+
+
+class FakeLinePay(object):
+    """Payment Details API of a few transactions, keyed by transaction id"""
+
+    def __init__(self):
+        self.details = {}
+        self.failing = set()
+        self.calls = []
+
+    def set(self, transaction_id, pay_status, amount, refunds=()):
+        self.details[transaction_id] = {
+            "transactionId": transaction_id,
+            "payStatus": pay_status,
+            "payInfo": [{"method": "BALANCE", "amount": amount}],
+            "refundList": [
+                {"refundTransactionId": transaction_id * 10 + i, "refundAmount": -r}
+                for i, r in enumerate(refunds)]
+        }
+
+    def payment_details(self, transaction_id=None, order_id=None):
+        self.calls.append(transaction_id)
+        if transaction_id in self.failing:
+            raise LinePayTransientError("9000", 200, None, None)
+        detail = self.details.get(transaction_id)
+        return {"returnCode": "0000", "info": [detail] if detail else []}
+
+
+class TestIncrementalReconciler(unittest.TestCase):
+
+    def setUp(self):
+        self.linepay = FakeLinePay()
+        self.store = ReconciliationStore()
+        self.now = 1000.0
+        self.ledger = RefundLedger()
+
+    def tearDown(self):
+        self.store.close()
+
+    def create_reconciler(self, ledger=None):
+        api = MagicMock()
+        api.payment_details.side_effect = self.linepay.payment_details
+        return IncrementalReconciler(
+            api, self.store, ledger=ledger, concurrency=2, clock=lambda: self.now)
+
+    def test_only_open_transactions_are_queried_again(self):
+        self.linepay.set(1, "AUTHORIZATION", 100)
+        self.linepay.set(2, "CAPTURE", 100)
+        self.linepay.set(3, "CAPTURE", 100, refunds=(30,))
+        self.linepay.set(4, "CAPTURE", 100, refunds=(100,))
+        reconciler = self.create_reconciler()
+        self.assertIsNone(reconciler.watermark)
+        reconciler.track([1, 2, 3, 4])
+        diffs = list(reconciler.reconcile())
+        self.assertEqual([d.kind for d in diffs], [DIFF_CHANGED] * 4)
+        self.assertEqual(diffs[2].actual, (Decimal(100), Decimal(30)))
+        self.assertEqual(reconciler.last_summary, (4, 4, 2, 4))
+        self.assertEqual(reconciler.watermark, 1000.0)
+        self.assertEqual(self.store.count_open(), 2)
+
+        self.linepay.calls = []
+        self.now = 2000.0
+        self.assertEqual(list(reconciler.reconcile()), [])
+        self.assertEqual(sorted(self.linepay.calls), [1, 3])
+        self.assertEqual(reconciler.last_summary, (2, 0, 0, 0))
+        self.assertEqual(reconciler.watermark, 2000.0)
+
+        self.linepay.set(1, "CAPTURE", 100)
+        self.linepay.set(3, "CAPTURE", 100, refunds=(30, 70))
+        diffs = list(reconciler.reconcile())
+        self.assertEqual([d.transaction_id for d in diffs], [1, 3])
+        self.assertEqual(self.store.count_open(), 0)
+
+        reconciler.track([2])
+        self.linepay.calls = []
+        list(reconciler.reconcile())
+        self.assertEqual(self.linepay.calls, [2])
+
+    def test_diff_against_ledger(self):
+        self.linepay.set(1, "CAPTURE", 100, refunds=(30,))
+        self.linepay.set(2, "CAPTURE", 100)
+        self.linepay.set(3, "CAPTURE", 50)
+        self.ledger.record_payment(1, 100)
+        self.ledger.record_payment(2, 100)
+        self.ledger.record_payment(4, 10)
+        reconciler = self.create_reconciler(self.ledger)
+        reconciler.track([1, 2, 3, 4])
+        diffs = list(reconciler.reconcile())
+        self.assertEqual([(d.transaction_id, d.kind) for d in diffs], [
+            (1, DIFF_REFUNDED), (3, DIFF_UNKNOWN), (4, DIFF_NOT_FOUND)])
+        self.assertEqual(diffs[0].expected, Decimal(0))
+        self.assertEqual(diffs[0].actual, Decimal(30))
+
+    def test_not_found_is_reported_once(self):
+        reconciler = self.create_reconciler(self.ledger)
+        reconciler.track([1])
+        diffs = list(reconciler.reconcile())
+        self.assertEqual([(d.transaction_id, d.kind) for d in diffs], [(1, DIFF_NOT_FOUND)])
+        self.assertEqual(reconciler.last_summary, (1, 0, 1, 1))
+        self.assertEqual(self.store.count_open(), 0)
+        self.linepay.calls = []
+        self.assertEqual(list(reconciler.reconcile()), [])
+        self.assertEqual(self.linepay.calls, [])
+
+        self.linepay.set(1, "CAPTURE", 100)
+        reconciler.track([1])
+        diffs = list(reconciler.reconcile())
+        self.assertEqual([(d.transaction_id, d.kind) for d in diffs], [(1, DIFF_UNKNOWN)])
+
+    def test_transaction_not_found_error(self):
+        def responder(name, param, body, query):
+            if name == "payment_details" and query["transactionId"] == ["2"]:
+                return {"returnCode": "1150", "returnMessage": "Transaction record not found."}
+            return stub_response(name, param, body, query)
+
+        self.ledger.record_payment(1, 100)
+        with StubLinePayServer(responder=responder) as server:
+            api = LinePayApi("channel_id", "channel_secret")
+            api.api_endpoint = server.url
+            reconciler = IncrementalReconciler(api, self.store, ledger=self.ledger, clock=lambda: self.now)
+            reconciler.track([1, 2])
+            diffs = list(reconciler.reconcile())
+        self.assertEqual([(d.transaction_id, d.kind) for d in diffs], [(2, DIFF_NOT_FOUND)])
+        self.assertEqual(self.store.count_open(), 0)
+
+    def test_paid_mismatch_and_failed_lookup(self):
+        self.linepay.set(1, "CAPTURE", 90)
+        self.linepay.set(2, "AUTHORIZATION", 100)
+        self.linepay.failing.add(2)
+        self.ledger.record_payment(1, 100)
+        reconciler = self.create_reconciler(self.ledger)
+        reconciler.track([1, 2])
+        diffs = list(reconciler.reconcile())
+        self.assertEqual([(d.kind, d.expected, d.actual) for d in diffs], [
+            (DIFF_PAID, Decimal(100), Decimal(90))])
+        self.assertEqual(reconciler.last_summary.checked, 1)
+        self.assertEqual(self.store.count_open(), 1)
+
+    def test_fingerprint(self):
+        detail = {"payStatus": "CAPTURE", "payInfo": [{"amount": 100}], "refundList": []}
+        self.assertEqual(fingerprint(detail), fingerprint(dict(detail)))
+        self.assertNotEqual(fingerprint(detail), fingerprint(dict(detail, payStatus="AUTHORIZATION")))
@@ -0,0 +1,102 @@
+import csv
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from linepay import reconciliation
+from linepay.exceptions import LinePayInvalidRequestError
+from linepay.reconciliation import (
+    ReconciliationExporter, flatten_payment_detail, ROW_FIELDS, ROW_TYPE_PAYMENT, ROW_TYPE_REFUND)
+
+
+def detail(transaction_id, order_id=None, refunds=()):
+    result = {
+        "transactionId": transaction_id,
+        "transactionDate": "2020-01-01T00:00:00Z",
+        "transactionType": "PAYMENT",
+        "payStatus": "CAPTURE",
+        "productName": "Sample product",
+        "currency": "JPY",
+        "payInfo": [
+            {"method": "BALANCE", "amount": 60},
+            {"method": "CREDIT_CARD", "amount": 40, "maskedCreditCardNumber": "************1111"}
+        ],
+        "refundList": [
+            {"refundTransactionId": transaction_id + i + 1, "transactionType": "PAYMENT_REFUND",
+             "refundAmount": -amount, "refundTransactionDate": "2020-01-02T00:00:00Z"}
+            for i, amount in enumerate(refunds)
+        ]
+    }
+    if order_id is not None:
+        result["orderId"] = order_id
+    return result
+
+
+def payment_details(transaction_id=None, order_id=None):
+    if transaction_id == 3:
+        raise LinePayInvalidRequestError("1150", 200, None, None)
+    return {"returnCode": "0000", "info": [detail(transaction_id or 100, refunds=(10,))]}
+
+
+class TestReconciliationExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_flatten_payment_detail(self):
+        rows = list(flatten_payment_detail(detail(1, refunds=(10, 5)), order_id="order-1"))
+        self.assertEqual([row.row_type for row in rows],
+                         [ROW_TYPE_PAYMENT, ROW_TYPE_PAYMENT, ROW_TYPE_REFUND, ROW_TYPE_REFUND])
+        self.assertEqual(rows[1].amount, 40)
+        self.assertEqual(rows[1].masked_credit_card_number, "************1111")
+        self.assertEqual(rows[2].refund_transaction_id, 2)
+        self.assertEqual(rows[3].amount, -5)
+        self.assertTrue(all(row.order_id == "order-1" for row in rows))
+        self.assertTrue(all(row.transaction_id == 1 for row in rows))
+
+    def test_export_csv(self):
+        api = MagicMock()
+        api.payment_details.side_effect = payment_details
+        errors = []
+        exporter = ReconciliationExporter(
+            api, concurrency=2, on_error=lambda *args: errors.append(args))
+        path = os.path.join(self.directory, "transactions.csv")
+        summary = exporter.export(path, transaction_ids=[1, 2, 3], order_ids=["order-1"])
+        self.assertEqual(summary, (4, 9, 1))
+        self.assertEqual(errors[0][:2], ("transaction_id", 3))
+        with open(path, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(tuple(rows[0]), ROW_FIELDS)
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[1][:3], [ROW_TYPE_PAYMENT, "1", ""])
+        self.assertEqual(rows[-1][:3], [ROW_TYPE_REFUND, "100", "order-1"])
+        api.payment_details.assert_any_call(order_id="order-1")
+
+    def test_iter_rows_streams_ids(self):
+        api = MagicMock()
+        api.payment_details.side_effect = payment_details
+        exporter = ReconciliationExporter(api, concurrency=2)
+        rows = exporter.iter_rows(transaction_ids=itertools.count(10))
+        self.assertEqual(len(list(itertools.islice(rows, 30))), 30)
+        rows.close()
+        self.assertLess(api.payment_details.call_count, 30)
+
+    def test_export_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            ReconciliationExporter(MagicMock()).export("transactions.json", file_format="json")
+
+    @unittest.skipIf(reconciliation.pyarrow is None, "pyarrow is not installed")
+    def test_export_parquet(self):
+        import pyarrow.parquet
+        api = MagicMock()
+        api.payment_details.side_effect = payment_details
+        path = os.path.join(self.directory, "transactions.parquet")
+        summary = ReconciliationExporter(api).export(path, transaction_ids=[1, 2])
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.num_rows, summary.rows)
+        self.assertEqual(table.column_names, list(ROW_FIELDS))
@@ -0,0 +1,179 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+from linepay import LinePayApi
+from linepay.exceptions import LinePayApiError, RateLimitExceededError
+from linepay.interceptors import Interceptor, LinePayCall
+from linepay.registry import ClientRegistry, TenantMetrics
+from linepay.stub import StubLinePayServer, stub_response
+
+
+def responder(name, param, body, query):
+    if name == "refund":
+        return {"returnCode": "1165", "returnMessage": "Already refunded."}
+    return stub_response(name, param, body, query)
+
+
+class TestClientRegistry(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubLinePayServer(responder=responder).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def create_registry(self, **kwargs):
+        secrets = {"channel_{}".format(i): "secret_{}".format(i) for i in range(10)}
+        return ClientRegistry(secrets, api_endpoint=self.server.url, **kwargs)
+
+    def test_clients_are_cached_and_share_session(self):
+        registry = self.create_registry()
+        api = registry.get("channel_1")
+        self.assertIs(registry.get("channel_1"), api)
+        self.assertEqual(api.channel_secret, "secret_1")
+        other = registry.get("channel_2")
+        self.assertIsNot(other, api)
+        self.assertIs(other.session, api.session)
+        self.assertIs(registry.session_for(self.server.url), api.session)
+        self.assertEqual(len(registry), 2)
+        with self.assertRaises(KeyError):
+            registry.get("unknown")
+        registry.close()
+
+    def test_lru_eviction(self):
+        evicted = []
+        registry = self.create_registry(
+            max_clients=2, on_evict=lambda channel_id, metrics: evicted.append(channel_id))
+        registry.get("channel_1")
+        registry.get("channel_2")
+        registry.get("channel_1")
+        registry.get("channel_3")
+        self.assertEqual(evicted, ["channel_2"])
+        self.assertIn("channel_1", registry)
+        self.assertNotIn("channel_2", registry)
+        registry.evict("channel_1")
+        self.assertEqual(evicted, ["channel_2", "channel_1"])
+        self.assertEqual(len(registry), 1)
+        with self.assertRaises(ValueError):
+            ClientRegistry({}, max_clients=0)
+
+    def test_metrics_per_channel(self):
+        registry = self.create_registry()
+        registry.get("channel_1").payment_details(transaction_id=1)
+        registry.get("channel_1").payment_details(transaction_id=2)
+        with self.assertRaises(LinePayApiError):
+            registry.get("channel_2").refund(3)
+        metrics = registry.metrics("channel_1")
+        self.assertEqual((metrics.calls, metrics.failures), (2, 0))
+        self.assertGreater(metrics.mean_seconds, 0)
+        self.assertGreaterEqual(metrics.max_seconds, metrics.mean_seconds)
+        metrics = registry.metrics("channel_2")
+        self.assertEqual((metrics.calls, metrics.failures), (1, 1))
+        self.assertIsNone(registry.metrics("channel_3"))
+        registry.close()
+
+    def test_close_drains_clients(self):
+        registry = self.create_registry()
+        api = registry.get("channel_1")
+        api.payment_details(transaction_id=1)
+        self.assertTrue(registry.close(timeout=5))
+        self.assertTrue(api.closing)
+        self.assertEqual(len(registry), 0)
+
+    def test_evicted_clients_are_closed_when_idle(self):
+        evicted = []
+        started, release = threading.Event(), threading.Event()
+
+        class SlowSession(object):
+            def get(self, url, headers=None):
+                started.set()
+                release.wait(5)
+                response = MagicMock()
+                response.json.return_value = {"returnCode": "0000", "info": []}
+                return response
+
+            def close(self):
+                pass
+
+        registry = self.create_registry(
+            max_clients=1, session_factory=SlowSession,
+            on_evict=lambda channel_id, metrics: evicted.append((channel_id, metrics.calls)))
+        busy = registry.get("channel_1")
+        call = threading.Thread(target=busy.payment_details, kwargs={"transaction_id": 1})
+        call.start()
+        started.wait(5)
+        registry.get("channel_2")
+        idle = registry.get("channel_3")
+        # channel_2 had no call in flight
+        self.assertEqual(evicted, [("channel_2", 0)])
+        self.assertFalse(busy.closing)
+        closing = threading.Thread(target=registry.close, kwargs={"timeout": 5})
+        closing.start()
+        closing.join(0.05)
+        self.assertTrue(closing.is_alive())
+        release.set()
+        closing.join()
+        call.join()
+        self.assertEqual(evicted, [("channel_2", 0), ("channel_1", 1)])
+        self.assertTrue(busy.closing)
+        self.assertTrue(idle.closing)
+
+    def test_rate_limit_per_channel(self):
+        registry = self.create_registry(rate=0.01, burst=1)
+        registry.get("channel_1").payment_details(transaction_id=1)
+        with self.assertRaises(RateLimitExceededError) as cm:
+            registry.get("channel_1").payment_details(transaction_id=2)
+        self.assertEqual(cm.exception.key, "channel_1")
+        self.assertGreater(cm.exception.retry_after, 0)
+        registry.get("channel_2").payment_details(transaction_id=3)
+        metrics = registry.metrics("channel_1")
+        self.assertEqual((metrics.calls, metrics.rate_limited), (1, 1))
+        registry.close()
+
+
+class TestTenantMetrics(unittest.TestCase):
+
+    def test_safe_return_codes_and_errors(self):
+        metrics = TenantMetrics("channel_1")
+        session = MagicMock()
+        session.get.return_value.json.return_value = {"returnCode": "0110"}
+        api = LinePayApi("channel_1", "secret_1", session=session, interceptors=[metrics])
+        api.check_payment_status(1)
+        self.assertEqual((metrics.calls, metrics.failures), (1, 0))
+        session.get.side_effect = ConnectionError("connection refused")
+        with self.assertRaises(ConnectionError):
+            api.check_payment_status(1)
+        self.assertEqual((metrics.calls, metrics.failures), (2, 1))
+
+    def test_context_used_by_other_interceptor(self):
+        class ContextInterceptor(Interceptor):
+            def before_send(self, call):
+                call.context = "request-1"
+
+        metrics = TenantMetrics("channel_1")
+        session = MagicMock()
+        session.post.return_value.json.return_value = {"returnCode": "0000"}
+        api = LinePayApi("channel_1", "secret_1", session=session, interceptors=[metrics, ContextInterceptor()])
+        api.confirm(1, 100.0, "JPY")
+        self.assertEqual((metrics.calls, metrics.failures), (1, 0))
+        self.assertGreaterEqual(metrics.max_seconds, 0.0)
+
+    def test_counters_from_threads(self):
+        metrics = TenantMetrics("channel_1")
+        call = LinePayCall(None, "Confirm", "POST", "/v3/payments/1/confirm", "", "", {})
+        call.result = {"returnCode": "0000"}
+        call.state(metrics)["started"] = 0.0
+
+        def record():
+            for _ in range(2000):
+                metrics.after_response(call)
+                metrics.record_rate_limited()
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((metrics.calls, metrics.rate_limited, metrics.failures), (16000, 16000, 0))
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from linepay.exceptions import LinePayTransientError
+from linepay.regkey_sweeper import (
+    RegKeySweeper, read_reg_keys, read_checkpoint, read_checkpoint_offset, write_checkpoint,
+    ACTION_EXPIRE)
+
+
+def check_regkey(reg_key, credit_card_auth=False):
+    if reg_key.startswith("expired"):
+        return {"returnCode": "1193"}
+    if reg_key.startswith("broken"):
+        raise LinePayTransientError("9000", 200, None, None)
+    if reg_key.startswith("offline"):
+        raise ConnectionError("connection refused")
+    return {"returnCode": "0000"}
+
+
+class TestRegKeySweeper(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.directory, "results.tsv")
+        self.checkpoint_path = os.path.join(self.directory, "results.checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_output(self):
+        with open(self.output_path) as f:
+            return [line.rstrip("\n").split("\t") for line in f]
+
+    def test_check(self):
+        api = MagicMock()
+        api.check_regkey.side_effect = check_regkey
+        reg_keys = ["valid-{}".format(i) for i in range(50)] + ["expired-1", "broken-1", "offline-1"]
+        summary = RegKeySweeper(api, concurrency=4, credit_card_auth=True).sweep(reg_keys, self.output_path)
+        self.assertEqual(summary.processed, 53)
+        self.assertEqual(summary.skipped, 0)
+        self.assertEqual(summary.return_codes, {"0000": 50, "1193": 1, "9000": 1, "ERROR": 1})
+        output = self.read_output()
+        self.assertEqual([row[0] for row in output], reg_keys)
+        self.assertEqual(output[-3:], [["expired-1", "1193"], ["broken-1", "9000"], ["offline-1", "ERROR"]])
+        api.check_regkey.assert_any_call("valid-0", credit_card_auth=True)
+
+    def test_resume_from_checkpoint(self):
+        api = MagicMock()
+        api.expire_regkey.return_value = {"returnCode": "0000"}
+        input_path = os.path.join(self.directory, "reg_keys.txt")
+        with open(input_path, "w") as f:
+            f.write("regkey-1\nregkey-2\n\nregkey-3\nregkey-4\nregkey-5\n")
+        with open(self.output_path, "w") as f:
+            f.write("regkey-1\t0000\nregkey-2\t0000\n")
+        write_checkpoint(self.checkpoint_path, 2)
+        sweeper = RegKeySweeper(api, concurrency=2, checkpoint_interval=2)
+        summary = sweeper.sweep(
+            read_reg_keys(input_path), self.output_path, action=ACTION_EXPIRE,
+            checkpoint_path=self.checkpoint_path)
+        self.assertEqual((summary.processed, summary.skipped), (3, 2))
+        self.assertEqual([row[0] for row in self.read_output()],
+                         ["regkey-1", "regkey-2", "regkey-3", "regkey-4", "regkey-5"])
+        self.assertEqual(api.expire_regkey.call_count, 3)
+        self.assertEqual(read_checkpoint(self.checkpoint_path), 5)
+
+    def test_resume_truncates_lines_after_checkpoint(self):
+        api = MagicMock()
+        api.check_regkey.side_effect = check_regkey
+        reg_keys = ["regkey-{}".format(i) for i in range(1, 6)]
+        with open(self.output_path, "w") as f:
+            f.write("regkey-1\t0000\nregkey-2\t0000\n")
+            offset = f.tell()
+            # written after the checkpoint, before the interruption
+            f.write("regkey-3\t0000\nregkey-4\t00")
+        write_checkpoint(self.checkpoint_path, 2, offset)
+        summary = RegKeySweeper(api, concurrency=2, checkpoint_interval=2).sweep(
+            reg_keys, self.output_path, checkpoint_path=self.checkpoint_path)
+        self.assertEqual((summary.processed, summary.skipped), (3, 2))
+        self.assertEqual(self.read_output(), [[reg_key, "0000"] for reg_key in reg_keys])
+        self.assertEqual(read_checkpoint_offset(self.checkpoint_path), os.path.getsize(self.output_path))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            RegKeySweeper(MagicMock(), concurrency=0)
+        with self.assertRaises(ValueError):
+            RegKeySweeper(MagicMock()).sweep([], self.output_path, action="delete")
+        self.assertEqual(read_checkpoint(self.checkpoint_path), 0)
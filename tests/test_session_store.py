@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from linepay.session_store import MemoryOrderSessionStore, SQLiteOrderSessionStore
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class OrderSessionStoreTests(object):
+
+    def create_store(self, **kwargs):
+        raise NotImplementedError
+
+    def test_save_and_get_by_transaction(self):
+        store = self.create_store()
+        store.save("order-1", 100, "JPY")
+        self.assertIsNone(store.get_by_transaction(1234567890))
+        self.assertTrue(store.attach_transaction("order-1", 1234567890))
+        session = store.get_by_transaction(1234567890)
+        self.assertEqual(session.order_id, "order-1")
+        self.assertEqual(session.amount, 100)
+        self.assertEqual(session.currency, "JPY")
+        self.assertEqual(store.get("order-1"), session)
+        self.assertFalse(store.attach_transaction("order-2", 1))
+
+    def test_update_data(self):
+        store = self.create_store()
+        store.save("order-1", 9.99, "USD", transaction_id=1, data={"product_name": "Sample"})
+        store.update_data("order-1", reg_key="regkey-1")
+        self.assertEqual(
+            store.get_by_transaction(1).data, {"product_name": "Sample", "reg_key": "regkey-1"})
+
+    def test_ttl(self):
+        clock = FakeClock()
+        store = self.create_store(ttl=10, clock=clock)
+        store.save("order-1", 100, "JPY", transaction_id=1)
+        clock.now += 9
+        self.assertIsNotNone(store.get_by_transaction(1))
+        clock.now += 1
+        self.assertIsNone(store.get_by_transaction(1))
+        self.assertIsNone(store.get("order-1"))
+
+    def test_delete(self):
+        store = self.create_store()
+        store.save("order-1", 100, "JPY", transaction_id=1)
+        store.delete("order-1")
+        self.assertIsNone(store.get("order-1"))
+        self.assertIsNone(store.get_by_transaction(1))
+
+
+class TestMemoryOrderSessionStore(OrderSessionStoreTests, unittest.TestCase):
+
+    def create_store(self, **kwargs):
+        return MemoryOrderSessionStore(**kwargs)
+
+    def test_max_entries(self):
+        store = self.create_store(max_entries=2)
+        for i in range(5):
+            store.save("order-{}".format(i), i, "JPY", transaction_id=i)
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get_by_transaction(2))
+        self.assertIsNotNone(store.get_by_transaction(4))
+        self.assertEqual(len(store._order_ids), 2)
+
+
+class TestSQLiteOrderSessionStore(OrderSessionStoreTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "sessions.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def create_store(self, **kwargs):
+        return SQLiteOrderSessionStore(self.path, **kwargs)
+
+    def test_shared_between_stores(self):
+        worker1 = self.create_store()
+        worker2 = self.create_store()
+        worker1.save("order-1", 100, "JPY")
+        worker1.attach_transaction("order-1", 1234567890)
+        self.assertEqual(worker2.get_by_transaction(1234567890).amount, 100)
+
+    def test_prune(self):
+        store = self.create_store(max_entries=2)
+        for i in range(5):
+            store.save("order-{}".format(i), i, "JPY", transaction_id=i)
+        store.prune()
+        self.assertEqual(len(store), 2)
+        self.assertIsNotNone(store.get_by_transaction(4))
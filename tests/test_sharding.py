@@ -0,0 +1,78 @@
+import time
+import unittest
+from linepay.sharding import ShardedRunner, shard_of
+from linepay.stub import StubLinePayServer, stub_response
+
+
+def responder(name, param, body, query):
+    if name == "refund" and int(param) % 5 == 0:
+        return {"returnCode": "1165", "returnMessage": "Already refunded."}
+    return stub_response(name, param, body, query)
+
+
+class TestShardedRunner(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubLinePayServer(responder=responder).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def create_runner(self, **kwargs):
+        return ShardedRunner(
+            "channel_id", "channel_secret", processes=2, threads=2,
+            api_endpoint=self.server.url, **kwargs)
+
+    def test_shard_of_is_stable(self):
+        self.assertEqual(shard_of(1234567890, 4), shard_of(1234567890, 4))
+        self.assertEqual(shard_of("regkey", 1), 0)
+        shards = {shard_of(i, 4) for i in range(100)}
+        self.assertEqual(shards, {0, 1, 2, 3})
+
+    def test_map_in_submission_order(self):
+        jobs = [{"transaction_id": i} for i in range(1, 41)]
+        with self.create_runner(max_in_flight=8) as runner:
+            results = list(runner.map("payment_details", jobs))
+        self.assertEqual([r.index for r in results], list(range(40)))
+        self.assertTrue(all(r.succeeded for r in results))
+        self.assertEqual(results[9].kwargs, {"transaction_id": 10})
+        self.assertEqual(results[9].result["info"][0]["transactionId"], 10)
+
+    def test_map_as_completed_with_errors(self):
+        jobs = ({"transaction_id": i, "refund_amount": 10} for i in range(1, 21))
+        with self.create_runner() as runner:
+            results = list(runner.map("refund", jobs, ordered=False))
+        self.assertEqual(sorted(r.index for r in results), list(range(20)))
+        failed = sorted(r.kwargs["transaction_id"] for r in results if not r.succeeded)
+        self.assertEqual(failed, [5, 10, 15, 20])
+        error = next(r.error for r in results if not r.succeeded)
+        self.assertEqual(error.return_code, "1165")
+
+    def test_stalled_shard_bounds_submissions(self):
+        calls = []
+
+        def stalling_responder(name, param, body, query):
+            calls.append(param)
+            if param == "1":
+                time.sleep(0.5)
+            return stub_response(name, param, body, query)
+
+        jobs = [{"transaction_id": i} for i in range(1, 41)]
+        with StubLinePayServer(responder=stalling_responder) as server:
+            with ShardedRunner(
+                    "channel_id", "channel_secret", processes=2, threads=2,
+                    api_endpoint=server.url, max_in_flight=4) as runner:
+                results = runner.map("payment_details", jobs)
+                first = next(results)
+                sent_before_first = len(calls)
+                rest = list(results)
+        self.assertEqual(first.kwargs, {"transaction_id": 1})
+        self.assertLessEqual(sent_before_first, 4)
+        self.assertEqual([r.index for r in rest], list(range(1, 40)))
+
+    def test_unsupported_method(self):
+        runner = self.create_runner()
+        with self.assertRaises(ValueError):
+            list(runner.map("sign", [{}]))
@@ -0,0 +1,231 @@
+import asyncio
+import random
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from linepay import LinePayApi
+from linepay.lanes import BACKGROUND, INTERACTIVE, Lane, PriorityLanes
+from linepay.timeouts import AdaptiveTimeouts
+from tests import run_sync
+
+try:
+    import httpx
+    from linepay.aio import AsyncLinePayApi
+except ImportError:
+    httpx = None
+
+
+class StubResponse(object):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, result):
+        self.result = result
+
+    def json(self):
+        return self.result
+
+
+class StubSession(object):
+    """Answers after the next delay of delays, then immediately"""
+
+    def __init__(self, delays=()):
+        self.delays = list(delays)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        with self.lock:
+            attempt = len(self.calls)
+            self.calls.append((url, dict(headers), timeout))
+            delay = self.delays.pop(0) if self.delays else 0.0
+        time.sleep(delay)
+        return StubResponse({"returnCode": "0000", "attempt": attempt})
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.calls.append((url, dict(headers), timeout))
+        return StubResponse({"returnCode": "0000"})
+
+
+def warmed_timeouts(api_name, latency, samples=20, **kwargs):
+    timeouts = AdaptiveTimeouts(min_samples=samples, **kwargs)
+    for _ in range(samples):
+        timeouts.record(api_name, latency)
+    return timeouts
+
+
+class TestAdaptiveTimeouts(unittest.TestCase):
+
+    def test_ceiling_until_min_samples(self):
+        timeouts = AdaptiveTimeouts(ceiling=10.0, min_samples=3)
+        timeouts.record("Confirm", 0.1)
+        timeouts.record("Confirm", 0.1)
+        self.assertEqual(timeouts.read_timeout("Confirm"), 10.0)
+        timeouts.record("Confirm", 0.1)
+        self.assertAlmostEqual(timeouts.read_timeout("Confirm"), 1.0)
+
+    def test_percentile_times_factor_clamped(self):
+        timeouts = AdaptiveTimeouts(factor=2.0, floor=0.5, ceiling=5.0, min_samples=100, window=100)
+        for i in range(100):
+            timeouts.record("Confirm", (i + 1) / 100.0)
+        # p99 is 1.0 second
+        self.assertAlmostEqual(timeouts.read_timeout("Confirm"), 2.0)
+        self.assertEqual(warmed_timeouts("Confirm", 0.01, floor=0.5).read_timeout("Confirm"), 0.5)
+        self.assertEqual(warmed_timeouts("Confirm", 60.0, ceiling=5.0).read_timeout("Confirm"), 5.0)
+
+    def test_window_rolls(self):
+        timeouts = AdaptiveTimeouts(factor=1.0, floor=0.01, window=20, min_samples=20)
+        for _ in range(20):
+            timeouts.record("Confirm", 2.0)
+        for _ in range(20):
+            timeouts.record("Confirm", 0.1)
+        self.assertAlmostEqual(timeouts.read_timeout("Confirm"), 0.1)
+
+    def test_percentiles_of_rolling_window(self):
+        timeouts = AdaptiveTimeouts(window=50, min_samples=50)
+        latencies = [random.random() for _ in range(500)]
+        for latency in latencies:
+            timeouts.record("Confirm", latency)
+        window = sorted(latencies[-50:])
+        stats = timeouts.stats()["Confirm"]
+        self.assertEqual((stats.samples, stats.p50, stats.p95, stats.p99), (50, window[25], window[47], window[49]))
+
+    def test_connect_timeout(self):
+        timeouts = AdaptiveTimeouts(ceiling=10.0, connect_timeout=3.05)
+        self.assertEqual(timeouts.timeout_for("Confirm"), (3.05, 10.0))
+
+    def test_hedge_budget(self):
+        timeouts = warmed_timeouts("Check Payment Status", 0.1, max_hedge_ratio=0.5)
+        self.assertIsNone(timeouts.hedge_delay("Confirm"))
+        self.assertAlmostEqual(timeouts.hedge_delay("Check Payment Status"), 0.1)
+        self.assertFalse(timeouts.try_hedge("Check Payment Status"))
+        timeouts.hedge_delay("Check Payment Status")
+        self.assertTrue(timeouts.try_hedge("Check Payment Status"))
+        self.assertFalse(timeouts.try_hedge("Check Payment Status"))
+        self.assertEqual(timeouts.stats()["Check Payment Status"].hedges, 1)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            AdaptiveTimeouts(factor=0)
+        with self.assertRaises(ValueError):
+            AdaptiveTimeouts(floor=10.0, ceiling=1.0)
+        with self.assertRaises(ValueError):
+            AdaptiveTimeouts(window=10, min_samples=20)
+
+
+class TestLinePayApiTimeouts(unittest.TestCase):
+
+    def test_timeout_passed_to_session(self):
+        session = StubSession()
+        timeouts = warmed_timeouts("Confirm", 0.2, factor=3.0, floor=0.1)
+        api = LinePayApi("channel_id", "channel_secret", session=session, timeouts=timeouts)
+        api.confirm(1234567890, 10.0, "JPY")
+        self.assertAlmostEqual(session.calls[0][2], 0.6)
+        self.assertEqual(timeouts.stats()["Confirm"].samples, 21)
+
+    def test_latency_of_failed_attempt_recorded(self):
+        class FailingSession(object):
+            def post(self, url, data=None, headers=None, timeout=None):
+                raise IOError("timed out")
+
+        timeouts = AdaptiveTimeouts()
+        api = LinePayApi("channel_id", "channel_secret", session=FailingSession(), timeouts=timeouts)
+        with self.assertRaises(IOError):
+            api.confirm(1234567890, 10.0, "JPY")
+        self.assertEqual(timeouts.stats()["Confirm"].samples, 1)
+
+    def test_slow_read_only_call_is_hedged(self):
+        session = StubSession(delays=[1.0])
+        timeouts = warmed_timeouts("Check Payment Status", 0.01, max_hedge_ratio=1.0)
+        api = LinePayApi("channel_id", "channel_secret", session=session, timeouts=timeouts)
+        started = time.perf_counter()
+        result = api.check_payment_status(1234567890)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(result["attempt"], 1)
+        self.assertEqual(len(session.calls), 2)
+        first, second = session.calls[0][1], session.calls[1][1]
+        self.assertNotEqual(first["X-LINE-Authorization-Nonce"], second["X-LINE-Authorization-Nonce"])
+        self.assertNotEqual(first["X-LINE-Authorization"], second["X-LINE-Authorization"])
+
+    def test_fast_call_is_not_hedged(self):
+        session = StubSession()
+        timeouts = warmed_timeouts("Payment Details", 0.5, max_hedge_ratio=1.0)
+        api = LinePayApi("channel_id", "channel_secret", session=session, timeouts=timeouts)
+        self.assertEqual(api.payment_details(transaction_id=1234567890)["attempt"], 0)
+        self.assertEqual(len(session.calls), 1)
+
+    def test_hedges_capped_by_budget(self):
+        session = StubSession(delays=[0.2, 0.2, 0.0])
+        timeouts = warmed_timeouts("Check Payment Status", 0.01, max_hedge_ratio=0.5)
+        api = LinePayApi("channel_id", "channel_secret", session=session, timeouts=timeouts)
+        api.check_payment_status(1234567890)
+        self.assertEqual(len(session.calls), 1)
+        api.check_payment_status(1234567890)
+        self.assertEqual(len(session.calls), 3)
+
+    def test_drain_waits_for_losing_attempt(self):
+        session = StubSession(delays=[0.3])
+        timeouts = warmed_timeouts("Check Payment Status", 0.01, max_hedge_ratio=1.0)
+        api = LinePayApi("channel_id", "channel_secret", session=session, timeouts=timeouts)
+        started = time.perf_counter()
+        self.assertEqual(api.check_payment_status(1234567890)["attempt"], 1)
+        self.assertEqual(api.in_flight(), 0)
+        self.assertFalse(api.drain(timeout=0.01))
+        self.assertTrue(api.drain(timeout=5))
+        self.assertGreaterEqual(time.perf_counter() - started, 0.3)
+        api.close()
+
+    def test_busy_hedge_pool_sends_on_caller_thread(self):
+        session = StubSession(delays=[0.2, 0.2])
+        timeouts = warmed_timeouts("Check Payment Status", 0.01, max_hedge_ratio=1.0)
+        with patch.object(LinePayApi, "HEDGE_WORKERS", 1):
+            api = LinePayApi("channel_id", "channel_secret", session=session, timeouts=timeouts)
+        threads = [threading.Thread(target=api.check_payment_status, args=(1234567890,)) for _ in range(2)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(time.perf_counter() - started, 0.35)
+        self.assertEqual(len(session.calls), 2)
+        self.assertEqual(timeouts.stats()["Check Payment Status"].hedges, 0)
+        api.close()
+
+    def test_hedge_takes_lane_slot(self):
+        for max_concurrent, attempts in ((1, 1), (2, 2)):
+            session = StubSession(delays=[0.2])
+            lanes = PriorityLanes([Lane(INTERACTIVE, 0, max_concurrent), Lane(BACKGROUND, 1, 1)])
+            lanes[INTERACTIVE].session = session
+            timeouts = warmed_timeouts("Check Payment Status", 0.01, max_hedge_ratio=1.0)
+            api = LinePayApi("channel_id", "channel_secret", lanes=lanes, timeouts=timeouts)
+            api.check_payment_status(1234567890)
+            api.close()
+            self.assertEqual(len(session.calls), attempts)
+            stats = lanes.stats()[INTERACTIVE]
+            self.assertEqual((stats.calls, stats.in_flight), (attempts, 0))
+            self.assertEqual(timeouts.stats()["Check Payment Status"].hedges, attempts - 1)
+
+
+@unittest.skipIf(httpx is None, "httpx is not installed")
+class TestAsyncLinePayApiTimeouts(unittest.TestCase):
+
+    def test_slow_read_only_call_is_hedged(self):
+        requests = []
+
+        async def handler(request):
+            attempt = len(requests)
+            requests.append(request)
+            if attempt == 0:
+                await asyncio.sleep(1.0)
+            return httpx.Response(200, json={"returnCode": "0000", "attempt": attempt})
+
+        timeouts = warmed_timeouts("Check Payment Status", 0.01, floor=0.01, max_hedge_ratio=1.0)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        api = AsyncLinePayApi("channel_id", "channel_secret", client=client, timeouts=timeouts)
+        started = time.perf_counter()
+        result = run_sync(api.check_payment_status(1234567890))
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(result["attempt"], 1)
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests[0].extensions["timeout"]["read"], 0.03)
@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from linepay import LinePayApi
+from linepay.exceptions import LinePayApiError
+from linepay.lanes import PriorityLanes
+from linepay.tracing import OpenTelemetryTracer, RecordingTracer, response_attributes
+
+
+def create_response(result):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = result
+    return response
+
+
+class TestTracing(unittest.TestCase):
+
+    @patch("linepay.api.requests.post")
+    def test_span_per_phase(self, mock_post):
+        mock_post.return_value = create_response({"returnCode": "0000"})
+        tracer = RecordingTracer()
+        api = LinePayApi("channel_id", "channel_secret", is_sandbox=True, tracer=tracer)
+        result = api.confirm(1234567890, 100.0, "JPY")
+        self.assertEqual(result, {"returnCode": "0000"})
+        self.assertEqual(
+            [(s.name, s.parent) for s in tracer.spans],
+            [("linepay.serialize", "LINE Pay Confirm"), ("linepay.sign", "LINE Pay Confirm"),
+             ("linepay.send", "LINE Pay Confirm"), ("linepay.parse", "LINE Pay Confirm"),
+             ("LINE Pay Confirm", None)])
+        root = tracer.spans[-1]
+        self.assertEqual(root.attributes["linepay.transaction_id"], "1234567890")
+        self.assertEqual(root.attributes["linepay.return_code"], "0000")
+        self.assertEqual(root.attributes["http.status_code"], 200)
+        self.assertEqual(root.attributes["http.url"], "https://sandbox-api-pay.line.me/v3/payments/1234567890/confirm")
+        self.assertGreaterEqual(root.duration, sum(s.duration for s in list(tracer.spans)[:-1]))
+        signed = mock_post.call_args[1]["headers"]
+        self.assertIn("X-LINE-Authorization", signed)
+
+    @patch("linepay.api.requests.post")
+    def test_failed_call(self, mock_post):
+        mock_post.return_value = create_response({"returnCode": "1172", "returnMessage": "Existing same orderId."})
+        tracer = RecordingTracer()
+        api = LinePayApi("channel_id", "channel_secret", is_sandbox=True, tracer=tracer)
+        options = {
+            "amount": 100, "currency": "JPY", "orderId": "order-1",
+            "packages": [{"id": "1", "amount": 100, "products": [{"name": "item", "quantity": 1, "price": 100}]}],
+            "redirectUrls": {"confirmUrl": "https://example.com/confirm", "cancelUrl": "https://example.com/cancel"},
+        }
+        with self.assertRaises(LinePayApiError):
+            api.request(options, validate=True)
+        self.assertEqual(tracer.spans[0].name, "linepay.validate")
+        root = tracer.spans[-1]
+        self.assertEqual(root.name, "LINE Pay Request")
+        self.assertEqual(root.attributes["linepay.order_id"], "order-1")
+        self.assertEqual(root.attributes["linepay.return_code"], "1172")
+        self.assertIn("LinePayTransactionStateError", root.error)
+
+    def test_lane_acquisition(self):
+        tracer = RecordingTracer()
+        lanes = PriorityLanes()
+        api = LinePayApi("channel_id", "channel_secret", is_sandbox=True, tracer=tracer, lanes=lanes)
+        for lane in ("interactive", "background"):
+            lanes[lane].session = MagicMock()
+            lanes[lane].session.get.return_value = create_response(
+                {"returnCode": "0000", "info": [{"transactionId": 1}]})
+        api.payment_details(transaction_id=1)
+        acquire = next(s for s in tracer.spans if s.name == "linepay.acquire")
+        self.assertEqual(acquire.attributes["linepay.lane"], "background")
+        self.assertEqual(lanes.stats()["background"].calls, 1)
+
+    def test_opentelemetry_tracer(self):
+        otel_tracer = MagicMock()
+        tracer = OpenTelemetryTracer(otel_tracer)
+        tracer.span("linepay.sign", {"linepay.api": "Confirm"})
+        otel_tracer.start_as_current_span.assert_called_once_with(
+            "linepay.sign", attributes={"linepay.api": "Confirm"})
+
+    def test_response_attributes_without_none(self):
+        response = MagicMock(status_code=502)
+        self.assertEqual(response_attributes(response, {}), {"http.status_code": 502})
+        self.assertEqual(
+            response_attributes(response, {"returnCode": "0000", "info": {"transactionId": 1}}),
+            {"http.status_code": 502, "linepay.return_code": "0000", "linepay.transaction_id": "1"})
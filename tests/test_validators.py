@@ -0,0 +1,105 @@
+import timeit
+import unittest
+from copy import deepcopy
+from unittest.mock import MagicMock, patch
+import linepay
+from linepay.validators import request_options_errors, validate_request_options
+
+
+VALID_OPTIONS = {
+    "amount": 300,
+    "currency": "JPY",
+    "orderId": "order-1234567890",
+    "packages": [
+        {
+            "id": "package-1",
+            "amount": 100,
+            "name": "Sample package",
+            "products": [{"id": "product-1", "name": "Sample product", "quantity": 2, "price": 50}]
+        },
+        {
+            "id": "package-2",
+            "amount": 200,
+            "products": [{"name": "Sample product 2", "quantity": 1, "price": 200}]
+        }
+    ],
+    "redirectUrls": {
+        "confirmUrl": "https://example.com/pay/confirm",
+        "cancelUrl": "https://example.com/pay/cancel"
+    }
+}
+
+
+class TestRequestOptionsValidator(unittest.TestCase):
+
+    def test_valid_options(self):
+        self.assertEqual(request_options_errors(VALID_OPTIONS), [])
+        validate_request_options(VALID_OPTIONS)
+
+    def test_decimal_amount_for_usd(self):
+        options = deepcopy(VALID_OPTIONS)
+        options["currency"] = "USD"
+        options["amount"] = 300.5
+        options["packages"][1]["amount"] = 200.5
+        options["packages"][1]["products"][0]["price"] = 200.5
+        self.assertEqual(request_options_errors(options), [])
+
+    def test_decimal_amount_for_jpy(self):
+        options = deepcopy(VALID_OPTIONS)
+        options["packages"][0]["products"][0]["price"] = 50.5
+        errors = request_options_errors(options)
+        self.assertIn("packages[0].products[0].price must be an integer for the currency", errors)
+
+    def test_amount_mismatch(self):
+        options = deepcopy(VALID_OPTIONS)
+        options["amount"] = 301
+        self.assertEqual(
+            request_options_errors(options), ["amount[301] does not match sum of packages[300]"])
+        options = deepcopy(VALID_OPTIONS)
+        options["packages"][0]["products"][0]["quantity"] = 3
+        self.assertEqual(
+            request_options_errors(options),
+            ["packages[0].amount[100] does not match sum of products[150]"])
+
+    def test_user_fee_and_shipping_fee(self):
+        options = deepcopy(VALID_OPTIONS)
+        options["amount"] = 330
+        options["packages"][0]["userFee"] = 20
+        options["options"] = {"shipping": {"type": "FIXED_ADDRESS", "feeAmount": 10}}
+        self.assertEqual(request_options_errors(options), [])
+        options["packages"][0]["userFee"] = 25
+        self.assertEqual(
+            request_options_errors(options),
+            ["amount[330] does not match sum of packages[300] and fees[35]"])
+        options["packages"][0]["userFee"] = "20"
+        self.assertEqual(request_options_errors(options), ["packages[0].userFee must be a number"])
+
+    def test_missing_fields(self):
+        options = deepcopy(VALID_OPTIONS)
+        del options["redirectUrls"]
+        del options["orderId"]
+        options["currency"] = "GBP"
+        errors = request_options_errors(options)
+        self.assertIn("redirectUrls is required", errors)
+        self.assertIn("orderId is required", errors)
+        self.assertIn("currency[GBP] is not supported by LINE Pay", errors)
+        self.assertEqual(request_options_errors({"amount": 1})[-1], "packages is required")
+        with self.assertRaises(ValueError):
+            validate_request_options(options)
+
+    def test_fast_enough(self):
+        per_call = min(timeit.repeat(
+            lambda: request_options_errors(VALID_OPTIONS), number=1000, repeat=3)) / 1000
+        self.assertLess(per_call, 0.001)
+
+    def test_request_with_validate(self):
+        with patch('linepay.api.requests.post') as post:
+            post.return_value.json = MagicMock(return_value={"returnCode": "0000"})
+            api = linepay.LinePayApi("channel_id", "channel_secret", is_sandbox=True)
+            options = deepcopy(VALID_OPTIONS)
+            options["amount"] = 1
+            with self.assertRaises(ValueError):
+                api.request(options, validate=True)
+            post.assert_not_called()
+            api.request(VALID_OPTIONS, validate=True)
+            post.assert_called_once()